@@ -3,3 +3,43 @@ import os
 
 BASE_DIR = Path(__file__).resolve().parent
 MEDIA_ROOT = os.getenv("MEDIA_ROOT", str(BASE_DIR / "media" / "models"))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_SESSION_MAX_BYTES = int(os.getenv("UPLOAD_SESSION_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+FFPROBE_MAX_CONCURRENCY = int(os.getenv("FFPROBE_MAX_CONCURRENCY", "2"))
+FFPROBE_TIMEOUT_SECONDS = float(os.getenv("FFPROBE_TIMEOUT_SECONDS", "30"))
+FFMPEG_TIMEOUT_SECONDS = float(os.getenv("FFMPEG_TIMEOUT_SECONDS", "120"))
+MEDIA_STORE_ROOT = os.getenv("MEDIA_STORE_ROOT", str(BASE_DIR / "media" / "store"))
+THUMBNAIL_ROOT = os.getenv("THUMBNAIL_ROOT", str(BASE_DIR / "media" / "thumbs"))
+NEAR_DUPLICATE_POLICY = os.getenv("NEAR_DUPLICATE_POLICY", "flag").lower()
+NEAR_DUPLICATE_DISTANCE = int(os.getenv("NEAR_DUPLICATE_DISTANCE", "6"))
+# Set in containers to the mounted data volume; SQLite databases outside it are refused
+DATA_DIR = os.getenv("DATA_DIR", "")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHED_STATEMENTS = int(os.getenv("SQLITE_CACHED_STATEMENTS", "256"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "64"))
+DB_SLOW_WRITE_SECONDS = float(os.getenv("DB_SLOW_WRITE_SECONDS", "0.1"))
+RECONCILE_STATE_PATH = os.getenv("RECONCILE_STATE_PATH", str(BASE_DIR / "reconcile-state.json"))
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "1000"))
+RECONCILE_GRACE_SECONDS = int(os.getenv("RECONCILE_GRACE_SECONDS", "3600"))
+DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", "500"))
+DELETE_UNLINK_WORKERS = int(os.getenv("DELETE_UNLINK_WORKERS", "4"))
+DELETE_GRACE_SECONDS = int(os.getenv("DELETE_GRACE_SECONDS", "86400"))
+SEARCH_RANK_LIMIT = int(os.getenv("SEARCH_RANK_LIMIT", "20000"))
+BACKUP_DIR = os.getenv("BACKUP_DIR", str(BASE_DIR / "backups"))
+BACKUP_INTERVAL_HOURS = float(os.getenv("BACKUP_INTERVAL_HOURS", "24"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+BACKUP_COMPRESS = os.getenv("BACKUP_COMPRESS", "false").lower() in {"1", "true", "yes"}
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+MODEL_REGISTRY_TTL_SECONDS = float(os.getenv("MODEL_REGISTRY_TTL_SECONDS", "300"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "5"))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "600"))
+JOB_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("JOB_SHUTDOWN_TIMEOUT_SECONDS", "30"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
@@ -1,10 +1,15 @@
 from pathlib import Path
 import os
 import sqlite3
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, event
 from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
+import config
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 DEFAULT_DB_PATH = BASE_DIR / "gallery.db"
 DATABASE_URL = os.getenv("DATABASE_URL") or f"sqlite:///{DEFAULT_DB_PATH}"
@@ -12,15 +17,90 @@ DB_URL = make_url(DATABASE_URL)
 IS_SQLITE = DB_URL.drivername.startswith("sqlite")
 
 
+def _async_database_url() -> str:
+    """
+    The same database through an asyncio driver: aiosqlite for SQLite.
+    Other backends need ASYNC_DATABASE_URL (e.g. postgresql+asyncpg://...).
+    """
+    override = os.getenv("ASYNC_DATABASE_URL")
+    if override:
+        return override
+    if IS_SQLITE:
+        return DB_URL.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    raise RuntimeError(
+        f"ASYNC_DATABASE_URL must be set for the {DB_URL.get_backend_name()} backend "
+        "(e.g. postgresql+asyncpg://...)."
+    )
+
+
+ASYNC_DATABASE_URL = _async_database_url()
+
+
 class Base(DeclarativeBase):
     pass
 
 
-engine = create_engine(
-    DATABASE_URL,
-    echo=False,
-    future=True
-)
+def _sqlite_connect_args() -> dict:
+    return {
+        "timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        "check_same_thread": False,
+        "cached_statements": config.SQLITE_CACHED_STATEMENTS,
+    }
+
+
+def _apply_sqlite_pragmas(dbapi_connection, read_only: bool) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        if not read_only:
+            # WAL lets readers keep going while a write is in progress
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+# Only small writes go through the single writer in models.write_queue.
+# Uploads, deletes and other request-scoped writes commit through `engine`
+# and `async_engine` and rely on WAL and the busy timeout: the writer
+# thread would otherwise be held for the length of a file transfer.
+if IS_SQLITE:
+    engine = create_engine(
+        DATABASE_URL,
+        echo=False,
+        future=True,
+        connect_args=_sqlite_connect_args(),
+    )
+    # Separate pool for GET routes; query_only connections never take the write lock
+    read_engine = create_engine(
+        DATABASE_URL,
+        echo=False,
+        future=True,
+        connect_args=_sqlite_connect_args(),
+        pool_size=config.DB_READ_POOL_SIZE,
+        max_overflow=config.DB_READ_POOL_SIZE,
+    )
+    # Used by async def routes so database I/O never blocks the event loop.
+    # aiosqlite runs each connection on its own thread.
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        echo=False,
+        connect_args=_sqlite_connect_args(),
+    )
+    for write_engine in (engine, async_engine.sync_engine):
+        event.listen(write_engine, "connect", lambda conn, _: _apply_sqlite_pragmas(conn, read_only=False))
+    event.listen(read_engine, "connect", lambda conn, _: _apply_sqlite_pragmas(conn, read_only=True))
+else:
+    engine = create_engine(
+        DATABASE_URL,
+        echo=False,
+        future=True
+    )
+    read_engine = engine
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False)
 
 SessionLocal = sessionmaker(
     bind=engine,
@@ -28,126 +108,119 @@ SessionLocal = sessionmaker(
     autocommit=False
 )
 
-def init_db() -> None:
-    Base.metadata.create_all(engine)
+ReadSessionLocal = sessionmaker(
+    bind=read_engine,
+    autoflush=False,
+    autocommit=False
+)
 
+# Loaded attributes stay readable after commit; async sessions cannot
+# lazily reload expired ones
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
 
-def ensure_media_rating_columns() -> None:
-    if not IS_SQLITE:
-        return
-    db_path = Path(DB_URL.database) if DB_URL.database else DEFAULT_DB_PATH
-    if not db_path.exists():
+
+# -------------------------
+# Lock-wait metrics
+# -------------------------
+# Write statements block inside SQLite while another connection holds the
+# write lock (up to the busy timeout), so their duration is the lock wait.
+
+_metrics_lock = threading.Lock()
+_lock_metrics = {
+    "write_statements": 0,
+    "write_seconds_total": 0.0,
+    "write_seconds_max": 0.0,
+    "slow_writes": 0,
+    "locked_errors": 0,
+}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started_at"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = conn.info.pop("query_started_at", None)
+    if started_at is None or statement.lstrip()[:6].upper() in ("SELECT", "PRAGMA"):
         return
 
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA table_info(media)")
-        columns = {row[1] for row in cursor.fetchall()}
+    elapsed = time.perf_counter() - started_at
+    with _metrics_lock:
+        _lock_metrics["write_statements"] += 1
+        _lock_metrics["write_seconds_total"] += elapsed
+        _lock_metrics["write_seconds_max"] = max(_lock_metrics["write_seconds_max"], elapsed)
+        if elapsed >= config.DB_SLOW_WRITE_SECONDS:
+            _lock_metrics["slow_writes"] += 1
 
-        if "rating" not in columns:
-            cursor.execute("ALTER TABLE media ADD COLUMN rating INTEGER")
-        if "rating_caption" not in columns:
-            cursor.execute("ALTER TABLE media ADD COLUMN rating_caption TEXT")
-        if "rated_at" not in columns:
-            cursor.execute("ALTER TABLE media ADD COLUMN rated_at DATETIME")
 
-        conn.commit()
+def _handle_error(context):
+    if "database is locked" in str(context.original_exception):
+        with _metrics_lock:
+            _lock_metrics["locked_errors"] += 1
 
 
-def _normalize_model_key(value: str) -> str:
-    return " ".join(value.lower().replace("_", " ").split())
+# Async writes contend for the same lock, so they are counted too
+for write_engine in {engine, async_engine.sync_engine}:
+    event.listen(write_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(write_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(write_engine, "handle_error", _handle_error)
 
 
-def ensure_model_normalized_columns() -> None:
-    if not IS_SQLITE:
-        return
-    db_path = Path(DB_URL.database) if DB_URL.database else DEFAULT_DB_PATH
-    if not db_path.exists():
-        return
+def lock_metrics() -> dict:
+    with _metrics_lock:
+        metrics = dict(_lock_metrics)
+    count = metrics["write_statements"]
+    metrics["write_seconds_avg"] = metrics["write_seconds_total"] / count if count else 0.0
+    return metrics
 
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='models'")
-        if cursor.fetchone() is None:
-            return
-        cursor.execute("PRAGMA table_info(models)")
-        columns = {row[1] for row in cursor.fetchall()}
-
-        if "normalized_name" not in columns:
-            cursor.execute("ALTER TABLE models ADD COLUMN normalized_name TEXT")
-
-        cursor.execute("SELECT id, name, normalized_name FROM models")
-        rows = cursor.fetchall()
-
-        canonical_by_norm: dict[str, int] = {}
-        duplicates: list[int] = []
-
-        for model_id, name, _ in rows:
-            normalized = _normalize_model_key(name or "")
-            if normalized in canonical_by_norm:
-                duplicates.append(model_id)
-            else:
-                canonical_by_norm[normalized] = model_id
-
-        for normalized, canonical_id in canonical_by_norm.items():
-            cursor.execute(
-                "UPDATE models SET normalized_name = ? WHERE id = ?",
-                (normalized, canonical_id),
-            )
-
-        for dup_id in duplicates:
-            cursor.execute(
-                "SELECT name FROM models WHERE id = ?",
-                (dup_id,),
-            )
-            dup_row = cursor.fetchone()
-            normalized = _normalize_model_key(dup_row[0]) if dup_row else ""
-            canonical_id = canonical_by_norm.get(normalized)
-            if canonical_id is None:
-                continue
-
-            cursor.execute(
-                "UPDATE media SET model_id = ? WHERE model_id = ?",
-                (canonical_id, dup_id),
-            )
-            cursor.execute("DELETE FROM models WHERE id = ?", (dup_id,))
-
-        cursor.execute(
-            "UPDATE models SET normalized_name = ? WHERE normalized_name IS NULL",
-            ("",),
-        )
+def init_db() -> None:
+    Base.metadata.create_all(engine)
 
-        cursor.execute(
-            "CREATE UNIQUE INDEX IF NOT EXISTS idx_models_normalized_name ON models(normalized_name)"
-        )
 
-        conn.commit()
+def sqlite_db_path() -> Path | None:
+    """
+    Path of the SQLite database file, or None for other backends.
+    """
+    if not IS_SQLITE:
+        return None
+    return Path(DB_URL.database) if DB_URL.database else DEFAULT_DB_PATH
 
 
-def ensure_model_card_columns() -> None:
+def check_database_backend() -> None:
+    """
+    The app needs SQLite: the model_stats rollup is kept by SQLite triggers
+    and the migrations only run there, so on another backend every count
+    and the round-robin draw would read an empty rollup.
+    """
     if not IS_SQLITE:
+        raise RuntimeError(
+            f"DATABASE_URL uses {DB_URL.get_backend_name()}, but VaultGalleryBot only supports SQLite "
+            "(the model_stats rollup and schema migrations are SQLite-only)."
+        )
+
+
+def check_database_location() -> None:
+    """
+    Refuses to start on a SQLite file that would be lost or that replaces
+    the one used before: a file outside DATA_DIR (the mounted volume in
+    Docker), or a new file while gallery.db still sits in the project root.
+    """
+    path = sqlite_db_path()
+    if path is None:
         return
-    db_path = Path(DB_URL.database) if DB_URL.database else DEFAULT_DB_PATH
-    if not db_path.exists():
-        return
+    path = path.resolve()
 
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='models'")
-        if cursor.fetchone() is None:
-            return
-        cursor.execute("PRAGMA table_info(models)")
-        columns = {row[1] for row in cursor.fetchall()}
-
-        if "popularity" not in columns:
-            cursor.execute("ALTER TABLE models ADD COLUMN popularity INTEGER")
-        if "versatility" not in columns:
-            cursor.execute("ALTER TABLE models ADD COLUMN versatility INTEGER")
-        if "longevity" not in columns:
-            cursor.execute("ALTER TABLE models ADD COLUMN longevity INTEGER")
-        if "industry_impact" not in columns:
-            cursor.execute("ALTER TABLE models ADD COLUMN industry_impact INTEGER")
-        if "fan_appeal" not in columns:
-            cursor.execute("ALTER TABLE models ADD COLUMN fan_appeal INTEGER")
-
-        conn.commit()
+    if config.DATA_DIR and Path(config.DATA_DIR).resolve() not in path.parents:
+        raise RuntimeError(
+            f"DATABASE_URL points at {path}, outside DATA_DIR ({config.DATA_DIR}), so it would not persist. "
+            f"Use sqlite:///{Path(config.DATA_DIR) / 'gallery.db'} or another path inside DATA_DIR."
+        )
+    if not path.exists() and DEFAULT_DB_PATH.exists() and DEFAULT_DB_PATH.resolve() != path:
+        raise RuntimeError(
+            f"No database at {path}, but {DEFAULT_DB_PATH} exists. Move it there "
+            "(with any -wal and -shm files next to it) or point DATABASE_URL at it."
+        )
@@ -1,6 +1,10 @@
 from .database import engine, Base
 from . import model_entity
 from . import media_entity
+from . import job_entity
+from . import upload_session_entity
+from . import model_stats_entity
+from . import rotation_state_entity
 
 Base.metadata.create_all(engine)
 
@@ -0,0 +1,42 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, text
+from datetime import datetime
+from .database import Base
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=True)  # JSON
+    dedupe_key = Column(String, nullable=True)
+    media_id = Column(Integer, nullable=True, index=True)
+
+    # pending -> running -> done | failed (pending again while retries remain)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    last_error = Column(Text, nullable=True)
+
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    # Set by the claiming worker, which refreshes heartbeat_at while the job
+    # runs; a stale heartbeat means the worker is gone
+    worker_id = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index("ix_jobs_status_finished_at", "status", "finished_at"),
+        # Only one queued or running job per dedupe key
+        Index(
+            "ux_jobs_active_dedupe_key",
+            "dedupe_key",
+            unique=True,
+            sqlite_where=text("status IN ('pending', 'running')"),
+            postgresql_where=text("status IN ('pending', 'running')"),
+        ),
+    )
@@ -1,20 +1,58 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, text
 from datetime import datetime
+import random
 from .database import Base
+from .soft_delete import SoftDeleteMixin
 
 
-class Media(Base):
+def new_rotation_key() -> int:
+    return random.getrandbits(62)
+
+
+class Media(SoftDeleteMixin, Base):
     __tablename__ = "media"
 
     id = Column(Integer, primary_key=True)
     model_id = Column(Integer, ForeignKey("models.id"), nullable=False)
-    file_path = Column(String, nullable=False)
+    file_path = Column(String, nullable=False, index=True)
     media_type = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # NEW: track when media was last sent
     last_sent_at = Column(DateTime, nullable=True)
 
+    # Per-model rotation queue: items are sent in (cycle, key) order, and a
+    # sent item moves to the next cycle under a fresh random key
+    rotation_cycle = Column(Integer, nullable=False, default=0, server_default="0")
+    rotation_key = Column(Integer, nullable=False, default=new_rotation_key, server_default="0")
+
     rating = Column(Integer, nullable=True)
     rating_caption = Column(String, nullable=True)
     rated_at = Column(DateTime, nullable=True)
+
+    # Content-addressed storage: SHA-256 of the file, shared by duplicates
+    content_hash = Column(String, nullable=True, index=True)
+    file_size = Column(Integer, nullable=True)
+    original_filename = Column(String, nullable=True)
+    thumbnails_at = Column(DateTime, nullable=True)
+
+    # 64-bit dHash as 16 hex chars, for near-duplicate lookups
+    perceptual_hash = Column(String, nullable=True)
+
+    # Match the gallery query shapes; see models/migrations.py
+    __table_args__ = (
+        Index("ix_media_model_created", "model_id", created_at.desc()),
+        Index("ix_media_type_rating_created", "media_type", rating.desc(), created_at.desc()),
+        Index("ix_media_model_rotation", "model_id", "rotation_cycle", "rotation_key"),
+        Index("ix_media_created", created_at.desc()),
+        # Tombstones only, for the purger
+        Index("ix_media_deleted_at", "deleted_at", sqlite_where=text("deleted_at IS NOT NULL")),
+        # Live rows only, so the model_stats triggers find a model's newest
+        # live upload without stepping over tombstones
+        Index(
+            "ix_media_live_model_created",
+            "model_id",
+            created_at.desc(),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+    )
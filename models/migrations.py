@@ -0,0 +1,542 @@
+import argparse
+from datetime import datetime
+import logging
+import sqlite3
+from typing import Callable
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+import config
+from .database import ReadSessionLocal, sqlite_db_path
+from .model_stats_entity import LAST_LIVE_UPLOAD_SQL, MODEL_STATS_TRIGGERS, REBUILD_MODEL_STATS
+from .search_index import CONFIGURE_SEARCH_RANK, CREATE_SEARCH_INDEX, REBUILD_SEARCH_INDEX, SEARCH_INDEX_TRIGGERS
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------
+# Migrations
+# -------------------------
+# Each step receives a cursor inside an open transaction and must tolerate
+# databases that already had the change applied by the old startup checks.
+
+def _columns(cursor, table: str) -> set[str]:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _add_columns(cursor, table: str, columns: dict[str, str]) -> None:
+    existing = _columns(cursor, table)
+    for name, column_type in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+
+def _media_rating_columns(cursor) -> None:
+    _add_columns(
+        cursor,
+        "media",
+        {
+            "rating": "INTEGER",
+            "rating_caption": "TEXT",
+            "rated_at": "DATETIME",
+        },
+    )
+
+
+def _normalize_model_key(value: str) -> str:
+    return " ".join(value.lower().replace("_", " ").split())
+
+
+def _model_normalized_names(cursor) -> None:
+    _add_columns(cursor, "models", {"normalized_name": "TEXT"})
+
+    cursor.execute("SELECT id, name, normalized_name FROM models")
+    rows = cursor.fetchall()
+
+    canonical_by_norm: dict[str, int] = {}
+    duplicates: list[int] = []
+
+    for model_id, name, _ in rows:
+        normalized = _normalize_model_key(name or "")
+        if normalized in canonical_by_norm:
+            duplicates.append(model_id)
+        else:
+            canonical_by_norm[normalized] = model_id
+
+    for normalized, canonical_id in canonical_by_norm.items():
+        cursor.execute(
+            "UPDATE models SET normalized_name = ? WHERE id = ?",
+            (normalized, canonical_id),
+        )
+
+    for dup_id in duplicates:
+        cursor.execute(
+            "SELECT name FROM models WHERE id = ?",
+            (dup_id,),
+        )
+        dup_row = cursor.fetchone()
+        normalized = _normalize_model_key(dup_row[0]) if dup_row else ""
+        canonical_id = canonical_by_norm.get(normalized)
+        if canonical_id is None:
+            continue
+
+        cursor.execute(
+            "UPDATE media SET model_id = ? WHERE model_id = ?",
+            (canonical_id, dup_id),
+        )
+        cursor.execute("DELETE FROM models WHERE id = ?", (dup_id,))
+
+    cursor.execute(
+        "UPDATE models SET normalized_name = ? WHERE normalized_name IS NULL",
+        ("",),
+    )
+
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_models_normalized_name ON models(normalized_name)"
+    )
+
+
+def _model_card_columns(cursor) -> None:
+    _add_columns(
+        cursor,
+        "models",
+        {
+            "popularity": "INTEGER",
+            "versatility": "INTEGER",
+            "longevity": "INTEGER",
+            "industry_impact": "INTEGER",
+            "fan_appeal": "INTEGER",
+        },
+    )
+
+
+def _media_storage_columns(cursor) -> None:
+    _add_columns(
+        cursor,
+        "media",
+        {
+            "content_hash": "TEXT",
+            "file_size": "INTEGER",
+            "original_filename": "TEXT",
+            "thumbnails_at": "DATETIME",
+            "perceptual_hash": "TEXT",
+        },
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_media_file_path ON media(file_path)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_media_content_hash ON media(content_hash)")
+
+
+def _media_query_indexes(cursor) -> None:
+    # Gallery, latest and per-model listings: WHERE model_id = ? ORDER BY created_at DESC
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS ix_media_model_created ON media(model_id, created_at DESC)"
+    )
+    # /top and rating stats: WHERE media_type = ? ORDER BY rating DESC, created_at DESC
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS ix_media_type_rating_created "
+        "ON media(media_type, rating DESC, created_at DESC)"
+    )
+    # Fair rotation: WHERE model_id = ? ORDER BY last_sent_at
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS ix_media_model_last_sent ON media(model_id, last_sent_at)"
+    )
+    # /recent and model previews: ORDER BY created_at DESC
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_media_created ON media(created_at DESC)")
+    cursor.execute("ANALYZE media")
+
+
+# model_stats triggers and rebuild as they were at version 6, before media
+# had deleted_at. Later versions replace them; do not edit these to match
+# model_stats_entity, or upgrading an old database breaks on missing columns.
+
+def _v6_delta(row: str, sign: str) -> str:
+    return f"""
+        total_count = total_count {sign} 1,
+        image_count = image_count {sign} IFNULL({row}.media_type = 'image', 0),
+        video_count = video_count {sign} IFNULL({row}.media_type = 'video', 0),
+        rated_count = rated_count {sign} ({row}.rating IS NOT NULL),
+        unrated_count = unrated_count {sign} (IFNULL({row}.media_type = 'image', 0) AND {row}.rating IS NULL),
+        rating_sum = rating_sum {sign} IFNULL({row}.rating, 0),
+        rating_90_count = rating_90_count {sign} IFNULL({row}.rating >= 90, 0),
+        rating_80_count = rating_80_count {sign} IFNULL({row}.rating >= 80 AND {row}.rating < 90, 0),
+        rating_low_count = rating_low_count {sign} IFNULL({row}.rating < 80, 0)"""
+
+
+_V6_LAST_UPLOAD = "(SELECT MAX(created_at) FROM media WHERE model_id = {model_id})"
+
+_V6_MODEL_STATS_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS trg_model_stats_media_insert",
+    f"""
+    CREATE TRIGGER trg_model_stats_media_insert AFTER INSERT ON media
+    BEGIN
+        INSERT OR IGNORE INTO model_stats (model_id) VALUES (NEW.model_id);
+        UPDATE model_stats SET {_v6_delta("NEW", "+")},
+            last_upload_at = CASE
+                WHEN last_upload_at IS NULL OR NEW.created_at > last_upload_at THEN NEW.created_at
+                ELSE last_upload_at
+            END
+        WHERE model_id = NEW.model_id;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS trg_model_stats_media_delete",
+    f"""
+    CREATE TRIGGER trg_model_stats_media_delete AFTER DELETE ON media
+    BEGIN
+        UPDATE model_stats SET {_v6_delta("OLD", "-")},
+            last_upload_at = {_V6_LAST_UPLOAD.format(model_id="OLD.model_id")}
+        WHERE model_id = OLD.model_id;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS trg_model_stats_media_update",
+    f"""
+    CREATE TRIGGER trg_model_stats_media_update
+    AFTER UPDATE OF model_id, media_type, rating, created_at ON media
+    BEGIN
+        UPDATE model_stats SET {_v6_delta("OLD", "-")},
+            last_upload_at = {_V6_LAST_UPLOAD.format(model_id="OLD.model_id")}
+        WHERE model_id = OLD.model_id;
+        INSERT OR IGNORE INTO model_stats (model_id) VALUES (NEW.model_id);
+        UPDATE model_stats SET {_v6_delta("NEW", "+")},
+            last_upload_at = {_V6_LAST_UPLOAD.format(model_id="NEW.model_id")}
+        WHERE model_id = NEW.model_id;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS trg_model_stats_model_delete",
+    """
+    CREATE TRIGGER trg_model_stats_model_delete AFTER DELETE ON models
+    BEGIN
+        DELETE FROM model_stats WHERE model_id = OLD.id;
+    END
+    """,
+]
+
+_V6_REBUILD_MODEL_STATS = [
+    "DELETE FROM model_stats",
+    """
+    INSERT INTO model_stats (
+        model_id, total_count, image_count, video_count, rated_count, unrated_count,
+        rating_sum, rating_90_count, rating_80_count, rating_low_count, last_upload_at
+    )
+    SELECT
+        model_id,
+        COUNT(*),
+        SUM(IFNULL(media_type = 'image', 0)),
+        SUM(IFNULL(media_type = 'video', 0)),
+        COUNT(rating),
+        SUM(IFNULL(media_type = 'image', 0) AND rating IS NULL),
+        IFNULL(SUM(rating), 0),
+        SUM(IFNULL(rating >= 90, 0)),
+        SUM(IFNULL(rating >= 80 AND rating < 90, 0)),
+        SUM(IFNULL(rating < 80, 0)),
+        MAX(created_at)
+    FROM media
+    WHERE model_id IS NOT NULL
+    GROUP BY model_id
+    """,
+]
+
+
+def _model_stats_table(cursor) -> None:
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS model_stats ("
+        "model_id INTEGER NOT NULL PRIMARY KEY, "
+        "total_count INTEGER NOT NULL DEFAULT 0, "
+        "image_count INTEGER NOT NULL DEFAULT 0, "
+        "video_count INTEGER NOT NULL DEFAULT 0, "
+        "rated_count INTEGER NOT NULL DEFAULT 0, "
+        "unrated_count INTEGER NOT NULL DEFAULT 0, "
+        "rating_sum INTEGER NOT NULL DEFAULT 0, "
+        "rating_90_count INTEGER NOT NULL DEFAULT 0, "
+        "rating_80_count INTEGER NOT NULL DEFAULT 0, "
+        "rating_low_count INTEGER NOT NULL DEFAULT 0, "
+        "last_upload_at DATETIME)"
+    )
+    for statement in _V6_MODEL_STATS_TRIGGERS + _V6_REBUILD_MODEL_STATS:
+        cursor.execute(statement)
+
+
+def _model_slugs(cursor) -> None:
+    _add_columns(cursor, "models", {"slug": "TEXT"})
+
+    cursor.execute("SELECT id, name FROM models ORDER BY id")
+    taken: set[str] = set()
+    for model_id, name in cursor.fetchall():
+        # Same rule as model_service.slugify_model_name
+        base = (name or "").strip().lower().replace(" ", "_")
+        slug, suffix = base, model_id
+        # A suffixed slug can itself be another model's name ("Jane Doe 2")
+        while slug in taken:
+            slug = f"{base}_{suffix}"
+            suffix += 1
+        taken.add(slug)
+        cursor.execute("UPDATE models SET slug = ? WHERE id = ?", (slug, model_id))
+
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_models_slug ON models(slug)")
+
+
+def _media_rotation_queue(cursor) -> None:
+    _add_columns(
+        cursor,
+        "media",
+        {
+            "rotation_cycle": "INTEGER NOT NULL DEFAULT 0",
+            "rotation_key": "INTEGER NOT NULL DEFAULT 0",
+        },
+    )
+    # One shuffled round over everything, with never-sent media in the lower
+    # half of the key range so it still goes first, as with last_sent_at
+    cursor.execute(
+        "UPDATE media SET rotation_cycle = 0, rotation_key = (random() & 2305843009213693951) "
+        "+ CASE WHEN last_sent_at IS NULL THEN 0 ELSE 2305843009213693952 END"
+    )
+    cursor.execute("DROP INDEX IF EXISTS ix_media_model_last_sent")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS ix_media_model_rotation "
+        "ON media(model_id, rotation_cycle, rotation_key)"
+    )
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS rotation_state ("
+        "id INTEGER NOT NULL PRIMARY KEY, last_model_id INTEGER NOT NULL DEFAULT 0)"
+    )
+    cursor.execute("ANALYZE media")
+
+
+def _soft_delete_tombstones(cursor) -> None:
+    _add_columns(cursor, "media", {"deleted_at": "DATETIME"})
+    _add_columns(cursor, "models", {"deleted_at": "DATETIME"})
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS ix_media_deleted_at ON media(deleted_at) "
+        "WHERE deleted_at IS NOT NULL"
+    )
+    # Same counts, but tombstoned rows no longer contribute. Needs the
+    # columns above, so the current triggers are only installed from here.
+    for statement in MODEL_STATS_TRIGGERS + REBUILD_MODEL_STATS:
+        cursor.execute(statement)
+
+
+def _media_search_index(cursor) -> None:
+    cursor.execute(CREATE_SEARCH_INDEX)
+    cursor.execute(CONFIGURE_SEARCH_RANK)
+    for statement in SEARCH_INDEX_TRIGGERS + REBUILD_SEARCH_INDEX:
+        cursor.execute(statement)
+
+
+def _live_media_index(cursor) -> None:
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS ix_media_live_model_created "
+        "ON media(model_id, created_at DESC) WHERE deleted_at IS NULL"
+    )
+    cursor.execute("ANALYZE media")
+
+
+def _job_heartbeats(cursor) -> None:
+    if not _columns(cursor, "jobs"):
+        # Created with these columns by init_db
+        return
+    _add_columns(cursor, "jobs", {"worker_id": "TEXT", "heartbeat_at": "DATETIME"})
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS ix_jobs_status_finished_at ON jobs(status, finished_at)"
+    )
+
+
+def _media_created_at_backfill(cursor) -> None:
+    # Keyset pages compare created_at, which fails for NULL. The epoch keeps
+    # these rows last, where NULLs already sorted.
+    cursor.execute(
+        "UPDATE media SET created_at = '1970-01-01 00:00:00.000000' WHERE created_at IS NULL"
+    )
+
+
+MIGRATIONS = [
+    (1, "media rating columns", _media_rating_columns),
+    (2, "model normalized names", _model_normalized_names),
+    (3, "model card columns", _model_card_columns),
+    (4, "media storage columns", _media_storage_columns),
+    (5, "media query indexes", _media_query_indexes),
+    (6, "model stats rollup", _model_stats_table),
+    (7, "model slugs", _model_slugs),
+    (8, "media rotation queue", _media_rotation_queue),
+    (9, "soft delete tombstones", _soft_delete_tombstones),
+    (10, "media full-text search", _media_search_index),
+    (11, "live media index", _live_media_index),
+    (12, "job heartbeats", _job_heartbeats),
+    (13, "media created_at backfill", _media_created_at_backfill),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# -------------------------
+# Runner
+# -------------------------
+
+def _connect(db_path) -> sqlite3.Connection:
+    # Autocommit mode so BEGIN/COMMIT below also cover DDL statements
+    conn = sqlite3.connect(db_path, timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at DATETIME NOT NULL)"
+    )
+    return conn
+
+
+def _current_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def run_migrations() -> list[int]:
+    """
+    Applies pending migrations, each in its own transaction.
+    Costs a single query when the schema is already current.
+    Returns the versions that were applied.
+    """
+    db_path = sqlite_db_path()
+    if db_path is None or not db_path.exists():
+        return []
+
+    applied = []
+    conn = _connect(db_path)
+    try:
+        if _current_version(conn) >= LATEST_VERSION:
+            return []
+
+        for version, name, apply in MIGRATIONS:
+            # IMMEDIATE takes the write lock first, so two processes starting
+            # together cannot both apply the same step
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if _current_version(conn) >= version:
+                    conn.execute("COMMIT")
+                    continue
+                apply(conn.cursor())
+                conn.execute(
+                    "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                    (version, name, datetime.utcnow().isoformat(sep=" ")),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            logger.info("Applied migration %s: %s", version, name)
+            applied.append(version)
+    finally:
+        conn.close()
+
+    return applied
+
+
+# -------------------------
+# Query plan check
+# -------------------------
+# The media queries behind each page and the delete and rotation paths,
+# run through the same service code. Only the first statement each one
+# sends is kept, and it is explained instead of executed. Each must be
+# answered from an index rather than a full scan of media.
+
+class _Captured(Exception):
+    def __init__(self, statement: str, parameters):
+        super().__init__(statement)
+        self.statement = statement
+        self.parameters = parameters
+
+
+def _capture(conn, cursor, statement, parameters, context, executemany):
+    raise _Captured(statement, parameters)
+
+
+def query_plans() -> dict[str, Callable[[Session], object]]:
+    # Imported here: the services import the models
+    from services import bulk_delete_service, model_service, pagination_service, random_service, trash_service
+
+    far_future = datetime(2100, 1, 1)
+
+    def page(query, columns, key):
+        return pagination_service.paginate(query, columns, lambda row: key, pagination_service.encode_cursor("after", key))
+
+    return {
+        "/models/{slug} gallery": lambda db: page(
+            model_service.model_gallery_query(db, 1), model_service.GALLERY_PAGE_COLUMNS, (far_future, 1)
+        ),
+        "/api/media/model/{id}": lambda db: model_service.get_all_media_for_model(db, 1),
+        "/top": lambda db: page(
+            model_service.top_rated_query(db), model_service.TOP_PAGE_COLUMNS, (100, far_future, 1)
+        ),
+        "/recent": lambda db: page(
+            model_service.recent_media_query(db), model_service.RECENT_PAGE_COLUMNS, (far_future, 1)
+        ),
+        "/models preview": lambda db: model_service.latest_media_per_model_query(db).all(),
+        "rotation draw": lambda db: random_service.rotation_head_query(db, 1).first(),
+        "rotation head cycle": lambda db: model_service.head_rotation_cycle(db, 1),
+        "model stats last upload": lambda db: db.execute(text(LAST_LIVE_UPLOAD_SQL.format(model_id=1))),
+        "file references": lambda db: model_service.count_media_references(db, "/x"),
+        "content references": lambda db: model_service.count_content_references(db, "x"),
+        "purge due media": lambda db: bulk_delete_service.batch_query(
+            db, trash_service.due_media_criteria(far_future), 0, config.DELETE_BATCH_SIZE
+        ).all(),
+    }
+
+
+def _first_statement(session: Session, run: Callable[[Session], object]) -> tuple[str, object]:
+    connection = session.connection()
+    event.listen(connection, "before_cursor_execute", _capture)
+    try:
+        run(session)
+    except _Captured as captured:
+        return captured.statement, captured.parameters
+    finally:
+        event.remove(connection, "before_cursor_execute", _capture)
+    raise RuntimeError("Query sent no statement")
+
+
+def check_query_plans() -> dict[str, str]:
+    """
+    Runs EXPLAIN QUERY PLAN for query_plans() and returns {name: plan} for
+    every query that scans media without an index. Empty means all good.
+    """
+    db_path = sqlite_db_path()
+    if db_path is None or not db_path.exists():
+        return {}
+
+    failures = {}
+    session = ReadSessionLocal()
+    try:
+        for name, run in query_plans().items():
+            statement, parameters = _first_statement(session, run)
+            rows = session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            plan = " | ".join(row[-1] for row in rows)
+            scans_table = any(
+                step.startswith("SCAN media") and "INDEX" not in step
+                for step in plan.split(" | ")
+            )
+            if scans_table or "media" not in plan:
+                failures[name] = plan
+    finally:
+        session.close()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database schema migrations.")
+    parser.add_argument("command", choices=["migrate", "status", "check-plans"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "migrate":
+        print(f"Applied: {run_migrations() or 'nothing'}")
+    elif args.command == "status":
+        path = sqlite_db_path()
+        if path is None or not path.exists():
+            print("No SQLite database found")
+        else:
+            conn = _connect(path)
+            try:
+                print(f"Schema version {_current_version(conn)} of {LATEST_VERSION}")
+            finally:
+                conn.close()
+    else:
+        problems = check_query_plans()
+        for name, plan in problems.items():
+            print(f"FULL SCAN {name}: {plan}")
+        print("All media queries use an index" if not problems else f"{len(problems)} queries scan media")
+        raise SystemExit(1 if problems else 0)
@@ -1,13 +1,15 @@
 from sqlalchemy import Column, Integer, String
 from .database import Base
+from .soft_delete import SoftDeleteMixin
 
 
-class Model(Base):
+class Model(SoftDeleteMixin, Base):
     __tablename__ = "models"
 
     id = Column(Integer, primary_key=True)
     name = Column(String, unique=True, nullable=False)
     normalized_name = Column(String, unique=True, nullable=False, index=True)
+    slug = Column(String, unique=True, nullable=False, index=True)  # URL key, see model_service.slugify_model_name
     popularity = Column(Integer, nullable=True)
     versatility = Column(Integer, nullable=True)
     longevity = Column(Integer, nullable=True)
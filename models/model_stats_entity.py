@@ -0,0 +1,163 @@
+from sqlalchemy import Column, Integer, DateTime
+from .database import Base
+
+
+class ModelStats(Base):
+    """
+    Per-model media counts, kept current by the triggers below so every
+    write path (uploads, deletes, rating jobs, repairs) updates them in the
+    same transaction as the media row.
+    """
+
+    __tablename__ = "model_stats"
+
+    model_id = Column(Integer, primary_key=True)
+    total_count = Column(Integer, nullable=False, default=0, server_default="0")
+    image_count = Column(Integer, nullable=False, default=0, server_default="0")
+    video_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rated_count = Column(Integer, nullable=False, default=0, server_default="0")  # any media with a rating
+    unrated_count = Column(Integer, nullable=False, default=0, server_default="0")  # images without a rating
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_90_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_80_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_low_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_upload_at = Column(DateTime, nullable=True)
+
+    @classmethod
+    def empty(cls, model_id: int | None = None) -> "ModelStats":
+        """Unsaved zero row for models that have no media yet."""
+        counts = {column.name: 0 for column in cls.__table__.columns if column.server_default is not None}
+        return cls(model_id=model_id, **counts)
+
+    @property
+    def rated_images(self) -> int:
+        return max(self.image_count - self.unrated_count, 0)
+
+    @property
+    def avg_rating(self) -> float | None:
+        return self.rating_sum / self.rated_count if self.rated_count else None
+
+
+# -------------------------
+# Maintenance SQL
+# -------------------------
+# Installed by migration 9 and used by the rebuild command. Migration 6
+# keeps its own frozen copy from before media had deleted_at.
+
+def _delta(row: str, sign: str) -> str:
+    return f"""
+        total_count = total_count {sign} 1,
+        image_count = image_count {sign} IFNULL({row}.media_type = 'image', 0),
+        video_count = video_count {sign} IFNULL({row}.media_type = 'video', 0),
+        rated_count = rated_count {sign} ({row}.rating IS NOT NULL),
+        unrated_count = unrated_count {sign} (IFNULL({row}.media_type = 'image', 0) AND {row}.rating IS NULL),
+        rating_sum = rating_sum {sign} IFNULL({row}.rating, 0),
+        rating_90_count = rating_90_count {sign} IFNULL({row}.rating >= 90, 0),
+        rating_80_count = rating_80_count {sign} IFNULL({row}.rating >= 80 AND {row}.rating < 90, 0),
+        rating_low_count = rating_low_count {sign} IFNULL({row}.rating < 80, 0)"""
+
+
+# The newest upload only moves backwards when the newest live row goes,
+# and then the live (model_id, created_at) index finds the next one in a
+# seek. Rows with deleted_at set are tombstones and are not counted.
+LAST_LIVE_UPLOAD_SQL = (
+    "SELECT created_at FROM media WHERE model_id = {model_id} AND deleted_at IS NULL "
+    "ORDER BY created_at DESC LIMIT 1"
+)
+
+
+def _last_upload(row: str) -> str:
+    return f"""CASE
+            WHEN {row}.created_at < last_upload_at THEN last_upload_at
+            ELSE ({LAST_LIVE_UPLOAD_SQL.format(model_id=f"{row}.model_id")})
+        END"""
+
+
+# Adding a live row can only move it forwards
+_LATEST_OF_NEW = """CASE
+                WHEN last_upload_at IS NULL OR NEW.created_at > last_upload_at THEN NEW.created_at
+                ELSE last_upload_at
+            END"""
+
+MODEL_STATS_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS trg_model_stats_media_insert",
+    f"""
+    CREATE TRIGGER trg_model_stats_media_insert AFTER INSERT ON media
+    WHEN NEW.deleted_at IS NULL
+    BEGIN
+        INSERT OR IGNORE INTO model_stats (model_id) VALUES (NEW.model_id);
+        UPDATE model_stats SET {_delta("NEW", "+")},
+            last_upload_at = {_LATEST_OF_NEW}
+        WHERE model_id = NEW.model_id;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS trg_model_stats_media_delete",
+    f"""
+    CREATE TRIGGER trg_model_stats_media_delete AFTER DELETE ON media
+    WHEN OLD.deleted_at IS NULL
+    BEGIN
+        UPDATE model_stats SET {_delta("OLD", "-")},
+            last_upload_at = {_last_upload("OLD")}
+        WHERE model_id = OLD.model_id;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS trg_model_stats_media_update",
+    f"""
+    CREATE TRIGGER trg_model_stats_media_update
+    AFTER UPDATE OF model_id, media_type, rating, created_at, deleted_at ON media
+    BEGIN
+        UPDATE model_stats SET {_delta("OLD", "-")},
+            last_upload_at = {_last_upload("OLD")}
+        WHERE model_id = OLD.model_id AND OLD.deleted_at IS NULL;
+        INSERT OR IGNORE INTO model_stats (model_id) VALUES (NEW.model_id);
+        UPDATE model_stats SET {_delta("NEW", "+")},
+            last_upload_at = {_LATEST_OF_NEW}
+        WHERE model_id = NEW.model_id AND NEW.deleted_at IS NULL;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS trg_model_stats_model_delete",
+    """
+    CREATE TRIGGER trg_model_stats_model_delete AFTER DELETE ON models
+    BEGIN
+        DELETE FROM model_stats WHERE model_id = OLD.id;
+    END
+    """,
+]
+
+MODEL_STATS_COLUMNS = (
+    "model_id",
+    "total_count",
+    "image_count",
+    "video_count",
+    "rated_count",
+    "unrated_count",
+    "rating_sum",
+    "rating_90_count",
+    "rating_80_count",
+    "rating_low_count",
+    "last_upload_at",
+)
+
+# The same numbers computed from scratch, in MODEL_STATS_COLUMNS order
+MODEL_STATS_AGGREGATE = """
+    SELECT
+        model_id,
+        COUNT(*),
+        SUM(IFNULL(media_type = 'image', 0)),
+        SUM(IFNULL(media_type = 'video', 0)),
+        COUNT(rating),
+        SUM(IFNULL(media_type = 'image', 0) AND rating IS NULL),
+        IFNULL(SUM(rating), 0),
+        SUM(IFNULL(rating >= 90, 0)),
+        SUM(IFNULL(rating >= 80 AND rating < 90, 0)),
+        SUM(IFNULL(rating < 80, 0)),
+        MAX(created_at)
+    FROM media
+    WHERE model_id IS NOT NULL AND deleted_at IS NULL
+    GROUP BY model_id
+"""
+
+REBUILD_MODEL_STATS = [
+    "DELETE FROM model_stats",
+    f"INSERT INTO model_stats ({', '.join(MODEL_STATS_COLUMNS)}) {MODEL_STATS_AGGREGATE}",
+]
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer
+from .database import Base
+
+
+class RotationState(Base):
+    """
+    Single row holding where the round-robin over models stopped, so a
+    restart continues with the next model instead of starting over.
+    """
+
+    __tablename__ = "rotation_state"
+
+    id = Column(Integer, primary_key=True)  # always 1
+    last_model_id = Column(Integer, nullable=False, default=0, server_default="0")
@@ -0,0 +1,75 @@
+"""
+FTS5 index over the searchable text of each live media row, kept in sync
+by triggers so every write path (uploads, renames, rating jobs, deletes,
+restores) updates it in the same transaction. rowid is media.id.
+
+The tags column is reserved for media tags; it is empty until they exist.
+"""
+
+SEARCH_COLUMNS = ("model_name", "original_filename", "rating_caption", "tags")
+
+# bm25 weights in SEARCH_COLUMNS order: a hit on the model name counts most
+SEARCH_WEIGHTS = (10.0, 4.0, 1.0, 6.0)
+
+CREATE_SEARCH_INDEX = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS media_search USING fts5(
+        {", ".join(SEARCH_COLUMNS)},
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+_INSERT_NEW = """
+        INSERT INTO media_search (rowid, model_name, original_filename, rating_caption, tags)
+        SELECT NEW.id, models.name, NEW.original_filename, NEW.rating_caption, ''
+        FROM models WHERE models.id = NEW.model_id AND NEW.deleted_at IS NULL;"""
+
+SEARCH_INDEX_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS trg_media_search_insert",
+    f"""
+    CREATE TRIGGER trg_media_search_insert AFTER INSERT ON media
+    BEGIN{_INSERT_NEW}
+    END
+    """,
+    "DROP TRIGGER IF EXISTS trg_media_search_delete",
+    """
+    CREATE TRIGGER trg_media_search_delete AFTER DELETE ON media
+    BEGIN
+        DELETE FROM media_search WHERE rowid = OLD.id;
+    END
+    """,
+    # Soft delete and restore go through here too
+    "DROP TRIGGER IF EXISTS trg_media_search_update",
+    f"""
+    CREATE TRIGGER trg_media_search_update
+    AFTER UPDATE OF model_id, original_filename, rating_caption, deleted_at ON media
+    BEGIN
+        DELETE FROM media_search WHERE rowid = OLD.id;{_INSERT_NEW}
+    END
+    """,
+    "DROP TRIGGER IF EXISTS trg_media_search_model_rename",
+    """
+    CREATE TRIGGER trg_media_search_model_rename AFTER UPDATE OF name ON models
+    BEGIN
+        UPDATE media_search SET model_name = NEW.name
+        WHERE rowid IN (SELECT id FROM media WHERE model_id = NEW.id AND deleted_at IS NULL);
+    END
+    """,
+]
+
+# Stored in the index, so ORDER BY rank uses these weights
+CONFIGURE_SEARCH_RANK = (
+    "INSERT INTO media_search (media_search, rank) "
+    f"VALUES ('rank', 'bm25({', '.join(str(weight) for weight in SEARCH_WEIGHTS)})')"
+)
+
+REBUILD_SEARCH_INDEX = [
+    "DELETE FROM media_search",
+    """
+    INSERT INTO media_search (rowid, model_name, original_filename, rating_caption, tags)
+    SELECT media.id, models.name, media.original_filename, media.rating_caption, ''
+    FROM media JOIN models ON models.id = media.model_id
+    WHERE media.deleted_at IS NULL
+    """,
+    "INSERT INTO media_search (media_search) VALUES ('optimize')",
+]
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, DateTime, event
+from sqlalchemy.orm import Session, with_loader_criteria
+
+# Execution option that lets maintenance code (purge, reference counts,
+# reconciliation) see soft-deleted rows:
+#   db.query(Media).execution_options(include_deleted=True)
+INCLUDE_DELETED = "include_deleted"
+
+
+class SoftDeleteMixin:
+    """
+    Rows with deleted_at set are tombstones waiting for purge_service.
+    They are left out of every ORM SELECT unless INCLUDE_DELETED is set.
+    """
+
+    deleted_at = Column(DateTime, nullable=True)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _hide_deleted_rows(execute_state) -> None:
+    if (
+        execute_state.is_select
+        and not execute_state.is_column_load
+        and not execute_state.is_relationship_load
+        and not execute_state.execution_options.get(INCLUDE_DELETED, False)
+    ):
+        execute_state.statement = execute_state.statement.options(
+            with_loader_criteria(
+                SoftDeleteMixin,
+                lambda cls: cls.deleted_at.is_(None),
+                include_aliases=True,
+            )
+        )
@@ -0,0 +1,138 @@
+from concurrent.futures import Future
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable
+
+from sqlalchemy.orm import Session
+
+import config
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteQueue:
+    """
+    Runs small writes on one dedicated writer thread.
+    Work submitted while a transaction is running is committed together in
+    the next one, so bursts of tiny updates cost one commit instead of many
+    competing for the SQLite write lock.
+    """
+
+    def __init__(self, session_factory=SessionLocal, max_batch: int | None = None):
+        self._session_factory = session_factory
+        self._max_batch = max(1, max_batch or config.DB_WRITE_BATCH_SIZE)
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "submitted": 0,
+            "batches": 0,
+            "failed": 0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+        }
+
+    def submit(self, work: Callable[[Session], Any]) -> Future:
+        """
+        Queues `work(session)`; the returned future resolves after commit.
+        `work` must not commit and may run twice if its batch is retried.
+        """
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((work, future, time.perf_counter()))
+        with self._metrics_lock:
+            self._metrics["submitted"] += 1
+        return future
+
+    def run(self, work: Callable[[Session], Any]) -> Any:
+        return self.submit(work).result()
+
+    def stop(self, timeout: float | None = None) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        self._thread = None
+
+    def metrics(self) -> dict:
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics["queue_depth"] = self._queue.qsize()
+        batches = metrics["batches"]
+        metrics["batch_size_avg"] = metrics["submitted"] / batches if batches else 0.0
+        return metrics
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            stopping = False
+            while len(batch) < self._max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._record_wait(batch)
+            self._run_batch(batch)
+            if stopping:
+                return
+
+    def _record_wait(self, batch: list) -> None:
+        now = time.perf_counter()
+        waits = [now - queued_at for _, _, queued_at in batch]
+        with self._metrics_lock:
+            self._metrics["batches"] += 1
+            self._metrics["queue_wait_seconds_total"] += sum(waits)
+            self._metrics["queue_wait_seconds_max"] = max(self._metrics["queue_wait_seconds_max"], *waits)
+
+    def _run_batch(self, batch: list) -> None:
+        session = self._session_factory()
+        try:
+            results = [work(session) for work, _, _ in batch]
+            session.commit()
+        except Exception as exc:
+            session.rollback()
+            if len(batch) == 1:
+                self._fail(batch[0][1], exc)
+                return
+            # Retry one by one so a single bad item does not sink the others
+            logger.warning("Write batch of %s failed, retrying individually: %s", len(batch), exc)
+            for item in batch:
+                self._run_batch([item])
+            return
+        finally:
+            session.close()
+
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def _fail(self, future: Future, exc: Exception) -> None:
+        with self._metrics_lock:
+            self._metrics["failed"] += 1
+        future.set_exception(exc)
+
+
+write_queue = WriteQueue()
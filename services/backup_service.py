@@ -0,0 +1,295 @@
+import argparse
+from datetime import datetime, timedelta
+import gzip
+import logging
+import os
+from pathlib import Path
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+import config
+from models.database import SessionLocal, sqlite_db_path
+from models.job_entity import Job
+from services import job_service
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SUFFIXES = (".db", ".db.gz")
+_TIMESTAMP_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+# -------------------------
+# Snapshots
+# -------------------------
+# Uses SQLite's online backup API, copying BACKUP_PAGES_PER_STEP pages at
+# a time. The source connection holds one read transaction for the whole
+# copy: under WAL that pins a consistent snapshot, so writers keep
+# committing and the copy never has to restart because of them.
+
+def _backup_dir() -> Path:
+    return Path(config.BACKUP_DIR)
+
+
+def _source_path() -> Path:
+    path = sqlite_db_path()
+    if path is None:
+        raise RuntimeError("Online backups are only supported for SQLite databases.")
+    if not path.exists():
+        raise FileNotFoundError(f"Database file not found: {path}")
+    return path
+
+
+def _snapshot_name(source: Path, taken_at: datetime) -> str:
+    return f"{source.stem}-{taken_at.strftime(_TIMESTAMP_FORMAT)}.db"
+
+
+def _snapshot_taken_at(path: Path) -> datetime | None:
+    name = path.name.removesuffix(".gz").removesuffix(".db")
+    try:
+        return datetime.strptime(name.rsplit("-", 1)[-1], _TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def _copy_online(source: Path, target: Path, progress: Callable[[int, int], None] | None) -> int:
+    src = sqlite3.connect(source, isolation_level=None)
+    dst = sqlite3.connect(target)
+    try:
+        src.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        src.execute("PRAGMA query_only=ON")
+        wal = src.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        if wal:
+            # Outside WAL a held read lock would block writers for the whole copy
+            src.execute("BEGIN")
+            src.execute("SELECT count(*) FROM sqlite_schema").fetchone()
+
+        steps = {"total": 0}
+
+        def on_step(status, remaining, total):
+            steps["total"] = total
+            if progress:
+                progress(total - remaining, total)
+
+        src.backup(dst, pages=max(1, config.BACKUP_PAGES_PER_STEP), progress=on_step)
+        if wal:
+            src.execute("COMMIT")
+
+        # A self-contained file: no -wal sidecar needed to open it
+        dst.execute("PRAGMA journal_mode=DELETE")
+        return steps["total"]
+    finally:
+        dst.close()
+        src.close()
+
+
+def check_integrity(path: Path) -> str:
+    """
+    Runs PRAGMA integrity_check on a snapshot, decompressing it to a temp
+    file first if needed. Returns "ok" or the first problems reported.
+    """
+    path = Path(path)
+    if path.name.endswith(".gz"):
+        with tempfile.TemporaryDirectory(dir=path.parent) as temp_dir:
+            plain = Path(temp_dir) / path.name.removesuffix(".gz")
+            with gzip.open(path, "rb") as in_file, open(plain, "wb") as out_file:
+                shutil.copyfileobj(in_file, out_file, config.UPLOAD_CHUNK_SIZE)
+            return check_integrity(plain)
+
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = connection.execute("PRAGMA integrity_check(10)").fetchall()
+    finally:
+        connection.close()
+    return "; ".join(row[0] for row in rows)
+
+
+def _compress(path: Path) -> Path:
+    compressed = path.with_name(path.name + ".gz")
+    partial = compressed.with_name(compressed.name + ".part")
+    with open(path, "rb") as in_file, gzip.open(partial, "wb", compresslevel=6) as out_file:
+        shutil.copyfileobj(in_file, out_file, config.UPLOAD_CHUNK_SIZE)
+    os.replace(partial, compressed)
+    path.unlink()
+    return compressed
+
+
+def create_backup(
+    compress: bool | None = None,
+    progress: Callable[[int, int], None] | None = None,
+) -> dict:
+    """
+    Writes a snapshot of the live database to BACKUP_DIR and checks its
+    integrity. A snapshot that fails the check is kept as *.corrupt for
+    inspection and raises. `progress` gets (pages copied, total pages).
+    """
+    compress = config.BACKUP_COMPRESS if compress is None else compress
+    source = _source_path()
+    backup_dir = _backup_dir()
+    backup_dir.mkdir(parents=True, exist_ok=True)
+
+    taken_at = datetime.utcnow()
+    final_path = backup_dir / _snapshot_name(source, taken_at)
+    # Not matched by list_backups until it is complete and checked
+    partial = final_path.with_name(final_path.name + ".part")
+
+    started = time.perf_counter()
+    try:
+        pages = _copy_online(source, partial, progress)
+        integrity = check_integrity(partial)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    if integrity != "ok":
+        corrupt = final_path.with_name(final_path.name + ".corrupt")
+        os.replace(partial, corrupt)
+        raise RuntimeError(f"Snapshot failed integrity check ({corrupt}): {integrity}")
+
+    os.replace(partial, final_path)
+    if compress:
+        final_path = _compress(final_path)
+
+    result = {
+        "name": final_path.name,
+        "path": str(final_path),
+        "size": final_path.stat().st_size,
+        "pages": pages,
+        "compressed": compress,
+        "integrity": integrity,
+        "taken_at": taken_at.isoformat(),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    logger.info("Database backup written: %s", result)
+    return result
+
+
+def list_backups() -> list[dict]:
+    """
+    Completed snapshots in BACKUP_DIR, newest first.
+    """
+    backup_dir = _backup_dir()
+    if not backup_dir.is_dir():
+        return []
+
+    snapshots = []
+    for path in backup_dir.iterdir():
+        taken_at = _snapshot_taken_at(path)
+        if not path.name.endswith(SNAPSHOT_SUFFIXES) or taken_at is None:
+            continue
+        snapshots.append(
+            {
+                "name": path.name,
+                "path": str(path),
+                "size": path.stat().st_size,
+                "compressed": path.name.endswith(".gz"),
+                "taken_at": taken_at.isoformat(),
+            }
+        )
+    return sorted(snapshots, key=lambda snapshot: snapshot["taken_at"], reverse=True)
+
+
+def prune_backups(keep: int | None = None) -> list[str]:
+    """
+    Deletes all but the newest `keep` snapshots (BACKUP_KEEP by default).
+    Returns the names removed.
+    """
+    keep = config.BACKUP_KEEP if keep is None else keep
+    removed = []
+    for snapshot in list_backups()[max(keep, 1):]:
+        Path(snapshot["path"]).unlink(missing_ok=True)
+        removed.append(snapshot["name"])
+    if removed:
+        logger.info("Pruned old backups: %s", removed)
+    return removed
+
+
+# -------------------------
+# Schedule
+# -------------------------
+# A pending "backup" job holds the next run. Each run queues its
+# successor before copying, so a failed backup does not end the schedule.
+
+def _schedule_backup(db: Session, run_after: datetime) -> Job:
+    return job_service.enqueue(
+        db,
+        "backup",
+        {"scheduled": True},
+        dedupe_key=f"backup:{run_after.isoformat(timespec='minutes')}",
+        max_attempts=1,
+        run_after=run_after,
+    )
+
+
+def ensure_backup_scheduled() -> Job | None:
+    """
+    Queues the next scheduled backup unless one is already pending: one
+    interval after the newest snapshot, or now when there is none.
+    Does nothing when BACKUP_INTERVAL_HOURS is 0 or the backend is not SQLite.
+    """
+    if config.BACKUP_INTERVAL_HOURS <= 0 or sqlite_db_path() is None:
+        return None
+
+    session = SessionLocal()
+    try:
+        pending = session.query(Job).filter(Job.kind == "backup", Job.status == "pending").first()
+        if pending:
+            return pending
+
+        snapshots = list_backups()
+        run_after = datetime.utcnow()
+        if snapshots:
+            latest = datetime.fromisoformat(snapshots[0]["taken_at"])
+            run_after = max(run_after, latest + timedelta(hours=config.BACKUP_INTERVAL_HOURS))
+        return _schedule_backup(session, run_after)
+    finally:
+        session.close()
+
+
+def run_backup_job(payload: dict) -> dict:
+    if payload.get("scheduled") and config.BACKUP_INTERVAL_HOURS > 0:
+        session = SessionLocal()
+        try:
+            _schedule_backup(session, datetime.utcnow() + timedelta(hours=config.BACKUP_INTERVAL_HOURS))
+        finally:
+            session.close()
+
+    result = create_backup(compress=payload.get("compress"))
+    result["pruned"] = prune_backups()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Online SQLite backups.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    create_parser = subparsers.add_parser("create", help="write a snapshot now, then apply retention")
+    create_parser.add_argument("--gzip", action="store_true", default=None, help="compress the snapshot")
+    create_parser.add_argument("--keep", type=int, help="snapshots to keep (default BACKUP_KEEP)")
+    subparsers.add_parser("list", help="list snapshots, newest first")
+    verify_parser = subparsers.add_parser("verify", help="integrity-check a snapshot")
+    verify_parser.add_argument("path", nargs="?", help="snapshot file (default: newest)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "create":
+        def show(copied: int, total: int) -> None:
+            print(f"\rCopied {copied}/{total} pages", end="", flush=True)
+
+        result = create_backup(compress=args.gzip, progress=show)
+        print(f"\nWrote {result['path']} ({result['size']} bytes, integrity {result['integrity']})")
+        for name in prune_backups(args.keep):
+            print(f"Removed {name}")
+    elif args.command == "list":
+        for snapshot in list_backups():
+            print(f"{snapshot['taken_at']}  {snapshot['size']:>12}  {snapshot['name']}")
+    else:
+        snapshots = list_backups()
+        path = args.path or (snapshots[0]["path"] if snapshots else None)
+        if not path:
+            raise SystemExit("No backups found")
+        result = check_integrity(Path(path))
+        print(f"{path}: {result}")
+        raise SystemExit(0 if result == "ok" else 1)
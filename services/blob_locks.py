@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+import threading
+from typing import Iterable, Iterator
+
+# Identical uploads share one store blob, so "no row references this file"
+# only holds until an upload reuses it. An upload holds its blobs' locks
+# from the move into the store until its rows commit or roll back, and a
+# release holds them from the reference count to the unlink.
+#
+# Locks are striped by path and belong to this process, which serves the
+# uploads and runs the job workers that purge.
+
+STRIPES = 64
+
+_locks = [threading.Lock() for _ in range(STRIPES)]
+
+
+def _stripes(file_paths: Iterable[str]) -> list[int]:
+    return sorted({hash(str(file_path)) % STRIPES for file_path in file_paths})
+
+
+def acquire(file_paths: Iterable[str]) -> None:
+    """
+    Blocks until every path is locked. Stripes are taken in index order,
+    so two batches waiting on each other never deadlock.
+    """
+    for stripe in _stripes(file_paths):
+        _locks[stripe].acquire()
+
+
+def release(file_paths: Iterable[str]) -> None:
+    for stripe in reversed(_stripes(file_paths)):
+        _locks[stripe].release()
+
+
+@contextmanager
+def held(file_paths: Iterable[str]) -> Iterator[None]:
+    file_paths = list(file_paths)
+    acquire(file_paths)
+    try:
+        yield
+    finally:
+        release(file_paths)
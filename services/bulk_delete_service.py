@@ -0,0 +1,131 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+from pathlib import Path
+from typing import Callable
+
+from sqlalchemy.orm import Query, Session
+
+import config
+from models.media_entity import Media
+from models.soft_delete import INCLUDE_DELETED
+from services import blob_locks, thumbnail_service
+
+logger = logging.getLogger(__name__)
+
+
+def _unlink(file_path: str) -> bool:
+    path = Path(file_path)
+    try:
+        path.unlink()
+        logger.info(f"Deleted media file: {path}")
+        return True
+    except FileNotFoundError:
+        logger.warning(f"Media file not found, skipping: {path}")
+    except OSError as e:
+        logger.error(f"Error deleting file {path}: {e}")
+    return False
+
+
+def _release_batch(db: Session, pool: ThreadPoolExecutor, rows: list) -> tuple[list[Future], set[str]]:
+    """
+    Queues unlinks for files and thumbnails of a committed batch that no
+    remaining row references, checked with one query per kind.
+    Soft-deleted rows still count as references until they are purged.
+    Returns the futures and the paths whose blob locks stay held until
+    the unlinks finish.
+    """
+    paths = {row.file_path for row in rows if row.file_path}
+    hashes = {row.content_hash for row in rows if row.content_hash}
+
+    # Locked before counting, so an upload reusing a blob commits first or waits
+    blob_locks.acquire(paths)
+    try:
+        references = db.query(Media).execution_options(**{INCLUDE_DELETED: True})
+        unreferenced = set(paths)
+        if paths:
+            unreferenced -= {
+                file_path
+                for (file_path,) in references.filter(Media.file_path.in_(paths)).with_entities(Media.file_path).distinct()
+            }
+        if hashes:
+            hashes -= {
+                content_hash
+                for (content_hash,) in references.filter(Media.content_hash.in_(hashes)).with_entities(Media.content_hash).distinct()
+            }
+    except BaseException:
+        blob_locks.release(paths)
+        raise
+
+    futures = [pool.submit(_unlink, file_path) for file_path in unreferenced]
+    futures += [pool.submit(thumbnail_service.delete_thumbnails, content_hash) for content_hash in hashes]
+    return futures, paths
+
+
+def batch_query(db: Session, criteria: tuple, after_id: int, batch_size: int) -> Query:
+    """The next batch of matching rows, tombstones included, in id order."""
+    return (
+        db.query(Media.id, Media.file_path, Media.content_hash)
+        .execution_options(**{INCLUDE_DELETED: True})
+        .filter(*criteria, Media.id > after_id)
+        .order_by(Media.id)
+        .limit(batch_size)
+    )
+
+
+def delete_media_where(
+    db: Session,
+    *criteria,
+    batch_size: int | None = None,
+    progress: Callable[[dict], None] | None = None,
+) -> dict:
+    """
+    Deletes media rows matching `criteria` in id order, tombstones included, one set-based
+    DELETE and commit per batch so the write lock is released between
+    batches. Files no longer referenced are unlinked on a small thread
+    pool while the next batch is deleted. Only one batch of ids and paths
+    is held at a time. `progress` is called with the running totals after
+    each batch.
+    """
+    batch_size = batch_size or config.DELETE_BATCH_SIZE
+    stats = {"deleted": 0, "batches": 0, "files_removed": 0, "last_id": 0}
+    pending: list[Future] = []
+    locked: set[str] = set()
+
+    def settle() -> None:
+        # Booleans are unlink results; thumbnail deletes return None
+        try:
+            stats["files_removed"] += sum(1 for future in pending if future.result() is True)
+        finally:
+            pending.clear()
+            blob_locks.release(locked)
+            locked.clear()
+
+    with ThreadPoolExecutor(max_workers=max(1, config.DELETE_UNLINK_WORKERS)) as pool:
+        try:
+            while True:
+                rows = batch_query(db, criteria, stats["last_id"], batch_size).all()
+                if not rows:
+                    break
+
+                ids = [row.id for row in rows]
+                stats["deleted"] += db.query(Media).filter(Media.id.in_(ids)).delete(synchronize_session=False)
+                db.commit()
+                stats["batches"] += 1
+                stats["last_id"] = ids[-1]
+
+                # Wait for the previous batch's unlinks so at most two are in flight
+                settle()
+                futures, paths = _release_batch(db, pool, rows)
+                pending.extend(futures)
+                locked.update(paths)
+
+                logger.info("Deleted media up to id %s: %s", stats["last_id"], stats)
+                if progress:
+                    progress(dict(stats))
+        finally:
+            db.rollback()
+            settle()
+
+    if progress:
+        progress(dict(stats))
+    return stats
@@ -0,0 +1,315 @@
+import argparse
+import logging
+import threading
+
+try:
+    from PIL import Image, ImageOps
+except Exception:
+    Image = None
+
+import config
+from models.database import SessionLocal
+from models import model_entity  # ensure model metadata is loaded
+from models.media_entity import Media
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+
+
+def compute_dhash(file_path: str) -> int:
+    """
+    Difference hash: compares neighbouring pixels of a 9x8 grayscale thumbnail.
+    Survives resizing and recompression; returns a 64-bit integer.
+    """
+    if Image is None:
+        raise RuntimeError("Perceptual hashing requires Pillow.")
+
+    with Image.open(file_path) as img:
+        img.draft("L", (64, 64))
+        img = ImageOps.exif_transpose(img)
+        pixels = list(img.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def format_hash(value: int) -> str:
+    return f"{value:016x}"
+
+
+def parse_hash(value: str) -> int:
+    return int(value, 16)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance.
+    Each node holds one hash and every media id sharing it; a radius query
+    only descends into children whose edge distance can still match.
+    """
+
+    def __init__(self):
+        self._root = None  # [hash, media_ids, {distance: child}]
+        self.size = 0
+
+    def add(self, value: int, media_id: int) -> None:
+        """
+        Adds `media_id` under `value`. Adding the same pair again is a
+        no-op, e.g. when a lazy load already picked up a freshly hashed row.
+        """
+        if self._root is None:
+            self._root = [value, [media_id], {}]
+            self.size += 1
+            return
+
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                if media_id not in node[1]:
+                    node[1].append(media_id)
+                    self.size += 1
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [media_id], {}]
+                self.size += 1
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> list[tuple[int, int]]:
+        """
+        Returns (distance, media_id) pairs within `max_distance`, closest first.
+        """
+        if self._root is None:
+            return []
+
+        matches = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance:
+                matches.extend((distance, media_id) for media_id in node[1])
+            low, high = distance - max_distance, distance + max_distance
+            for edge, child in node[2].items():
+                if low <= edge <= high:
+                    stack.append(child)
+
+        matches.sort()
+        return matches
+
+
+_index: BKTree | None = None
+_index_lock = threading.Lock()
+
+
+def _load_index() -> BKTree:
+    global _index
+    with _index_lock:
+        if _index is not None:
+            return _index
+
+        tree = BKTree()
+        session = SessionLocal()
+        try:
+            rows = (
+                session.query(Media.id, Media.perceptual_hash)
+                .filter(Media.perceptual_hash.is_not(None))
+                .yield_per(1000)
+            )
+            for media_id, value in rows:
+                tree.add(parse_hash(value), media_id)
+        finally:
+            session.close()
+
+        _index = tree
+        return _index
+
+
+def add_to_index(media_id: int, perceptual_hash: str) -> None:
+    tree = _load_index()
+    with _index_lock:
+        tree.add(parse_hash(perceptual_hash), media_id)
+
+
+def reset_index() -> None:
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def _existing_ids(session, media_ids: set[int]) -> set[int]:
+    existing = set()
+    pending = sorted(media_ids)
+    # Chunked to stay under SQLite's bound-parameter limit
+    for start in range(0, len(pending), 500):
+        chunk = pending[start : start + 500]
+        rows = session.query(Media.id).filter(Media.id.in_(chunk)).all()
+        existing.update(media_id for (media_id,) in rows)
+    return existing
+
+
+def find_similar(perceptual_hash: str, max_distance: int | None = None, exclude_id: int | None = None) -> list[dict]:
+    """
+    Looks up media whose perceptual hash is within `max_distance` bits.
+    Deleted rows still in the index are filtered out against the database.
+    """
+    if max_distance is None:
+        max_distance = config.NEAR_DUPLICATE_DISTANCE
+
+    tree = _load_index()
+    with _index_lock:
+        matches = tree.search(parse_hash(perceptual_hash), max_distance)
+    matches = [(distance, media_id) for distance, media_id in matches if media_id != exclude_id]
+
+    session = SessionLocal()
+    try:
+        existing = _existing_ids(session, {media_id for _, media_id in matches})
+    finally:
+        session.close()
+
+    return [
+        {"media_id": media_id, "distance": distance}
+        for distance, media_id in matches
+        if media_id in existing
+    ]
+
+
+def find_near_duplicates(media_id: int, max_distance: int | None = None) -> list[dict] | None:
+    session = SessionLocal()
+    try:
+        media = session.query(Media).filter(Media.id == media_id).first()
+        if not media:
+            return None
+        perceptual_hash = media.perceptual_hash
+    finally:
+        session.close()
+
+    if not perceptual_hash:
+        return []
+    return find_similar(perceptual_hash, max_distance, exclude_id=media_id)
+
+
+def duplicate_report(max_distance: int | None = None) -> list[list[int]]:
+    """
+    Groups the whole vault into clusters of near-duplicate media ids.
+    One radius query per hashed item, merged with union-find.
+    """
+    if max_distance is None:
+        max_distance = config.NEAR_DUPLICATE_DISTANCE
+
+    parent: dict[int, int] = {}
+
+    def find(item: int) -> int:
+        while parent.setdefault(item, item) != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    tree = _load_index()
+    session = SessionLocal()
+    try:
+        rows = (
+            session.query(Media.id, Media.perceptual_hash)
+            .filter(Media.perceptual_hash.is_not(None))
+            .yield_per(1000)
+        )
+        for media_id, value in rows:
+            with _index_lock:
+                matches = tree.search(parse_hash(value), max_distance)
+            for _, other_id in matches:
+                if other_id != media_id:
+                    parent[find(other_id)] = find(media_id)
+
+        existing = _existing_ids(session, set(parent))
+    finally:
+        session.close()
+
+    groups: dict[int, list[int]] = {}
+    for media_id in existing:
+        groups.setdefault(find(media_id), []).append(media_id)
+
+    return sorted(
+        (sorted(group) for group in groups.values() if len(group) > 1),
+        key=lambda group: group[0],
+    )
+
+
+def hash_media_by_id(media_id: int) -> str | None:
+    """
+    Job entry point: hashes one image row and adds it to the index.
+    """
+    session = SessionLocal()
+    try:
+        media = session.query(Media).filter(Media.id == media_id).first()
+        if not media or media.media_type != "image":
+            return None
+        if media.perceptual_hash:
+            return media.perceptual_hash
+
+        media.perceptual_hash = format_hash(compute_dhash(media.file_path))
+        session.commit()
+        add_to_index(media.id, media.perceptual_hash)
+        return media.perceptual_hash
+    finally:
+        session.close()
+
+
+def backfill_perceptual_hashes(batch_size: int = 200) -> int:
+    hashed = 0
+    last_id = 0
+    session = SessionLocal()
+    try:
+        while True:
+            batch = (
+                session.query(Media)
+                .filter(Media.id > last_id)
+                .filter(Media.media_type == "image")
+                .filter(Media.perceptual_hash.is_(None))
+                .order_by(Media.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                break
+
+            for media in batch:
+                try:
+                    media.perceptual_hash = format_hash(compute_dhash(media.file_path))
+                    hashed += 1
+                except Exception as exc:
+                    logger.warning("Failed to hash image: %s (%s)", media.file_path, exc)
+
+            last_id = batch[-1].id
+            session.commit()
+    finally:
+        session.close()
+
+    reset_index()
+    return hashed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perceptual-hash near-duplicate tools.")
+    parser.add_argument("command", choices=["backfill", "report"])
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--max-distance", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        count = backfill_perceptual_hashes(batch_size=args.batch_size)
+        print(f"Hashed {count} images")
+    else:
+        for group in duplicate_report(args.max_distance):
+            print(" ".join(str(media_id) for media_id in group))
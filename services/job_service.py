@@ -0,0 +1,501 @@
+import asyncio
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import uuid
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import config
+from models.database import SessionLocal
+from models.write_queue import write_queue
+from models.job_entity import Job
+from models.media_entity import Media
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("pending", "running")
+FINISHED_STATUSES = ("done", "failed")
+PRUNE_INTERVAL = timedelta(days=1)
+
+_wakeup_lock = threading.Lock()
+_wakeup_callbacks: list = []
+
+
+def _active_job(db: Session, dedupe_key: str) -> Job | None:
+    return (
+        db.query(Job)
+        .filter(Job.dedupe_key == dedupe_key)
+        .filter(Job.status.in_(ACTIVE_STATUSES))
+        .first()
+    )
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: dict | None = None,
+    dedupe_key: str | None = None,
+    media_id: int | None = None,
+    max_attempts: int | None = None,
+    commit: bool = True,
+    run_after: datetime | None = None,
+) -> Job:
+    """
+    Adds a job to the persistent queue, due now or at `run_after`.
+    If a pending or running job already has `dedupe_key`, that job is returned.
+    With commit=False the job joins the caller's transaction.
+    """
+    if dedupe_key:
+        existing = _active_job(db, dedupe_key)
+        if existing:
+            return existing
+
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        dedupe_key=dedupe_key,
+        media_id=media_id,
+        status="pending",
+        attempts=0,
+        max_attempts=max_attempts or config.JOB_MAX_ATTEMPTS,
+        run_after=run_after or datetime.utcnow(),
+        created_at=datetime.utcnow(),
+    )
+    db.add(job)
+
+    if commit:
+        try:
+            db.commit()
+        except IntegrityError:
+            # Lost a race with another enqueue of the same key
+            db.rollback()
+            existing = _active_job(db, dedupe_key) if dedupe_key else None
+            if existing:
+                return existing
+            raise
+        db.refresh(job)
+        notify_workers()
+    else:
+        db.flush()
+
+    return job
+
+
+def get_job(db: Session, job_id: int) -> Job | None:
+    return db.query(Job).filter(Job.id == job_id).first()
+
+
+def list_jobs(
+    db: Session,
+    media_id: int | None = None,
+    status: str | None = None,
+    job_ids: list[int] | None = None,
+    limit: int = 100,
+) -> list[Job]:
+    query = db.query(Job)
+    if job_ids:
+        query = query.filter(Job.id.in_(job_ids))
+    if media_id is not None:
+        query = query.filter(Job.media_id == media_id)
+    if status:
+        query = query.filter(Job.status == status)
+    return query.order_by(Job.id.desc()).limit(limit).all()
+
+
+def notify_workers() -> None:
+    """
+    Wakes idle workers in this process. Safe to call from any thread.
+    """
+    with _wakeup_lock:
+        callbacks = list(_wakeup_callbacks)
+    for callback in callbacks:
+        callback()
+
+
+def recover_interrupted_jobs() -> int:
+    """
+    Requeues jobs left running by a worker that stopped mid-job: those
+    whose heartbeat is older than JOB_STALE_SECONDS. Jobs of live workers,
+    in this process or another, keep running.
+    """
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=config.JOB_STALE_SECONDS)
+    result = write_queue.run(
+        lambda session: session.execute(
+            update(Job)
+            .where(Job.status == "running")
+            .where(or_(Job.heartbeat_at.is_(None), Job.heartbeat_at < stale_before))
+            .values(status="pending", run_after=now, worker_id=None)
+        )
+    )
+    return result.rowcount or 0
+
+
+def heartbeat(worker_id: str) -> int:
+    """Marks the jobs `worker_id` is running as alive."""
+    result = write_queue.run(
+        lambda session: session.execute(
+            update(Job)
+            .where(Job.status == "running", Job.worker_id == worker_id)
+            .values(heartbeat_at=datetime.utcnow())
+        )
+    )
+    return result.rowcount or 0
+
+
+def claim_next_job(worker_id: str | None = None) -> dict | None:
+    """
+    Atomically moves the oldest due job to running and returns it.
+    The single UPDATE ... RETURNING keeps concurrent workers from taking the same job.
+    """
+    now = datetime.utcnow()
+    next_id = (
+        select(Job.id)
+        .where(Job.status == "pending")
+        .where(Job.run_after <= now)
+        .order_by(Job.run_after, Job.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+
+    # Claims from several workers share one commit through the writer queue
+    row = write_queue.run(
+        lambda session: session.execute(
+            update(Job)
+            .where(Job.id == next_id)
+            .where(Job.status == "pending")
+            .values(
+                status="running",
+                attempts=Job.attempts + 1,
+                started_at=now,
+                worker_id=worker_id,
+                heartbeat_at=now,
+            )
+            .returning(Job.id, Job.kind, Job.payload, Job.media_id, Job.attempts, Job.max_attempts)
+        ).first()
+    )
+
+    if row is None:
+        return None
+
+    return {
+        "id": row.id,
+        "kind": row.kind,
+        "payload": json.loads(row.payload or "{}"),
+        "media_id": row.media_id,
+        "attempts": row.attempts,
+        "max_attempts": row.max_attempts,
+        "worker_id": worker_id,
+    }
+
+
+def _retry_delay(attempts: int) -> float:
+    delay = min(config.JOB_BACKOFF_MAX_SECONDS, config.JOB_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.9, 1.1)
+
+
+def _media_exists(media_id: int) -> bool:
+    session = SessionLocal()
+    try:
+        return session.query(Media.id).filter(Media.id == media_id).first() is not None
+    finally:
+        session.close()
+
+
+def run_job(job: dict) -> None:
+    handler = HANDLERS.get(job["kind"])
+    error = None
+
+    if handler is None:
+        error = f"No handler for job kind: {job['kind']}"
+    else:
+        try:
+            handler(job["payload"])
+        except Exception as exc:
+            if job["media_id"] is not None and not _media_exists(job["media_id"]):
+                # The media was deleted while the job ran; nothing left to do
+                logger.info("Job %s (%s) skipped: media %s was deleted", job["id"], job["kind"], job["media_id"])
+            else:
+                logger.warning("Job %s (%s) failed: %s", job["id"], job["kind"], exc)
+                error = f"{type(exc).__name__}: {exc}"
+
+    now = datetime.utcnow()
+    if error is None:
+        values = {"status": "done", "finished_at": now, "last_error": None}
+    elif handler is not None and job["attempts"] < job["max_attempts"]:
+        values = {
+            "status": "pending",
+            "last_error": error,
+            "run_after": now + timedelta(seconds=_retry_delay(job["attempts"])),
+        }
+    else:
+        values = {"status": "failed", "finished_at": now, "last_error": error}
+
+    # A job requeued as stale may already belong to another worker
+    result = write_queue.run(
+        lambda session: session.execute(
+            update(Job)
+            .where(Job.id == job["id"], Job.status == "running", Job.worker_id == job.get("worker_id"))
+            .values(**values)
+        )
+    )
+    if not result.rowcount:
+        logger.warning("Job %s (%s) was requeued while it ran; its result is dropped", job["id"], job["kind"])
+
+
+# -------------------------
+# Retention
+# -------------------------
+# Finished rows are only history, so a daily job deletes those older than
+# JOB_RETENTION_DAYS to keep the table and its indexes small.
+
+def prune_finished_jobs(now: datetime | None = None) -> int:
+    """
+    Deletes done and failed jobs that finished more than JOB_RETENTION_DAYS
+    ago, one committed batch at a time. Returns how many were deleted.
+    """
+    if config.JOB_RETENTION_DAYS <= 0:
+        return 0
+
+    cutoff = (now or datetime.utcnow()) - timedelta(days=config.JOB_RETENTION_DAYS)
+    deleted = 0
+    session = SessionLocal()
+    try:
+        while True:
+            ids = list(
+                session.scalars(
+                    select(Job.id)
+                    .where(Job.status.in_(FINISHED_STATUSES), Job.finished_at < cutoff)
+                    .limit(config.DELETE_BATCH_SIZE)
+                )
+            )
+            if not ids:
+                break
+            deleted += session.execute(delete(Job).where(Job.id.in_(ids))).rowcount or 0
+            session.commit()
+    finally:
+        session.close()
+
+    if deleted:
+        logger.info("Pruned %s finished jobs", deleted)
+    return deleted
+
+
+def _schedule_prune(db: Session, run_after: datetime) -> Job:
+    return enqueue(
+        db,
+        "prune_jobs",
+        dedupe_key=f"prune_jobs:{run_after.isoformat(timespec='minutes')}",
+        max_attempts=1,
+        run_after=run_after,
+    )
+
+
+def ensure_prune_scheduled() -> Job | None:
+    """
+    Queues the next job-table cleanup unless one is already pending.
+    Does nothing when JOB_RETENTION_DAYS is 0.
+    """
+    if config.JOB_RETENTION_DAYS <= 0:
+        return None
+
+    session = SessionLocal()
+    try:
+        pending = session.query(Job).filter(Job.kind == "prune_jobs", Job.status == "pending").first()
+        if pending:
+            return pending
+        return _schedule_prune(session, datetime.utcnow())
+    finally:
+        session.close()
+
+
+class JobRunner:
+    """
+    In-process async workers over the jobs table.
+    Handlers are synchronous and run in threads so the event loop stays free.
+    """
+
+    def __init__(self, workers: int | None = None, poll_interval: float | None = None):
+        self.workers = max(1, workers or config.JOB_WORKERS)
+        self.poll_interval = poll_interval or config.JOB_POLL_INTERVAL_SECONDS
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: list[asyncio.Task] = []
+        self._heartbeat_task: asyncio.Task | None = None
+        self._stopping = False
+        self._wakeup: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _wake(self) -> None:
+        if self._loop and self._wakeup:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def start(self) -> None:
+        recovered = await asyncio.to_thread(recover_interrupted_jobs)
+        if recovered:
+            logger.info("Requeued %s interrupted jobs", recovered)
+
+        self._stopping = False
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        with _wakeup_lock:
+            _wakeup_callbacks.append(self._wake)
+
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._heartbeat_task = asyncio.create_task(self._keep_alive())
+
+    async def stop(self, timeout: float | None = None) -> None:
+        """
+        Stops claiming new jobs and waits for running ones to finish.
+        Jobs still running after `timeout` stop getting heartbeats and are
+        requeued once they go stale.
+        """
+        self._stopping = True
+        with _wakeup_lock:
+            if self._wake in _wakeup_callbacks:
+                _wakeup_callbacks.remove(self._wake)
+        if self._wakeup:
+            self._wakeup.set()
+        if not self._tasks:
+            return
+
+        timeout = config.JOB_SHUTDOWN_TIMEOUT_SECONDS if timeout is None else timeout
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        self._tasks = []
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+    async def _keep_alive(self) -> None:
+        """
+        Refreshes the heartbeat of this runner's jobs and requeues jobs
+        whose worker, in any process, has stopped sending them.
+        """
+        while True:
+            await asyncio.sleep(config.JOB_HEARTBEAT_SECONDS)
+            try:
+                await asyncio.to_thread(heartbeat, self.worker_id)
+                recovered = await asyncio.to_thread(recover_interrupted_jobs)
+            except Exception as exc:
+                logger.error("Job heartbeat failed: %s", exc)
+                continue
+            if recovered:
+                logger.info("Requeued %s stale jobs", recovered)
+                notify_workers()
+
+    async def _work(self) -> None:
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                job = await asyncio.to_thread(claim_next_job, self.worker_id)
+            except Exception as exc:
+                logger.error("Failed to claim job: %s", exc)
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await asyncio.to_thread(run_job, job)
+
+
+# -------------------------
+# Handlers
+# -------------------------
+
+def _handle_thumbnails(payload: dict) -> None:
+    from services import thumbnail_service
+
+    thumbnail_service.create_thumbnails_for_media_id(payload["media_id"])
+
+
+def _handle_rating(payload: dict) -> None:
+    from services import rating_service
+
+    rating_service.rate_media_by_id(payload["media_id"])
+
+
+def _handle_rating_backfill(payload: dict) -> None:
+    from services import rating_service
+
+    rating_service.backfill_missing_ratings()
+
+
+def _handle_perceptual_hash(payload: dict) -> None:
+    from services import duplicate_service
+
+    duplicate_service.hash_media_by_id(payload["media_id"])
+
+
+def _handle_ml_score(payload: dict) -> None:
+    from services import score_service
+
+    session = SessionLocal()
+    try:
+        score_service.update_model_ml_score(session, payload["model_id"])
+    finally:
+        session.close()
+
+
+def _handle_model_scores(payload: dict) -> None:
+    from services import score_service
+
+    session = SessionLocal()
+    try:
+        score_service.update_model_scores_from_source(session)
+    finally:
+        session.close()
+
+
+def _handle_reconcile(payload: dict) -> None:
+    from services import reconcile_service
+
+    # Resumes from the last checkpoint when retried after a crash
+    reconcile_service.run_reconciliation()
+
+
+def _handle_purge(payload: dict) -> None:
+    from services import trash_service
+
+    trash_service.purge_expired()
+
+
+def _handle_backup(payload: dict) -> None:
+    from services import backup_service
+
+    backup_service.run_backup_job(payload)
+
+
+def _handle_prune_jobs(payload: dict) -> None:
+    if config.JOB_RETENTION_DAYS > 0:
+        session = SessionLocal()
+        try:
+            _schedule_prune(session, datetime.utcnow() + PRUNE_INTERVAL)
+        finally:
+            session.close()
+    prune_finished_jobs()
+
+
+HANDLERS = {
+    "thumbnails": _handle_thumbnails,
+    "rating": _handle_rating,
+    "rating_backfill": _handle_rating_backfill,
+    "perceptual_hash": _handle_perceptual_hash,
+    "ml_score": _handle_ml_score,
+    "model_scores": _handle_model_scores,
+    "reconcile": _handle_reconcile,
+    "purge": _handle_purge,
+    "backup": _handle_backup,
+    "prune_jobs": _handle_prune_jobs,
+}
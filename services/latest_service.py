@@ -3,6 +3,7 @@ from sqlalchemy import desc
 from models.database import SessionLocal
 from models.model_entity import Model
 from models.media_entity import Media
+from services.model_registry import model_registry
 
 
 def get_latest_media(
@@ -18,7 +19,7 @@ def get_latest_media(
         query = session.query(Media, Model).join(Model, Media.model_id == Model.id)
 
         if model_name:
-            model = session.query(Model).filter_by(name=model_name).first()
+            model = model_registry.get_by_name(model_name)
             if not model:
                 return []
             query = query.filter(Media.model_id == model.id)
@@ -0,0 +1,154 @@
+import argparse
+import errno
+import logging
+import os
+from pathlib import Path
+import shutil
+import tempfile
+
+import config
+from models.database import SessionLocal
+from models import model_entity  # ensure model metadata is loaded
+from models.media_entity import Media
+from models.soft_delete import INCLUDE_DELETED
+from services import model_service
+from services.storage_service import hash_file, store_path_for
+
+logger = logging.getLogger(__name__)
+
+
+def _move_into_store(source: Path, target: Path) -> None:
+    """
+    Moves a file to its sharded location. Falls back to copy-then-rename
+    when MEDIA_ROOT and the store are on different filesystems.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.replace(source, target)
+        return
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+
+    fd, temp_name = tempfile.mkstemp(prefix=".migrate-", suffix=".part", dir=target.parent)
+    os.close(fd)
+    try:
+        shutil.copyfile(source, temp_name)
+        os.replace(temp_name, target)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+    source.unlink(missing_ok=True)
+
+
+def _prune_empty_dirs(root: Path) -> None:
+    if not root.is_dir():
+        return
+    for dirpath, _, _ in sorted(os.walk(root), key=lambda entry: entry[0], reverse=True):
+        if Path(dirpath) == root:
+            continue
+        try:
+            os.rmdir(dirpath)
+        except OSError:
+            pass  # not empty
+
+
+def migrate_media_layout(batch_size: int = 200, dry_run: bool = False) -> dict:
+    """
+    Moves legacy per-model files and flat store blobs into the sharded
+    store and rewrites Media.file_path, committing once per batch.
+    Safe to re-run: rows already in place are skipped, and a file moved
+    before an interrupted commit is picked up from its new location.
+    """
+    stats = {"moved": 0, "relinked": 0, "skipped": 0, "missing": 0}
+    last_id = 0
+    # Rows stay loaded across the per-batch commits
+    session = SessionLocal(expire_on_commit=False)
+    try:
+        while True:
+            batch = (
+                session.query(Media)
+                .execution_options(**{INCLUDE_DELETED: True})
+                .filter(Media.id > last_id)
+                .order_by(Media.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                break
+
+            # Hashes are committed before any file moves, so a row whose
+            # file moved in an interrupted run can still find it by hash
+            hashed = False
+            for media in batch:
+                if media.file_path and not media.content_hash and Path(media.file_path).exists():
+                    media.content_hash, media.file_size = hash_file(media.file_path)
+                    hashed = True
+            if hashed and not dry_run:
+                session.commit()
+
+            released = []
+            for media in batch:
+                if not media.file_path:
+                    stats["missing"] += 1
+                    continue
+
+                source = Path(media.file_path)
+                if not media.content_hash:
+                    logger.warning("Media %s file missing, skipping: %s", media.id, source)
+                    stats["missing"] += 1
+                    continue
+
+                target = store_path_for(media.content_hash, source.suffix)
+                if source == target:
+                    stats["skipped"] += 1
+                    continue
+
+                if target.exists():
+                    # Same content already sharded, or moved before an interrupted run
+                    stats["relinked"] += 1
+                elif source.exists():
+                    if not dry_run:
+                        _move_into_store(source, target)
+                    stats["moved"] += 1
+                else:
+                    logger.warning("Media %s file missing, skipping: %s", media.id, source)
+                    stats["missing"] += 1
+                    continue
+
+                if not dry_run:
+                    media.file_path = str(target)
+                    released.append(source)
+
+            last_id = batch[-1].id
+            if dry_run:
+                session.rollback()
+                continue
+
+            session.commit()
+            # Drop old copies only once no row points at them any more
+            for source in set(released):
+                if source.exists() and model_service.count_media_references(session, str(source)) == 0:
+                    source.unlink(missing_ok=True)
+            logger.info("Migrated media up to id %s: %s", last_id, stats)
+    finally:
+        session.close()
+
+    if not dry_run:
+        _prune_empty_dirs(Path(config.MEDIA_ROOT))
+
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move media files into the sharded store layout.")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="report what would move without changing anything")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    result = migrate_media_layout(batch_size=args.batch_size, dry_run=args.dry_run)
+    print(
+        f"Moved {result['moved']}, relinked {result['relinked']}, "
+        f"already sharded {result['skipped']}, missing {result['missing']}"
+    )
@@ -1,9 +1,9 @@
-from pathlib import Path
 from sqlalchemy.sql import func
 
 from models.database import SessionLocal
-from models.model_entity import Model
 from models.media_entity import Media
+from services import bulk_delete_service, storage_service
+from services.model_registry import model_registry
 
 
 def delete_random_media_for_model(model_name: str, count: int = 1) -> int:
@@ -17,7 +17,7 @@ def delete_random_media_for_model(model_name: str, count: int = 1) -> int:
     deleted = 0
 
     try:
-        model = session.query(Model).filter_by(name=model_name).first()
+        model = model_registry.get_by_name(model_name)
         if not model:
             return 0
 
@@ -29,53 +29,29 @@ def delete_random_media_for_model(model_name: str, count: int = 1) -> int:
             .all()
         )
 
+        references = []
         for media in media_items:
-            _delete_media_file(media.file_path)
+            references.append((media.file_path, media.content_hash))
             session.delete(media)
             deleted += 1
 
         session.commit()
+        storage_service.release_media_files(session, references)
         return deleted
 
     finally:
         session.close()
 
 
-def delete_all_media() -> int:
+def delete_all_media(progress=None) -> int:
     """
-    Deletes ALL media records and files.
+    Deletes ALL media records and files in batches.
     Preserves all models.
     Returns number of deleted media items.
     """
 
     session = SessionLocal()
-    deleted = 0
-
     try:
-        media_items = session.query(Media).all()
-
-        for media in media_items:
-            _delete_media_file(media.file_path)
-            session.delete(media)
-            deleted += 1
-
-        session.commit()
-        return deleted
-
+        return bulk_delete_service.delete_media_where(session, progress=progress)["deleted"]
     finally:
         session.close()
-
-
-def _delete_media_file(file_path: str):
-    """
-    Safely deletes a media file from disk.
-    Does not raise if file is missing.
-    """
-
-    try:
-        path = Path(file_path)
-        if path.exists():
-            path.unlink()
-    except Exception:
-        # Fail silently to avoid breaking DB cleanup
-        pass
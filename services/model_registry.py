@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import NamedTuple
+
+import config
+from models.database import ReadSessionLocal
+from models.model_entity import Model
+
+
+class ModelRef(NamedTuple):
+    id: int
+    name: str
+    slug: str
+
+
+class ModelRegistry:
+    """
+    Process-local map of model id, name and slug, so lookups by slug or
+    name do not load and slugify every model per request.
+    Writes in this process call `invalidate()`; changes made by other
+    processes are picked up on a miss or after MODEL_REGISTRY_TTL_SECONDS.
+    """
+
+    def __init__(self, session_factory=ReadSessionLocal, ttl_seconds: float | None = None):
+        self._session_factory = session_factory
+        self._ttl_seconds = config.MODEL_REGISTRY_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._lock = threading.Lock()
+        self._by_id: dict[int, ModelRef] = {}
+        self._by_name: dict[str, ModelRef] = {}
+        self._by_slug: dict[str, ModelRef] = {}
+        self._loaded_at: float | None = None
+
+    def get_by_id(self, model_id: int) -> ModelRef | None:
+        return self._lookup("_by_id", model_id, Model.id == model_id)
+
+    def get_by_name(self, name: str) -> ModelRef | None:
+        return self._lookup("_by_name", name, Model.name == name)
+
+    def get_by_slug(self, slug: str) -> ModelRef | None:
+        return self._lookup("_by_slug", slug, Model.slug == slug)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def _lookup(self, index: str, key, criterion) -> ModelRef | None:
+        self._ensure_loaded()
+        ref = getattr(self, index).get(key)
+        if ref is not None:
+            return ref
+
+        # Misses go to the unique index, so unknown slugs stay cheap and a
+        # model created by another process is found without a full reload
+        session = self._session_factory()
+        try:
+            row = session.query(Model.id, Model.name, Model.slug).filter(criterion).first()
+        finally:
+            session.close()
+        if row is None:
+            return None
+
+        ref = ModelRef(row.id, row.name, row.slug)
+        self.invalidate()
+        return ref
+
+    def _ensure_loaded(self) -> None:
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self._ttl_seconds:
+            return
+
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self._ttl_seconds:
+                return
+            session = self._session_factory()
+            try:
+                rows = session.query(Model.id, Model.name, Model.slug).all()
+            finally:
+                session.close()
+
+            refs = [ModelRef(row.id, row.name, row.slug) for row in rows]
+            self._by_id = {ref.id: ref for ref in refs}
+            self._by_name = {ref.name: ref for ref in refs}
+            self._by_slug = {ref.slug: ref for ref in refs if ref.slug}
+            self._loaded_at = time.monotonic()
+
+
+model_registry = ModelRegistry()
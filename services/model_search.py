@@ -0,0 +1,186 @@
+from collections import Counter
+import threading
+import time
+from typing import NamedTuple
+
+import config
+from models.database import ReadSessionLocal
+from models.model_entity import Model
+
+# Ranking tiers, best first
+EXACT, PREFIX, SUBSTRING, FUZZY = "exact", "prefix", "substring", "fuzzy"
+_TIER = {EXACT: 0, PREFIX: 1, SUBSTRING: 2, FUZZY: 3}
+
+# Share of trigrams a typo'd query must have in common with a name
+MIN_SIMILARITY = 0.3
+
+
+class ModelMatch(NamedTuple):
+    id: int
+    name: str
+    slug: str
+    match: str
+    score: float
+
+
+def _normalize(value: str) -> str:
+    # Same rule as Model.normalized_name (model_service._normalize_model_query)
+    return " ".join(value.lower().replace("_", " ").split())
+
+
+def _trigrams(normalized: str) -> set[str]:
+    """
+    Trigrams of each word padded as "  word ", so word starts get their
+    own grams ("  j", " ja") and one- or two-letter queries still hit.
+    """
+    grams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _jaccard(a: set[str], b: frozenset) -> float:
+    common = len(a & b)
+    return common / (len(a) + len(b) - common) if common else 0.0
+
+
+class _Entry(NamedTuple):
+    id: int
+    name: str
+    slug: str
+    normalized: str
+    grams: frozenset
+    word_grams: tuple[frozenset, ...]
+
+
+class ModelSearchIndex:
+    """
+    In-memory trigram index over model names for autocomplete and fuzzy
+    name resolution. Built on first use, updated in place by model_service
+    writes, and rebuilt after MODEL_REGISTRY_TTL_SECONDS to pick up writes
+    from other processes.
+    """
+
+    def __init__(self, session_factory=ReadSessionLocal, ttl_seconds: float | None = None):
+        self._session_factory = session_factory
+        self._ttl_seconds = config.MODEL_REGISTRY_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._lock = threading.RLock()
+        self._entries: dict[int, _Entry] = {}
+        self._postings: dict[str, set[int]] = {}
+        self._loaded_at: float | None = None
+
+    # -------------------------
+    # Maintenance
+    # -------------------------
+
+    def add(self, model_id: int, name: str, slug: str) -> None:
+        """Adds or replaces one model."""
+        with self._lock:
+            if self._loaded_at is None:
+                return  # picked up by the first load
+            self._remove(model_id)
+            normalized = _normalize(name)
+            entry = _Entry(
+                model_id,
+                name,
+                slug,
+                normalized,
+                frozenset(_trigrams(normalized)),
+                tuple(frozenset(_trigrams(word)) for word in normalized.split()),
+            )
+            self._entries[model_id] = entry
+            for gram in entry.grams:
+                self._postings.setdefault(gram, set()).add(model_id)
+
+    def remove(self, model_id: int) -> None:
+        with self._lock:
+            self._remove(model_id)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def _remove(self, model_id: int) -> None:
+        entry = self._entries.pop(model_id, None)
+        if entry is None:
+            return
+        for gram in entry.grams:
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(model_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def _ensure_loaded(self) -> None:
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self._ttl_seconds:
+            return
+
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self._ttl_seconds:
+                return
+            session = self._session_factory()
+            try:
+                rows = session.query(Model.id, Model.name, Model.slug).all()
+            finally:
+                session.close()
+
+            self._entries = {}
+            self._postings = {}
+            self._loaded_at = time.monotonic()
+            for row in rows:
+                self.add(row.id, row.name, row.slug)
+
+    # -------------------------
+    # Lookup
+    # -------------------------
+
+    def search(self, query: str, limit: int = 10, fuzzy: bool = True) -> list[ModelMatch]:
+        """
+        Returns models ranked exact > word prefix > substring > fuzzy, then
+        by trigram similarity and shorter names. Similarity is the best of
+        the whole name and each of its words. Only models sharing a
+        trigram with the query are looked at.
+        """
+        normalized = _normalize(query or "")
+        if not normalized or limit <= 0:
+            return []
+
+        self._ensure_loaded()
+        query_grams = _trigrams(normalized)
+        with self._lock:
+            shared = Counter()
+            for gram in query_grams:
+                shared.update(self._postings.get(gram, ()))
+            if min(len(word) for word in normalized.split()) < 3:
+                # Words under three letters have no inner trigrams, so
+                # matches in the middle of a name need a pass over all names
+                candidates = list(self._entries.values())
+            else:
+                candidates = [self._entries[model_id] for model_id in shared]
+
+            matches = []
+            for entry in candidates:
+                common = shared.get(entry.id, 0)
+                similarity = common / (len(query_grams) + len(entry.grams) - common)
+                if len(entry.word_grams) > 1:
+                    # "alce" should be as close to "Alice Smith" as to "Alice"
+                    similarity = max(similarity, *(_jaccard(query_grams, grams) for grams in entry.word_grams))
+                if entry.normalized == normalized:
+                    kind = EXACT
+                elif f" {normalized}" in f" {entry.normalized}":
+                    kind = PREFIX
+                elif normalized in entry.normalized:
+                    kind = SUBSTRING
+                elif fuzzy and similarity >= MIN_SIMILARITY:
+                    kind = FUZZY
+                else:
+                    continue
+                matches.append(ModelMatch(entry.id, entry.name, entry.slug, kind, round(similarity, 3)))
+
+        matches.sort(key=lambda match: (_TIER[match.match], -match.score, len(match.name), match.name))
+        return matches[:limit]
+
+
+model_search_index = ModelSearchIndex()
@@ -1,20 +1,82 @@
 from models.database import SessionLocal
 from models.model_entity import Model
 from models.media_entity import Media
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from models.model_stats_entity import ModelStats
+from models.soft_delete import INCLUDE_DELETED
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query, Session
+from sqlalchemy import desc, func, insert, select
 import logging
 from typing import List, Optional
 from datetime import datetime
 
+from services import bulk_delete_service
+from services.model_registry import model_registry
+from services.model_search import EXACT, model_search_index
 from web.schemas import ModelCreate, ModelUpdate # Import schemas
 
 logger = logging.getLogger(__name__)
 
+MAX_NAME_MATCHES = 100
+
 
 def _normalize_model_query(value: str) -> str:
     return " ".join(value.lower().replace("_", " ").split())
 
+def slugify_model_name(name: str) -> str:
+    # Matches the per-model media directory names (storage_service.normalize_model_name)
+    return name.strip().lower().replace(" ", "_")
+
+def _tombstone_name(model: Model) -> str:
+    return f"{model.name} (deleted {model.id})"
+
+def _release_tombstoned_names(db: Session, name: str) -> None:
+    """
+    Renames soft-deleted models that still hold `name`, its normalized form
+    or its slug, so a new or renamed model can take them. Flushes only.
+    """
+    holders = (
+        db.query(Model)
+        .execution_options(**{INCLUDE_DELETED: True})
+        .filter(Model.deleted_at.is_not(None))
+        .filter(
+            (Model.name == name)
+            | (Model.normalized_name == _normalize_model_query(name))
+            | (Model.slug == slugify_model_name(name))
+        )
+        .all()
+    )
+    for model in holders:
+        model.name = _tombstone_name(model)
+        model.normalized_name = _normalize_model_query(model.name)
+        model.slug = slugify_model_name(model.name)
+    if holders:
+        db.flush()
+
+def reclaim_tombstone_name(db: Session, model: Model) -> None:
+    """
+    Gives a restored model its original name back if it had to give it up
+    while deleted and no live model has taken it since.
+    """
+    suffix = f" (deleted {model.id})"
+    if not model.name.endswith(suffix):
+        return
+    original = model.name[: -len(suffix)]
+    taken = (
+        db.query(Model.id)
+        .filter(
+            (Model.name == original)
+            | (Model.normalized_name == _normalize_model_query(original))
+            | (Model.slug == slugify_model_name(original))
+        )
+        .first()
+    )
+    if taken:
+        return
+    model.name = original
+    model.normalized_name = _normalize_model_query(original)
+    model.slug = slugify_model_name(original)
+
 def get_model_by_name(model_name: str) -> Model | None:
     session = SessionLocal()
     try:
@@ -23,11 +85,17 @@ def get_model_by_name(model_name: str) -> Model | None:
     finally:
         session.close()
 
+def get_model_by_name_with_session(db: Session, model_name: str) -> Model | None:
+    normalized_name = _normalize_model_query(model_name)
+    return db.query(Model).filter(Model.normalized_name == normalized_name).first()
+
 def create_model(db: Session, model_create: ModelCreate) -> Model:
+    _release_tombstoned_names(db, model_create.name)
     normalized_name = _normalize_model_query(model_create.name)
     db_model = Model(
         name=model_create.name,
         normalized_name=normalized_name,
+        slug=slugify_model_name(model_create.name),
         popularity=model_create.popularity,
         versatility=model_create.versatility,
         longevity=model_create.longevity,
@@ -36,7 +104,9 @@ def create_model(db: Session, model_create: ModelCreate) -> Model:
     )
     db.add(db_model)
     db.commit()
+    model_registry.invalidate()
     db.refresh(db_model)
+    model_search_index.add(db_model.id, db_model.name, db_model.slug)
     return db_model
 
 def get_all_models(db: Session) -> List[Model]:
@@ -52,27 +122,42 @@ def update_model(db: Session, model_id: int, model_update: ModelUpdate) -> Model
     
     for var, value in model_update.model_dump(exclude_unset=True).items():
         if var == "name":
+            _release_tombstoned_names(db, value)
             setattr(db_model, var, value)
             setattr(db_model, "normalized_name", _normalize_model_query(value))
+            setattr(db_model, "slug", slugify_model_name(value))
         else:
             setattr(db_model, var, value)
     
     db.add(db_model)
     db.commit()
+    model_registry.invalidate()
     db.refresh(db_model)
+    model_search_index.add(db_model.id, db_model.name, db_model.slug)
     return db_model
 
-def delete_model_by_id(db: Session, model_id: int) -> tuple[bool, list[Media]]:
+def delete_model_by_id(db: Session, model_id: int, *model_criteria, progress=None) -> dict:
+    """
+    Deletes the model's media in committed batches, releasing files that
+    are no longer referenced, then the model row itself if it still
+    matches `model_criteria`. Returns how many of each were deleted.
+    """
     try:
-        media_to_delete = db.query(Media).filter(Media.model_id == model_id).all()
-        db.query(Media).filter(Media.model_id == model_id).delete(synchronize_session=False)
-        model_deleted = db.query(Model).filter(Model.id == model_id).delete(synchronize_session=False)
+        result = bulk_delete_service.delete_media_where(db, Media.model_id == model_id, progress=progress)
+        model_deleted = (
+            db.query(Model)
+            .filter(Model.id == model_id, *model_criteria)
+            .delete(synchronize_session=False)
+        )
         db.commit()
-        return model_deleted > 0, media_to_delete
     except Exception as e:
         db.rollback()
         logger.error(f"Error deleting model with ID {model_id}: {e}")
-        return False, []
+        raise
+    if model_deleted:
+        model_registry.invalidate()
+        model_search_index.remove(model_id)
+    return {"models": model_deleted, "media": result["deleted"]}
 
 def get_media_by_id_with_session(db: Session, media_id: int) -> Media | None:
     return db.query(Media).filter(Media.id == media_id).first()
@@ -80,29 +165,143 @@ def get_media_by_id_with_session(db: Session, media_id: int) -> Media | None:
 def get_all_media_for_model(db: Session, model_id: int) -> List[Media]:
     return db.query(Media).filter(Media.model_id == model_id).order_by(Media.created_at.desc()).all()
 
-def delete_media_by_id(db: Session, media_id: int) -> bool:
-    try:
-        media_deleted = db.query(Media).filter(Media.id == media_id).delete(synchronize_session=False)
-        db.commit()
-        return media_deleted > 0
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Error deleting media with ID {media_id}: {e}")
-        return False
+# -------------------------
+# Page queries
+# -------------------------
+# Shared by the pages and `python -m models.migrations check-plans`, so
+# the plan check explains exactly what the pages run. Keyset pages are
+# ordered by the matching *_PAGE_COLUMNS (pagination_service.paginate).
+
+GALLERY_PAGE_COLUMNS = [Media.created_at, Media.id]
+TOP_PAGE_COLUMNS = [Media.rating, Media.created_at, Media.id]
+RECENT_PAGE_COLUMNS = [Media.created_at, Media.id]
+
+def model_gallery_query(db: Session, model_id: int) -> Query:
+    return db.query(Media).filter(Media.model_id == model_id)
+
+def top_rated_query(db: Session) -> Query:
+    return (
+        db.query(Media, Model)
+        .join(Model, Media.model_id == Model.id)
+        .filter(Media.media_type == "image")
+        .filter(Media.rating.is_not(None))
+    )
+
+def recent_media_query(db: Session) -> Query:
+    return db.query(Media, Model).join(Model, Media.model_id == Model.id)
+
+def latest_media_per_model_query(db: Session) -> Query:
+    """
+    The newest live upload of every model, found by one index seek each.
+    """
+    latest_id = (
+        select(Media.id)
+        .where(Media.model_id == ModelStats.model_id, Media.deleted_at.is_(None))
+        .order_by(desc(Media.created_at))
+        .limit(1)
+        .correlate(ModelStats)
+        .scalar_subquery()
+    )
+    return (
+        db.query(Media)
+        .filter(Media.id.in_(select(latest_id).select_from(ModelStats)))
+        .order_by(desc(Media.created_at))
+    )
 
-def create_media_record(db: Session, model_id: int, file_path: str, media_type: str, rating: Optional[int] = None) -> Media:
+def head_rotation_cycle(db: Session, model_id: int) -> int:
+    """
+    The rotation cycle a model's queue is currently serving. New media
+    joins it so it is shuffled into the current round, not sent repeatedly
+    to catch up with older items.
+    """
+    return db.query(func.min(Media.rotation_cycle)).filter(Media.model_id == model_id).scalar() or 0
+
+def create_media_record(
+    db: Session,
+    model_id: int,
+    file_path: str,
+    media_type: str,
+    rating: Optional[int] = None,
+    content_hash: Optional[str] = None,
+    file_size: Optional[int] = None,
+    original_filename: Optional[str] = None,
+    perceptual_hash: Optional[str] = None,
+) -> Media:
     media = Media(
         model_id=model_id,
         file_path=file_path,
         media_type=media_type,
         rating=rating,
-        created_at=datetime.utcnow()
+        content_hash=content_hash,
+        file_size=file_size,
+        original_filename=original_filename,
+        perceptual_hash=perceptual_hash,
+        created_at=datetime.utcnow(),
+        rotation_cycle=head_rotation_cycle(db, model_id),
     )
     db.add(media)
     db.commit()
     db.refresh(media)
     return media
 
+# Soft-deleted rows keep their files until purged, so they count here
+
+def count_media_references(db: Session, file_path: str) -> int:
+    return (
+        db.query(func.count(Media.id))
+        .execution_options(**{INCLUDE_DELETED: True})
+        .filter(Media.file_path == file_path)
+        .scalar()
+        or 0
+    )
+
+def count_content_references(db: Session, content_hash: str) -> int:
+    return (
+        db.query(func.count(Media.id))
+        .execution_options(**{INCLUDE_DELETED: True})
+        .filter(Media.content_hash == content_hash)
+        .scalar()
+        or 0
+    )
+
+# -------------------------
+# Async variants
+# -------------------------
+# For async def routes holding an AsyncSession. Writes that share logic
+# with the sync functions above go through run_sync, which awaits their
+# database I/O the same way.
+
+async def get_model_by_id_async(db: AsyncSession, model_id: int) -> Model | None:
+    return await db.scalar(select(Model).where(Model.id == model_id))
+
+async def get_model_by_name_async(db: AsyncSession, model_name: str) -> Model | None:
+    normalized_name = _normalize_model_query(model_name)
+    return await db.scalar(select(Model).where(Model.normalized_name == normalized_name).limit(1))
+
+async def head_rotation_cycle_async(db: AsyncSession, model_id: int) -> int:
+    return await db.scalar(select(func.min(Media.rotation_cycle)).where(Media.model_id == model_id)) or 0
+
+async def create_model_async(db: AsyncSession, model_create: ModelCreate) -> Model:
+    return await db.run_sync(create_model, model_create)
+
+async def create_media_records_async(db: AsyncSession, rows: list[dict]) -> List[Media]:
+    """
+    Inserts many media rows with a single INSERT ... RETURNING.
+    Does not commit, so the caller controls the transaction.
+    """
+    if not rows:
+        return []
+
+    now = datetime.utcnow()
+    cycles = {model_id: await head_rotation_cycle_async(db, model_id) for model_id in {row["model_id"] for row in rows}}
+    values = [{"created_at": now, "rotation_cycle": cycles[row["model_id"]], **row} for row in rows]
+    return list(
+        await db.scalars(
+            insert(Media).returning(Media, sort_by_parameter_order=True),
+            values,
+        )
+    )
+
 def get_models_with_counts():
     """
     Returns a list of (model_name, media_count)
@@ -110,12 +309,9 @@ def get_models_with_counts():
     session = SessionLocal()
     try:
         results = (
-            session.query(
-                Model.name,
-                func.count(Media.id)
-            )
-            .join(Media, Media.model_id == Model.id)
-            .group_by(Model.id)
+            session.query(Model.name, ModelStats.total_count)
+            .join(ModelStats, ModelStats.model_id == Model.id)
+            .filter(ModelStats.total_count > 0)
             .order_by(Model.name.asc())
             .all()
         )
@@ -124,41 +320,19 @@ def get_models_with_counts():
         session.close()
 
 def find_model_matches(user_input: str) -> list[str]:
-    normalized_input = _normalize_model_query(user_input)
-    if not normalized_input:
-        return []
-
-    session = SessionLocal()
-    try:
-        exact_match = (
-            session.query(Model)
-            .filter(Model.normalized_name == normalized_input)
-            .first()
-        )
-        if exact_match:
-            return [exact_match.name]
-
-        models = session.query(Model).all()
-        exact_match = None
-        partial_matches = []
-
-        for model in models:
-            normalized_model = _normalize_model_query(model.name)
-            if normalized_model == normalized_input:
-                exact_match = model.name
-                break
-            if normalized_input in normalized_model:
-                partial_matches.append(model.name)
-
-        if exact_match:
-            return [exact_match]
+    """
+    Returns [name] for an exact match, otherwise the names containing the
+    input, alphabetically. Typo matches are left to search_models so a
+    misspelling never resolves to a model on its own.
+    """
+    matches = model_search_index.search(user_input, limit=MAX_NAME_MATCHES, fuzzy=False)
+    if matches and matches[0].match == EXACT:
+        return [matches[0].name]
+    return sorted(match.name for match in matches)
 
-        if len(partial_matches) > 1:
-            partial_matches.sort()
 
-        return partial_matches
-    finally:
-        session.close()
+def search_models(query: str, limit: int = 10) -> list[dict]:
+    return [match._asdict() for match in model_search_index.search(query, limit=limit)]
 
 
 def resolve_model_name(user_input: str | None) -> str | None:
@@ -0,0 +1,108 @@
+import argparse
+import logging
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from models.database import ReadSessionLocal, SessionLocal
+from models import model_entity  # ensure model metadata is loaded
+from models.model_stats_entity import (
+    MODEL_STATS_AGGREGATE,
+    MODEL_STATS_COLUMNS,
+    REBUILD_MODEL_STATS,
+    ModelStats,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_stats_by_model(db: Session) -> dict[int, ModelStats]:
+    """
+    Returns {model_id: ModelStats}. Models without media may be missing.
+    """
+    return {stats.model_id: stats for stats in db.query(ModelStats).all()}
+
+
+def get_stats_for_model(db: Session, model_id: int) -> ModelStats | None:
+    return db.query(ModelStats).filter(ModelStats.model_id == model_id).first()
+
+
+def get_media_totals(db: Session) -> dict:
+    """
+    Library-wide totals summed from the rollup, one row per model instead
+    of a COUNT over media.
+    """
+    total, images, unrated = db.query(
+        func.sum(ModelStats.total_count),
+        func.sum(ModelStats.image_count),
+        func.sum(ModelStats.unrated_count),
+    ).one()
+    return {
+        "total": total or 0,
+        "rated_images": max((images or 0) - (unrated or 0), 0),
+    }
+
+
+def rebuild_model_stats() -> int:
+    """
+    Recomputes every rollup row from the media table in one transaction.
+    Returns the number of models with stats.
+    """
+    session = SessionLocal()
+    try:
+        for statement in REBUILD_MODEL_STATS:
+            session.execute(text(statement))
+        session.commit()
+        return session.query(ModelStats).count()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def find_stale_model_stats() -> list[dict]:
+    """
+    Compares the rollup with a fresh aggregate of media.
+    Returns one entry per model whose stored row differs.
+    """
+    session = ReadSessionLocal()
+    try:
+        expected = {row[0]: tuple(row) for row in session.execute(text(MODEL_STATS_AGGREGATE))}
+        stored = {
+            row[0]: tuple(row)
+            for row in session.execute(text(f"SELECT {', '.join(MODEL_STATS_COLUMNS)} FROM model_stats"))
+        }
+    finally:
+        session.close()
+
+    empty = (0,) * (len(MODEL_STATS_COLUMNS) - 2) + (None,)
+    stale = []
+    for model_id in sorted(expected.keys() | stored.keys()):
+        want = expected.get(model_id, (model_id, *empty))
+        have = stored.get(model_id, (model_id, *empty))
+        if want != have:
+            stale.append(
+                {
+                    "model_id": model_id,
+                    "expected": dict(zip(MODEL_STATS_COLUMNS, want)),
+                    "stored": dict(zip(MODEL_STATS_COLUMNS, have)),
+                }
+            )
+    return stale
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the model_stats rollup table.")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "rebuild":
+        print(f"Rebuilt stats for {rebuild_model_stats()} models")
+    else:
+        stale = find_stale_model_stats()
+        for entry in stale:
+            print(f"Model {entry['model_id']}: stored {entry['stored']}, expected {entry['expected']}")
+        print("Model stats are up to date" if not stale else f"{len(stale)} models have stale stats")
+        raise SystemExit(1 if stale else 0)
@@ -0,0 +1,112 @@
+import base64
+import binascii
+from datetime import datetime
+import json
+from typing import Any, Callable
+
+from sqlalchemy import DateTime, literal, tuple_
+from sqlalchemy.orm import Query
+
+DEFAULT_PAGE_SIZE = 48
+
+
+# -------------------------
+# Cursors
+# -------------------------
+# A cursor is the sort key of the row a page starts after (or ends before),
+# as URL-safe base64 JSON. Clients treat it as opaque.
+
+def _json_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_cursor(direction: str, key: tuple) -> str:
+    payload = json.dumps({direction: [_json_value(value) for value in key]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str | None, columns: list) -> tuple[str, tuple] | None:
+    """
+    Returns ("after" | "before", key) for a cursor made for `columns`,
+    or None when it is missing or malformed (callers show the first page).
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        (direction, values), = payload.items()
+        if direction not in ("after", "before") or len(values) != len(columns):
+            return None
+        key = tuple(
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) and value is not None else value
+            for column, value in zip(columns, values)
+        )
+    except (binascii.Error, UnicodeError, ValueError, TypeError, AttributeError):
+        return None
+    if any(value is None for value in key):
+        return None
+    return direction, key
+
+
+# -------------------------
+# Keyset pages
+# -------------------------
+
+def paginate(
+    query: Query,
+    columns: list,
+    key: Callable[[Any], tuple],
+    cursor: str | None = None,
+    per_page: int = DEFAULT_PAGE_SIZE,
+) -> dict:
+    """
+    Returns one page of `query` ordered by `columns` descending.
+    `columns` must end with a unique column (the id) and `key(row)` must
+    return the row's values for them. The page is found by seeking the
+    index past the cursor's key, so every page costs the same as the first.
+    Rows with a NULL key can't be compared against a cursor, so they are
+    left out (migration 13 backfilled the created_at ones).
+    """
+    query = query.filter(*[column.is_not(None) for column in columns])
+    decoded = decode_cursor(cursor, columns)
+    if decoded is None:
+        page_query = query.order_by(*[column.desc() for column in columns])
+        direction = "after"
+    else:
+        direction, values = decoded
+        bound = tuple_(*[literal(value, column.type) for column, value in zip(columns, values)])
+        if direction == "before":
+            # Walk backwards from the cursor, then flip back into display order
+            page_query = query.filter(tuple_(*columns) > bound).order_by(*columns)
+        else:
+            page_query = query.filter(tuple_(*columns) < bound).order_by(*[column.desc() for column in columns])
+
+    rows = page_query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if direction == "before":
+        if not rows:
+            # Everything before the cursor was deleted
+            return paginate(query, columns, key, None, per_page)
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = decoded is not None, has_more
+
+    return {
+        "items": rows,
+        "next_cursor": encode_cursor("after", key(rows[-1])) if rows and has_next else None,
+        "prev_cursor": encode_cursor("before", key(rows[0])) if rows and has_prev else None,
+    }
+
+
+def page_links(page: dict) -> dict:
+    """Template context for the Prev/Next links of a page from `paginate`."""
+    return {
+        "has_prev": page["prev_cursor"] is not None,
+        "has_next": page["next_cursor"] is not None,
+        "prev_url": f"?cursor={page['prev_cursor']}" if page["prev_cursor"] else None,
+        "next_url": f"?cursor={page['next_cursor']}" if page["next_cursor"] else None,
+    }
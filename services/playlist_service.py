@@ -0,0 +1,147 @@
+from array import array
+from collections import OrderedDict
+import random
+import threading
+
+from sqlalchemy.orm import Session
+
+from models.media_entity import Media
+from models.model_entity import Model
+from services.storage_service import media_path_to_url
+from services.thumbnail_service import thumbnail_urls
+
+MAX_PAGE_SIZE = 100
+# Playlists kept per process; each holds one 8-byte id per matching item
+MAX_CACHED_PLAYLISTS = 16
+
+_cache: "OrderedDict[tuple, array]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def new_seed() -> int:
+    return random.getrandbits(31)
+
+
+def _build_playlist(db: Session, seed: int, media_types: tuple[str, ...], model_id: int | None, rated: bool | None) -> array:
+    """
+    Shuffles the matching media ids with a RNG seeded by `seed`, putting
+    one item from each model first so every model shows up early.
+    Only (id, model_id) pairs are read, and the result is an array of ids.
+    """
+    query = db.query(Media.id, Media.model_id).filter(Media.media_type.in_(media_types))
+    if model_id is not None:
+        query = query.filter(Media.model_id == model_id)
+    if rated is True:
+        query = query.filter(Media.rating.is_not(None))
+    elif rated is False:
+        query = query.filter(Media.rating.is_(None))
+
+    # Sorted input keeps the shuffle identical for the same seed and data
+    by_model: dict[int, array] = {}
+    for media_id, media_model_id in query.order_by(Media.model_id, Media.id).yield_per(5000):
+        by_model.setdefault(media_model_id, array("q")).append(media_id)
+
+    rng = random.Random(seed)
+    firsts = array("q")
+    rest = array("q")
+    for ids in by_model.values():
+        pick = rng.randrange(len(ids))
+        firsts.append(ids[pick])
+        rest.extend(ids[:pick])
+        rest.extend(ids[pick + 1:])
+
+    # Fisher-Yates in place; random.shuffle would need a list copy
+    for ids in (firsts, rest):
+        for i in range(len(ids) - 1, 0, -1):
+            j = rng.randint(0, i)
+            ids[i], ids[j] = ids[j], ids[i]
+
+    firsts.extend(rest)
+    return firsts
+
+
+def get_playlist(
+    db: Session,
+    seed: int,
+    media_types: tuple[str, ...],
+    model_id: int | None = None,
+    rated: bool | None = None,
+    cache: bool = True,
+) -> array:
+    if not cache:
+        return _build_playlist(db, seed, media_types, model_id, rated)
+
+    key = (seed, media_types, model_id, rated)
+    with _cache_lock:
+        playlist = _cache.get(key)
+        if playlist is not None:
+            _cache.move_to_end(key)
+            return playlist
+
+    playlist = _build_playlist(db, seed, media_types, model_id, rated)
+    with _cache_lock:
+        _cache[key] = playlist
+        while len(_cache) > MAX_CACHED_PLAYLISTS:
+            _cache.popitem(last=False)
+    return playlist
+
+
+def get_playlist_page(
+    db: Session,
+    seed: int,
+    offset: int = 0,
+    limit: int = 48,
+    media_types: tuple[str, ...] = ("image", "video"),
+    model_id: int | None = None,
+    rated: bool | None = None,
+    cache: bool = True,
+) -> dict:
+    """
+    Returns one page of the seeded playlist with display fields loaded for
+    just the ids on that page. Items deleted since the playlist was built
+    are skipped. Pass cache=False for one-off pages that will not be
+    continued, so they do not push out playlists that are being paged.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    playlist = get_playlist(db, seed, media_types, model_id, rated, cache=cache)
+    offset = max(0, min(offset, len(playlist)))
+    page_ids = playlist[offset:offset + limit].tolist()
+
+    rows = (
+        db.query(Media, Model)
+        .join(Model, Media.model_id == Model.id)
+        .filter(Media.id.in_(page_ids))
+        .all()
+        if page_ids
+        else []
+    )
+    by_id = {media.id: (media, model) for media, model in rows}
+
+    items = []
+    for media_id in page_ids:
+        if media_id not in by_id:
+            continue
+        media, model = by_id[media_id]
+        url = media_path_to_url(media.file_path) if media.file_path else None
+        if not url:
+            continue
+        items.append(
+            {
+                "id": media.id,
+                "url": url,
+                "thumbnails": thumbnail_urls(media),
+                "model_name": model.name,
+                "rating": media.rating,
+                "rating_caption": media.rating_caption,
+                "media_type": media.media_type,
+            }
+        )
+
+    next_offset = offset + len(page_ids)
+    return {
+        "seed": seed,
+        "offset": offset,
+        "next_offset": next_offset if next_offset < len(playlist) else None,
+        "total": len(playlist),
+        "items": items,
+    }
@@ -1,50 +1,108 @@
 from datetime import datetime
-from sqlalchemy import asc
-from sqlalchemy.sql import func
 
-from models.database import SessionLocal
-from models.model_entity import Model
-from models.media_entity import Media
+from sqlalchemy.orm import Query, Session
 
+from models.write_queue import write_queue
+from models.media_entity import Media, new_rotation_key
+from models.model_stats_entity import ModelStats
+from models.rotation_state_entity import RotationState
+from services.model_registry import model_registry
+
+MAX_DRAW = 100
+
+
+# -------------------------
+# Rotation
+# -------------------------
+# Each model's media forms a shuffled queue ordered by (rotation_cycle,
+# rotation_key). A draw takes the head and moves it to the next cycle
+# under a new random key, so every item is sent once per round in a fresh
+# order each round. Without a model, draws go round-robin over models;
+# the position is kept in rotation_state so restarts carry on from it.
+# Every step is an index seek, independent of how much media there is.
+
+def _next_model_id(session: Session, after_model_id: int) -> int | None:
+    with_media = session.query(ModelStats.model_id).filter(ModelStats.total_count > 0)
+    row = (
+        with_media.filter(ModelStats.model_id > after_model_id).order_by(ModelStats.model_id).first()
+        or with_media.order_by(ModelStats.model_id).first()
+    )
+    return row.model_id if row else None
+
+
+def rotation_head_query(session: Session, model_id: int) -> Query:
+    return session.query(Media).filter(Media.model_id == model_id).order_by(Media.rotation_cycle, Media.rotation_key)
 
-def get_random_media(model_name: str | None = None):
-    """
-    Returns a dict with media data using DB-centered fairness.
-    """
 
-    session = SessionLocal()
-    try:
-        query = session.query(Media)
-
-        if model_name:
-            model = session.query(Model).filter_by(name=model_name).first()
-            if not model:
-                return None
-            query = query.filter(Media.model_id == model.id)
-
-        media = (
-            query
-            .order_by(
-                Media.last_sent_at.is_(None).desc(),
-                asc(Media.last_sent_at),
-                func.random()
-            )
-            .first()
+def _pop_head(session: Session, model_id: int, sent_at: datetime) -> Media | None:
+    media = rotation_head_query(session, model_id).first()
+    if media is None:
+        return None
+    media.rotation_cycle += 1
+    media.rotation_key = new_rotation_key()
+    media.last_sent_at = sent_at
+    session.flush()
+    return media
+
+
+def _draw(session: Session, count: int, model_id: int | None) -> list[dict]:
+    sent_at = datetime.utcnow()
+    state = None
+    if model_id is None:
+        state = session.get(RotationState, 1)
+        if state is None:
+            state = RotationState(id=1, last_model_id=0)
+            session.add(state)
+
+    picks = []
+    for _ in range(count):
+        if state is not None:
+            next_model_id = _next_model_id(session, state.last_model_id)
+            if next_model_id is None:
+                break
+            state.last_model_id = next_model_id
+            media = _pop_head(session, next_model_id, sent_at)
+        else:
+            media = _pop_head(session, model_id, sent_at)
+        if media is None:
+            break
+        picks.append(
+            {
+                "id": media.id,
+                "model_id": media.model_id,
+                "file_path": media.file_path,
+                "media_type": media.media_type,
+            }
         )
+    return picks
 
-        if not media:
-            return None
 
-        # Capture required data BEFORE session closes
-        result = {
-            "file_path": media.file_path,
-            "media_type": media.media_type,
-        }
+def draw_media(count: int = 1, model_name: str | None = None) -> list[dict]:
+    """
+    Returns up to `count` fair picks (one per model in turn, or from one
+    model's queue when `model_name` is given) and records them as sent.
+    Draws run on the writer thread, so concurrent callers never get the
+    same head item.
+    """
+    count = max(1, min(count, MAX_DRAW))
+    model_id = None
+    if model_name:
+        model = model_registry.get_by_name(model_name)
+        if not model:
+            return []
+        model_id = model.id
 
-        media.last_sent_at = datetime.utcnow()
-        session.commit()
+    return write_queue.run(lambda session: _draw(session, count, model_id))
 
-        return result
 
-    finally:
-        session.close()
+def get_random_media(model_name: str | None = None):
+    """
+    Returns a dict with media data using DB-centered fairness.
+    """
+    picks = draw_media(1, model_name)
+    if not picks:
+        return None
+    return {
+        "file_path": picks[0]["file_path"],
+        "media_type": picks[0]["media_type"],
+    }
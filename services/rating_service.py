@@ -53,6 +53,27 @@ def compute_rating_for_path(file_path: str) -> int | None:
         return None
 
 
+def rate_media_by_id(media_id: int) -> int | None:
+    session = SessionLocal()
+    try:
+        media = session.query(Media).filter(Media.id == media_id).first()
+        if not media or media.media_type != "image":
+            return None
+        if media.rating is not None:
+            return media.rating
+
+        rating = compute_rating_for_path(media.file_path)
+        if rating is None:
+            return None
+        media.rating = rating
+        if not media.rated_at:
+            media.rated_at = datetime.utcnow()
+        session.commit()
+        return rating
+    finally:
+        session.close()
+
+
 def backfill_missing_ratings() -> None:
     try:
         inspector = inspect(engine)
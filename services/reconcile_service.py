@@ -0,0 +1,334 @@
+import argparse
+from datetime import datetime
+import json
+import logging
+import os
+from pathlib import Path
+import tempfile
+import time
+from typing import Iterator
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+import config
+from models.database import SessionLocal
+from models import model_entity  # ensure model metadata is loaded
+from models.media_entity import Media
+from models.soft_delete import INCLUDE_DELETED
+from services import storage_service
+
+logger = logging.getLogger(__name__)
+
+# Hidden files left behind by crashed uploads and migrations. Resumable
+# upload sessions (.session-*) are excluded; they expire on their own.
+STALE_TEMP_PREFIXES = (".upload-", ".migrate-")
+MAX_REPORTED_ISSUES = 1000
+
+_COUNTERS = (
+    "files_scanned",
+    "rows_scanned",
+    "orphans",
+    "missing",
+    "size_mismatches",
+    "repaired",
+)
+
+
+def scan_roots() -> list[str]:
+    return [str(Path(config.MEDIA_STORE_ROOT)), str(Path(config.MEDIA_ROOT))]
+
+
+# -------------------------
+# Sorted streams
+# -------------------------
+
+def iter_files(root: str, after: str | None = None, skip_dirs: set[str] | None = None) -> Iterator[tuple[str, os.DirEntry]]:
+    """
+    Yields (path, entry) for every file under `root` in the same order as
+    sorting the full path strings, holding one directory listing per level.
+    Directories sort by name + separator because that prefixes their
+    contents, which keeps the walk globally ordered.
+    """
+    skip_dirs = skip_dirs or set()
+
+    def walk(directory: str):
+        try:
+            with os.scandir(directory) as iterator:
+                entries = list(iterator)
+        except (FileNotFoundError, NotADirectoryError):
+            return
+
+        keyed = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                if entry.name.startswith(STALE_TEMP_PREFIXES) and entry.is_file(follow_symlinks=False):
+                    keyed.append((entry.name, entry, False))
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if entry.path not in skip_dirs:
+                    keyed.append((entry.name + os.sep, entry, True))
+            elif entry.is_file(follow_symlinks=False):
+                keyed.append((entry.name, entry, False))
+        keyed.sort(key=lambda item: item[0])
+
+        for _, entry, is_dir in keyed:
+            if is_dir:
+                prefix = entry.path + os.sep
+                # Everything below sorts before the checkpoint
+                if after and prefix < after and not after.startswith(prefix):
+                    continue
+                yield from walk(entry.path)
+            elif not after or entry.path > after:
+                yield entry.path, entry
+
+    yield from walk(root)
+
+
+def iter_rows(session: Session, root: str, after: str | None = None, batch_size: int = 500):
+    """
+    Streams media rows under `root` ordered by (file_path, id), one keyset
+    batch at a time, so memory stays proportional to the batch size.
+    """
+    prefix = root + os.sep
+    upper = root + chr(ord(os.sep) + 1)
+    last_path, last_id = after, None
+
+    while True:
+        query = (
+            session.query(Media.id, Media.file_path, Media.file_size, Media.content_hash)
+            # Soft-deleted rows still own their files until purged
+            .execution_options(**{INCLUDE_DELETED: True})
+            .filter(Media.file_path >= prefix)
+            .filter(Media.file_path < upper)
+        )
+        if last_id is not None:
+            query = query.filter(tuple_(Media.file_path, Media.id) > tuple_(last_path, last_id))
+        elif last_path:
+            query = query.filter(Media.file_path > last_path)
+
+        rows = query.order_by(Media.file_path, Media.id).limit(batch_size).all()
+        if not rows:
+            return
+        yield from rows
+        last_path, last_id = rows[-1].file_path, rows[-1].id
+
+
+# -------------------------
+# State (resumable between runs and restarts)
+# -------------------------
+
+def load_state() -> dict | None:
+    try:
+        with open(config.RECONCILE_STATE_PATH, "r", encoding="utf-8") as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, json.JSONDecodeError) as exc:
+        logger.warning("Ignoring unreadable reconcile state: %s", exc)
+        return None
+
+
+def _save_state(state: dict) -> None:
+    target = Path(config.RECONCILE_STATE_PATH)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(prefix=".reconcile-", dir=target.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as state_file:
+            json.dump(state, state_file, indent=2)
+        os.replace(temp_name, target)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+
+
+def start_reconciliation(repair: bool = False, restart: bool = False) -> dict:
+    """
+    Returns the run to continue, or starts a new one when there is none,
+    the last one finished, or `restart` is set.
+    """
+    state = load_state()
+    if state and state["status"] == "running" and not restart:
+        return state
+
+    state = {
+        "status": "running",
+        "repair": repair,
+        "started_at": datetime.utcnow().isoformat(),
+        "finished_at": None,
+        "root_index": 0,
+        "after": None,
+        "counts": {name: 0 for name in _COUNTERS},
+        "issues": [],
+    }
+    _save_state(state)
+    return state
+
+
+# -------------------------
+# Merge
+# -------------------------
+
+def _report(state: dict, kind: str, path: str, **details) -> None:
+    state["counts"][kind] += 1
+    if len(state["issues"]) < MAX_REPORTED_ISSUES:
+        state["issues"].append({"kind": kind, "path": path, **details})
+
+
+def _handle_orphan(state: dict, path: str, entry: os.DirEntry, released: list) -> None:
+    try:
+        stat_result = entry.stat(follow_symlinks=False)
+    except FileNotFoundError:
+        return
+    # Young files may belong to an upload whose row is not committed yet
+    if time.time() - stat_result.st_mtime < config.RECONCILE_GRACE_SECONDS:
+        return
+
+    _report(state, "orphans", path, size=stat_result.st_size)
+    if state["repair"]:
+        released.append((path, None))
+        state["counts"]["repaired"] += 1
+
+
+def _handle_missing(session: Session, state: dict, path: str, rows: list, released: list) -> None:
+    _report(state, "missing", path, media_ids=[row.id for row in rows])
+    if state["repair"]:
+        session.query(Media).filter(Media.id.in_([row.id for row in rows])).delete(synchronize_session=False)
+        released.extend((path, row.content_hash) for row in rows)
+        state["counts"]["repaired"] += len(rows)
+
+
+def _handle_match(session: Session, state: dict, path: str, entry: os.DirEntry, rows: list, released: list) -> None:
+    try:
+        actual_size = entry.stat(follow_symlinks=False).st_size
+    except FileNotFoundError:
+        _handle_missing(session, state, path, rows, released)
+        return
+
+    mismatched = [row for row in rows if row.file_size is not None and row.file_size != actual_size]
+    if not mismatched:
+        return
+
+    _report(
+        state,
+        "size_mismatches",
+        path,
+        media_ids=[row.id for row in mismatched],
+        expected=mismatched[0].file_size,
+        actual=actual_size,
+    )
+    if not state["repair"]:
+        return
+
+    # Only trust the file when its content still matches the recorded hash
+    content_hash, size = storage_service.hash_file(path)
+    fixable = [row.id for row in mismatched if row.content_hash in (None, content_hash)]
+    if fixable:
+        session.query(Media).filter(Media.id.in_(fixable)).update(
+            {"file_size": size, "content_hash": content_hash},
+            synchronize_session=False,
+        )
+        state["counts"]["repaired"] += len(fixable)
+
+
+def run_reconciliation_slice(limit: int | None = None) -> dict:
+    """
+    Advances the current run by up to `limit` paths, then commits repairs
+    and checkpoints. Returns the updated state.
+    """
+    state = load_state()
+    if not state or state["status"] != "running":
+        return state or start_reconciliation()
+
+    limit = limit or config.RECONCILE_BATCH_SIZE
+    roots = scan_roots()
+    session = SessionLocal()
+    # Files are released after the commit, under their blob locks
+    released = []
+    try:
+        processed = 0
+        while processed < limit and state["root_index"] < len(roots):
+            root = roots[state["root_index"]]
+            if not os.path.isdir(root):
+                # An unmounted volume must not turn every row into "missing"
+                logger.warning("Reconcile root not found, skipping: %s", root)
+                state.setdefault("skipped_roots", []).append(root)
+                state["root_index"] += 1
+                state["after"] = None
+                continue
+
+            other_roots = {path for path in roots if path != root}
+            files = iter_files(root, state["after"], skip_dirs=other_roots)
+            rows = iter_rows(session, root, state["after"], batch_size=limit)
+
+            next_file = next(files, None)
+            next_row = next(rows, None)
+            while processed < limit and (next_file or next_row):
+                file_path = next_file[0] if next_file else None
+                row_path = next_row.file_path if next_row else None
+
+                if row_path is None or (file_path is not None and file_path < row_path):
+                    state["counts"]["files_scanned"] += 1
+                    _handle_orphan(state, file_path, next_file[1], released)
+                    state["after"] = file_path
+                    next_file = next(files, None)
+                else:
+                    # All rows sharing a path are handled together
+                    group = []
+                    while next_row and next_row.file_path == row_path:
+                        group.append(next_row)
+                        next_row = next(rows, None)
+                    state["counts"]["rows_scanned"] += len(group)
+
+                    if file_path == row_path:
+                        state["counts"]["files_scanned"] += 1
+                        _handle_match(session, state, row_path, next_file[1], group, released)
+                        next_file = next(files, None)
+                    else:
+                        _handle_missing(session, state, row_path, group, released)
+                    state["after"] = row_path
+                processed += 1
+
+            if not next_file and not next_row:
+                state["root_index"] += 1
+                state["after"] = None
+
+        if state["root_index"] >= len(roots):
+            state["status"] = "done"
+            state["finished_at"] = datetime.utcnow().isoformat()
+
+        session.commit()
+        if released:
+            storage_service.release_media_files(session, released)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+    _save_state(state)
+    return state
+
+
+def run_reconciliation(repair: bool = False, restart: bool = False) -> dict:
+    """
+    Runs (or resumes) a reconciliation to the end, checkpointing per slice.
+    """
+    state = start_reconciliation(repair=repair, restart=restart)
+    while state["status"] == "running":
+        state = run_reconciliation_slice()
+        logger.info("Reconcile progress: %s", state["counts"])
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare media files on disk with the media table.")
+    parser.add_argument("--repair", action="store_true", help="delete orphans and missing rows, fix sizes")
+    parser.add_argument("--restart", action="store_true", help="start over instead of resuming")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    result = run_reconciliation(repair=args.repair, restart=args.restart)
+    for issue in result["issues"]:
+        print(json.dumps(issue))
+    print(json.dumps(result["counts"]))
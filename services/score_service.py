@@ -55,3 +55,28 @@ def update_model_scores_from_source(session) -> int:
 
     session.commit()
     return updated
+
+
+def update_model_ml_score(session, model_id: int) -> bool:
+    """
+    Refreshes the card values of one model from the ML scorer.
+    AVN scores are relative across all models, so they are only computed in bulk.
+    """
+    if os.getenv("CARD_SCORE_SOURCE", "avn").lower() != "ml":
+        return False
+
+    model = session.query(Model).filter(Model.id == model_id).first()
+    if not model:
+        return False
+
+    score = _compute_scores([model], session).get(model.name)
+    if score is None:
+        return False
+
+    model.popularity = score
+    model.versatility = score
+    model.longevity = score
+    model.industry_impact = score
+    model.fan_appeal = score
+    session.commit()
+    return True
@@ -0,0 +1,176 @@
+import argparse
+import html
+import re
+
+from sqlalchemy import Float, column, text
+
+import config
+from models.database import ReadSessionLocal, SessionLocal
+from models.media_entity import Media
+from models.model_entity import Model
+from models.search_index import REBUILD_SEARCH_INDEX
+from services.pagination_service import decode_cursor, encode_cursor
+from services.storage_service import media_path_to_url
+from services.thumbnail_service import thumbnail_urls
+
+MAX_SEARCH_RESULTS = 100
+MAX_QUERY_TERMS = 8
+SNIPPET_TOKENS = 12
+
+# Highlight markers that cannot appear in stored text; swapped for <mark>
+# after the rest of the snippet is escaped
+_MARK_START, _MARK_END = "\x02", "\x03"
+
+_CURSOR_COLUMNS = [column("rank", Float()), Media.id]
+
+
+def build_match_query(query: str) -> str | None:
+    """
+    Turns free text into an FTS5 query: every word must match, as a
+    prefix, in any column. Quoting each word keeps FTS5 operators and
+    punctuation in user input from being parsed.
+    """
+    terms = re.findall(r"\w+", query or "")[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _render_snippet(raw: str | None) -> str:
+    escaped = html.escape(raw or "")
+    return escaped.replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+def _is_broad(session, match: str) -> bool:
+    # Bounded count: stops reading the index once the cap is passed
+    matched = session.execute(
+        text("SELECT count(*) FROM (SELECT 1 FROM media_search WHERE media_search MATCH :match LIMIT :cap)"),
+        {"match": match, "cap": config.SEARCH_RANK_LIMIT + 1},
+    ).scalar()
+    return matched > config.SEARCH_RANK_LIMIT
+
+
+def search_media(
+    query: str,
+    cursor: str | None = None,
+    limit: int = 24,
+    media_type: str | None = None,
+) -> dict:
+    """
+    Ranked full-text search over model names, original filenames, rating
+    captions and tags. Best matches come first; `next_cursor` continues
+    after the last hit by (rank, id), so later pages do not rescan earlier
+    ones.
+
+    Ranking scores every match, so a query matching more than
+    SEARCH_RANK_LIMIT rows (say "jpg") returns newest first instead, read
+    straight off the index in id order. Returns {"items", "next_cursor"}.
+    """
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+    match = build_match_query(query)
+    if match is None:
+        return {"items": [], "next_cursor": None}
+
+    session = ReadSessionLocal()
+    try:
+        # "after" continues a ranked search, "before" a newest-first one
+        decoded = decode_cursor(cursor, _CURSOR_COLUMNS)
+        if decoded is not None:
+            direction, (after_rank, after_id) = decoded
+        else:
+            direction = "before" if _is_broad(session, match) else "after"
+
+        filters = ["media_search MATCH :match"]
+        params = {"match": match, "limit": limit + 1}
+        if direction == "after":
+            order_by = "media_search.rank, media_search.rowid"
+            if decoded is not None:
+                filters.append("(media_search.rank, media_search.rowid) > (:after_rank, :after_id)")
+                params.update(after_rank=after_rank, after_id=after_id)
+        else:
+            order_by = "media_search.rowid DESC"
+            if decoded is not None:
+                filters.append("media_search.rowid < :after_id")
+                params["after_id"] = after_id
+        if media_type:
+            filters.append("media.media_type = :media_type")
+            params["media_type"] = media_type
+
+        sql = text(
+            f"""
+            SELECT media_search.rowid AS id, media_search.rank AS rank,
+                snippet(media_search, -1, '{_MARK_START}', '{_MARK_END}', '…', {SNIPPET_TOKENS}) AS snippet
+            FROM media_search JOIN media ON media.id = media_search.rowid
+            WHERE {" AND ".join(filters)}
+            ORDER BY {order_by}
+            LIMIT :limit
+            """
+        )
+        hits = session.execute(sql, params).all()
+        has_more = len(hits) > limit
+        hits = hits[:limit]
+
+        rows = (
+            session.query(Media, Model)
+            .join(Model, Media.model_id == Model.id)
+            .filter(Media.id.in_([hit.id for hit in hits]))
+            .all()
+            if hits
+            else []
+        )
+    finally:
+        session.close()
+
+    by_id = {media.id: (media, model) for media, model in rows}
+    items = []
+    for hit in hits:
+        if hit.id not in by_id:
+            continue
+        media, model = by_id[hit.id]
+        items.append(
+            {
+                "id": media.id,
+                "model_id": model.id,
+                "model_name": model.name,
+                "model_slug": model.slug,
+                "media_type": media.media_type,
+                "url": media_path_to_url(media.file_path) if media.file_path else None,
+                "thumbnails": thumbnail_urls(media),
+                "original_filename": media.original_filename,
+                "rating": media.rating,
+                "rating_caption": media.rating_caption,
+                "snippet": _render_snippet(hit.snippet),
+                "score": round(-hit.rank, 4),
+            }
+        )
+
+    next_cursor = encode_cursor(direction, (hits[-1].rank, hits[-1].id)) if hits and has_more else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def rebuild_search_index() -> int:
+    """
+    Refills the index from media and models in one transaction.
+    Returns the number of indexed media rows.
+    """
+    session = SessionLocal()
+    try:
+        for statement in REBUILD_SEARCH_INDEX:
+            session.execute(text(statement))
+        session.commit()
+        return session.execute(text("SELECT count(*) FROM media_search")).scalar() or 0
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Full-text media search index.")
+    parser.add_argument("command", choices=["rebuild", "query"])
+    parser.add_argument("text", nargs="?", default="")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        print(f"Indexed {rebuild_search_index()} media")
+    else:
+        for item in search_media(args.text, limit=20)["items"]:
+            print(f"{item['score']:>8}  {item['id']:>7}  {item['model_name']}  {item['snippet']}")
@@ -1,107 +1,62 @@
 from sqlalchemy import func
 
-from models.database import SessionLocal
+from models.database import ReadSessionLocal
 from models.model_entity import Model
-from models.media_entity import Media
+from models.model_stats_entity import ModelStats
+from services import model_stats_service
+from services.model_registry import model_registry
 
 
 def get_overall_stats() -> dict:
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
         total_models = session.query(func.count(Model.id)).scalar() or 0
-        total_media = session.query(func.count(Media.id)).scalar() or 0
-        total_images = (
-            session.query(func.count(Media.id))
-            .filter(Media.media_type == "image")
-            .scalar()
-            or 0
-        )
-        total_videos = (
-            session.query(func.count(Media.id))
-            .filter(Media.media_type == "video")
-            .scalar()
-            or 0
-        )
-        rated_images = (
-            session.query(func.count(Media.id))
-            .filter(Media.media_type == "image")
-            .filter(Media.rating.is_not(None))
-            .scalar()
-            or 0
-        )
-        avg_rating = (
-            session.query(func.avg(Media.rating))
-            .filter(Media.rating.is_not(None))
-            .scalar()
-        )
-
+        (
+            total_media,
+            total_images,
+            total_videos,
+            rated_count,
+            unrated_count,
+            rating_sum,
+        ) = session.query(
+            func.sum(ModelStats.total_count),
+            func.sum(ModelStats.image_count),
+            func.sum(ModelStats.video_count),
+            func.sum(ModelStats.rated_count),
+            func.sum(ModelStats.unrated_count),
+            func.sum(ModelStats.rating_sum),
+        ).one()
+
+        total_images = total_images or 0
         return {
             "total_models": total_models,
-            "total_media": total_media,
+            "total_media": total_media or 0,
             "total_images": total_images,
-            "total_videos": total_videos,
-            "rated_images": rated_images,
-            "avg_rating": avg_rating,
+            "total_videos": total_videos or 0,
+            "rated_images": max(total_images - (unrated_count or 0), 0),
+            "avg_rating": rating_sum / rated_count if rated_count else None,
         }
     finally:
         session.close()
 
 
 def get_model_stats(model_name: str) -> dict | None:
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
-        model = session.query(Model).filter_by(name=model_name).first()
+        model = model_registry.get_by_name(model_name)
         if not model:
             return None
 
-        total_media = (
-            session.query(func.count(Media.id))
-            .filter(Media.model_id == model.id)
-            .scalar()
-            or 0
-        )
-        total_images = (
-            session.query(func.count(Media.id))
-            .filter(Media.model_id == model.id)
-            .filter(Media.media_type == "image")
-            .scalar()
-            or 0
-        )
-        total_videos = (
-            session.query(func.count(Media.id))
-            .filter(Media.model_id == model.id)
-            .filter(Media.media_type == "video")
-            .scalar()
-            or 0
-        )
-        rated_images = (
-            session.query(func.count(Media.id))
-            .filter(Media.model_id == model.id)
-            .filter(Media.media_type == "image")
-            .filter(Media.rating.is_not(None))
-            .scalar()
-            or 0
-        )
-        avg_rating = (
-            session.query(func.avg(Media.rating))
-            .filter(Media.model_id == model.id)
-            .filter(Media.rating.is_not(None))
-            .scalar()
-        )
-        last_upload = (
-            session.query(func.max(Media.created_at))
-            .filter(Media.model_id == model.id)
-            .scalar()
-        )
+        stats = model_stats_service.get_stats_for_model(session, model.id) or ModelStats.empty(model.id)
 
         return {
             "model_name": model.name,
-            "total_media": total_media,
-            "total_images": total_images,
-            "total_videos": total_videos,
-            "rated_images": rated_images,
-            "avg_rating": avg_rating,
-            "last_upload": last_upload,
+            "total_media": stats.total_count,
+            "total_images": stats.image_count,
+            "total_videos": stats.video_count,
+            "rated_images": stats.rated_images,
+            "avg_rating": stats.avg_rating,
+            "last_upload": stats.last_upload_at,
         }
     finally:
         session.close()
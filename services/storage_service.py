@@ -1,49 +1,300 @@
 from pathlib import Path
 import config
+from models.database import SessionLocal
 from models.media_entity import Media
+import asyncio
+import hashlib
 import logging
+import os
 import shutil
+import tempfile
 import aiofiles
+from fastapi import UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from services import model_service # Import model_service to use its create_media_record
+from services import blob_locks, model_service, thumbnail_service # Import model_service to use its create_media_record
 
 logger = logging.getLogger(__name__)
 
+SNIFF_BYTES = 16
+MP4_BOX_TYPES = {b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot"}
+
+
 def normalize_model_name(name: str) -> str:
     return name.strip().lower().replace(" ", "_")
 
-async def save_uploaded_media(db: Session, model_id: int, file: bytes, filename: str, media_type: str) -> Media:
-    model = model_service.get_model_by_id_with_session(db, model_id)
+
+def sniff_media_type(head: bytes) -> str | None:
+    """
+    Detects the media type from the first bytes of a file.
+    Returns "image", "video" or None when the signature is unknown.
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image"
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "image"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "video"  # WebM / Matroska
+    if head[4:8] in MP4_BOX_TYPES:
+        return "video"  # MP4 / QuickTime
+    return None
+
+
+def hash_file(file_path: str) -> tuple[str, int]:
+    """
+    Returns (sha256, size) of a file on disk, read in upload-sized chunks.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, "rb") as in_file:
+        while chunk := in_file.read(config.UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+async def stream_upload_to_temp(file: UploadFile, target_dir: Path) -> dict:
+    """
+    Streams an upload to a temp file inside `target_dir` in fixed-size chunks.
+    Hash, size and type sniffing are computed on the same pass, so memory use
+    stays at one chunk regardless of the file size.
+    """
+    target_dir.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(prefix=".upload-", suffix=".part", dir=target_dir)
+    os.close(fd)
+
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+
+    try:
+        async with aiofiles.open(temp_name, "wb") as out_file:
+            while True:
+                chunk = await file.read(config.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[: SNIFF_BYTES - len(head)]
+                digest.update(chunk)
+                size += len(chunk)
+                await out_file.write(chunk)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+
+    return {
+        "temp_path": temp_name,
+        "sha256": digest.hexdigest(),
+        "size": size,
+        "sniffed_type": sniff_media_type(head),
+    }
+
+
+def store_path_for(content_hash: str, extension: str) -> Path:
+    """
+    Returns the content-addressed location of a blob in MEDIA_STORE_ROOT,
+    fanned out as ab/cd/<hash><ext> so no directory grows unbounded.
+    """
+    return (
+        Path(config.MEDIA_STORE_ROOT)
+        / content_hash[:2]
+        / content_hash[2:4]
+        / f"{content_hash}{extension.lower()}"
+    )
+
+
+def media_path_to_url(file_path: str) -> str:
+    """
+    Maps a stored file path to its /media URL. Handles sharded store
+    paths, the older flat store and legacy per-model directories.
+    """
+    if not file_path:
+        return ""
+
+    path = Path(file_path)
+    for prefix, root in (
+        ("store", config.MEDIA_STORE_ROOT),
+        ("thumbs", config.THUMBNAIL_ROOT),
+        ("models", config.MEDIA_ROOT),
+    ):
+        try:
+            relative = path.relative_to(root)
+        except ValueError:
+            continue
+        return f"/media/{prefix}/{relative.as_posix()}"
+
+    # Rows written with a different base directory
+    normalized = file_path.replace("\\", "/")
+    if "/media/" in normalized:
+        return normalized[normalized.index("/media/") :]
+    if normalized.startswith("media/"):
+        return "/" + normalized
+    return ""
+
+
+async def stage_uploaded_media(db: AsyncSession, model_id: int, file: UploadFile, media_type: str) -> dict:
+    model = await model_service.get_model_by_id_async(db, model_id)
     if not model:
         raise ValueError(f"Model with ID {model_id} not found.")
-    
-    model_slug = normalize_model_name(model.name)
-    model_dir = Path(config.MEDIA_ROOT) / model_slug
-    model_dir.mkdir(parents=True, exist_ok=True)
-
-    file_path = model_dir / filename
-
-    async with aiofiles.open(file_path, 'wb') as out_file:
-        await out_file.write(file)
-    
-    # Create media record in the database
-    media_record = model_service.create_media_record(db, model_id, str(file_path), media_type)
-    return media_record
-
-def delete_media_files(media_records: list[Media]) -> None:
-    for media in media_records:
-        file_path = Path(media.file_path)
-        if file_path.exists():
-            try:
-                file_path.unlink()  # Delete the file
-                logger.info(f"Deleted media file: {file_path}")
-            except OSError as e:
-                logger.error(f"Error deleting file {file_path}: {e}")
+
+    # Stage inside the store so the final rename never crosses filesystems
+    staged = await stream_upload_to_temp(file, Path(config.MEDIA_STORE_ROOT))
+    extension = Path(file.filename).suffix
+    staged.update(
+        model_id=model_id,
+        filename=Path(file.filename).name,
+        media_type=media_type,
+        final_path=str(store_path_for(staged["sha256"], extension)),
+    )
+
+    if staged["sniffed_type"] != media_type:
+        discard_staged_media(staged)
+        raise ValueError(f"File contents do not match a supported {media_type} format: {file.filename}")
+
+    return staged
+
+
+def _move_staged_into_store(staged_files: list[dict]) -> None:
+    for staged in staged_files:
+        final_path = Path(staged["final_path"])
+        if final_path.exists():
+            # Identical content is already stored; the new row shares that blob
+            discard_staged_media(staged)
         else:
-            logger.warning(f"Media file not found, skipping: {file_path}")
+            # Atomic on the same filesystem, so readers never see a partial file
+            final_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staged["temp_path"], final_path)
+            staged["created_blob"] = True
+
+
+async def _lock_blobs(file_paths: list[str]) -> None:
+    # Blocking lock waits stay off the event loop. The acquiring thread
+    # cannot be stopped, so if this task is cancelled the locks are handed
+    # back as soon as the thread has them.
+    acquiring = asyncio.ensure_future(asyncio.to_thread(blob_locks.acquire, file_paths))
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        def release_when_acquired(task: asyncio.Future) -> None:
+            if not task.cancelled() and task.exception() is None:
+                blob_locks.release(file_paths)
+
+        acquiring.add_done_callback(release_when_acquired)
+        raise
+
+
+def _release_created_blobs(references: list[tuple[str, str | None]]) -> None:
+    session = SessionLocal()
+    try:
+        release_media_files(session, references)
+    finally:
+        session.close()
+
+
+def _unlock_staged_batch(staged_files: list[dict]) -> None:
+    locked = [staged["final_path"] for staged in staged_files if staged.pop("locked", False)]
+    if locked:
+        blob_locks.release(locked)
+
+
+async def finalize_staged_batch(db: AsyncSession, staged_files: list[dict]) -> list[Media]:
+    """
+    Moves staged files into the store and inserts their rows in one statement.
+    The batch's blobs stay locked against release until commit_staged_batch;
+    on failure call abort_staged_batch.
+    """
+    final_paths = [staged["final_path"] for staged in staged_files]
+    await _lock_blobs(final_paths)
+    for staged in staged_files:
+        staged["locked"] = True
+    await asyncio.to_thread(_move_staged_into_store, staged_files)
+    return await model_service.create_media_records_async(
+        db,
+        [
+            {
+                "model_id": staged["model_id"],
+                "file_path": staged["final_path"],
+                "media_type": staged["media_type"],
+                "content_hash": staged["sha256"],
+                "file_size": staged["size"],
+                "original_filename": staged["filename"],
+                "perceptual_hash": staged.get("perceptual_hash"),
+            }
+            for staged in staged_files
+        ],
+    )
+
+
+async def commit_staged_batch(db: AsyncSession, staged_files: list[dict]) -> None:
+    """
+    Commits a finalized batch, then lets deletes release its blobs again.
+    On failure call abort_staged_batch.
+    """
+    await db.commit()
+    _unlock_staged_batch(staged_files)
+
+
+async def abort_staged_batch(db: AsyncSession, staged_files: list[dict]) -> None:
+    """
+    Rolls back an uncommitted batch and removes the files it wrote.
+    Blobs that another committed row now references are kept. The release
+    waits on blob locks, so it runs in a thread with its own session.
+    """
+    await db.rollback()
+    for staged in staged_files:
+        await asyncio.to_thread(discard_staged_media, staged)
+    _unlock_staged_batch(staged_files)
+    created = [(staged["final_path"], None) for staged in staged_files if staged.get("created_blob")]
+    if created:
+        await asyncio.to_thread(_release_created_blobs, created)
+
+
+def discard_staged_media(staged: dict) -> None:
+    try:
+        Path(staged["temp_path"]).unlink(missing_ok=True)
+    except OSError as e:
+        logger.error(f"Error deleting staged upload {staged['temp_path']}: {e}")
+
+
+def release_media_files(db: Session, references: list[tuple[str, str | None]]) -> None:
+    """
+    Takes (file_path, content_hash) pairs of deleted rows and removes each file
+    and its thumbnails once no remaining row references them.
+    Call after the delete commits: each file is re-counted under its blob
+    lock, so an upload reusing the blob either commits first or waits.
+    """
+    for file_path in {file_path for file_path, _ in references}:
+        with blob_locks.held([file_path]):
+            # Ends any earlier read, so the count sees uploads committed before the lock
+            db.rollback()
+            if model_service.count_media_references(db, file_path) > 0:
+                logger.info(f"Media file still referenced, keeping: {file_path}")
+                continue
+
+            path = Path(file_path)
+            if path.exists():
+                try:
+                    path.unlink()  # Delete the file
+                    logger.info(f"Deleted media file: {path}")
+                except OSError as e:
+                    logger.error(f"Error deleting file {path}: {e}")
+            else:
+                logger.warning(f"Media file not found, skipping: {path}")
+
+    for content_hash in {content_hash for _, content_hash in references if content_hash}:
+        if model_service.count_content_references(db, content_hash) == 0:
+            thumbnail_service.delete_thumbnails(content_hash)
 
 
 def delete_model_directory(model_name: str) -> None:
+    """
+    Removes the legacy per-model directory. Store blobs are released
+    once their last referencing row is deleted.
+    """
     model_slug = normalize_model_name(model_name)
     model_dir = Path(config.MEDIA_ROOT) / model_slug
     if model_dir.exists() and model_dir.is_dir():
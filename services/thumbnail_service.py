@@ -0,0 +1,246 @@
+import argparse
+from datetime import datetime
+import io
+import logging
+import os
+from pathlib import Path
+import tempfile
+
+try:
+    from PIL import Image, ImageOps, features
+except Exception:
+    Image = None
+
+import config
+from models.database import SessionLocal
+from models import model_entity  # ensure model metadata is loaded
+from models.media_entity import Media
+from services import video_service
+
+logger = logging.getLogger(__name__)
+
+# Fixed derivative widths; originals narrower than a width are not upscaled
+THUMBNAIL_WIDTHS = {
+    "grid": 320,
+    "card": 640,
+    "lightbox": 1600,
+}
+
+# Video previews: a poster frame and a left-to-right strip for hover scrubbing
+VIDEO_PREVIEWS = ("poster", "sprite")
+VIDEO_POSTER_POSITION = 0.1  # fraction of the duration, skips fade-ins
+VIDEO_SPRITE_FRAMES = 10
+VIDEO_SPRITE_FRAME_WIDTH = 160
+
+if Image is not None and features.check("webp"):
+    THUMBNAIL_FORMAT, THUMBNAIL_EXTENSION = "WEBP", ".webp"
+else:
+    THUMBNAIL_FORMAT, THUMBNAIL_EXTENSION = "JPEG", ".jpg"
+
+
+def thumbnail_path_for(content_hash: str, size: str) -> Path:
+    return Path(config.THUMBNAIL_ROOT) / size / f"{content_hash}{THUMBNAIL_EXTENSION}"
+
+
+def _preview_names(media_type: str):
+    return VIDEO_PREVIEWS if media_type == "video" else THUMBNAIL_WIDTHS
+
+
+def thumbnail_urls(media: Media) -> dict[str, str]:
+    """
+    Returns {size: url} for a media row whose thumbnails have been generated.
+    Videos get "poster" and "sprite" instead of the image sizes.
+    """
+    if not media.thumbnails_at or not media.content_hash:
+        return {}
+
+    # Served under /media/thumbs wherever THUMBNAIL_ROOT lives (web/routes/files.py)
+    root = Path(config.THUMBNAIL_ROOT)
+    return {
+        size: f"/media/thumbs/{thumbnail_path_for(media.content_hash, size).relative_to(root).as_posix()}"
+        for size in _preview_names(media.media_type)
+    }
+
+
+def _save_atomic(img, target: Path) -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(prefix=".thumb-", dir=target.parent)
+    os.close(fd)
+    try:
+        if THUMBNAIL_FORMAT == "WEBP":
+            img.save(temp_name, "WEBP", quality=80, method=4)
+        else:
+            img.convert("RGB").save(temp_name, "JPEG", quality=82, optimize=True, progressive=True)
+        os.replace(temp_name, target)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+
+
+def generate_thumbnails(file_path: str, content_hash: str) -> dict[str, Path]:
+    """
+    Writes EXIF-oriented derivatives of an image for every THUMBNAIL_WIDTHS size.
+    Sizes already on disk are skipped, so duplicates share their thumbnails.
+    """
+    if Image is None:
+        raise RuntimeError("Thumbnail generation requires Pillow.")
+
+    targets = {size: thumbnail_path_for(content_hash, size) for size in THUMBNAIL_WIDTHS}
+    missing = {size: path for size, path in targets.items() if not path.exists()}
+    if not missing:
+        return targets
+
+    with Image.open(file_path) as img:
+        # Let the JPEG decoder downscale while decoding when possible
+        largest = max(THUMBNAIL_WIDTHS[size] for size in missing)
+        img.draft("RGB", (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+        # Resize largest first and derive the smaller sizes from it
+        source = img
+        for size in sorted(missing, key=lambda name: THUMBNAIL_WIDTHS[name], reverse=True):
+            width = THUMBNAIL_WIDTHS[size]
+            if source.width > width:
+                height = max(1, round(source.height * width / source.width))
+                source = source.resize((width, height), Image.LANCZOS)
+            _save_atomic(source, missing[size])
+
+    return targets
+
+
+def generate_video_previews(file_path: str, content_hash: str) -> dict[str, Path]:
+    """
+    Writes a poster frame and a hover-scrub sprite sheet for a video.
+    Previews already on disk are skipped.
+    """
+    if Image is None:
+        raise RuntimeError("Video previews require Pillow.")
+
+    targets = {name: thumbnail_path_for(content_hash, name) for name in VIDEO_PREVIEWS}
+    missing = {name: path for name, path in targets.items() if not path.exists()}
+    if not missing:
+        return targets
+
+    duration = video_service.probe_video_file(file_path)["duration"]
+    for name, path in missing.items():
+        if name == "poster":
+            data = video_service.extract_poster_frame(
+                file_path,
+                duration * VIDEO_POSTER_POSITION,
+                THUMBNAIL_WIDTHS["card"],
+            )
+        else:
+            data = video_service.extract_sprite_sheet(
+                file_path,
+                duration,
+                VIDEO_SPRITE_FRAMES,
+                VIDEO_SPRITE_FRAME_WIDTH,
+            )
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            _save_atomic(img, path)
+
+    return targets
+
+
+def _generate_for_media(media: Media) -> None:
+    if media.media_type == "video":
+        generate_video_previews(media.file_path, media.content_hash)
+    else:
+        generate_thumbnails(media.file_path, media.content_hash)
+
+
+def delete_thumbnails(content_hash: str) -> None:
+    for size in (*THUMBNAIL_WIDTHS, *VIDEO_PREVIEWS):
+        path = thumbnail_path_for(content_hash, size)
+        try:
+            path.unlink(missing_ok=True)
+        except OSError as exc:
+            logger.error(f"Error deleting thumbnail {path}: {exc}")
+
+
+def create_thumbnails_for_media(media: Media) -> bool:
+    """
+    Generates thumbnails or video previews for one row and marks it ready.
+    Returns False when the file could not be processed. Caller commits.
+    """
+    if media.media_type not in ("image", "video") or not media.content_hash:
+        return False
+
+    try:
+        _generate_for_media(media)
+    except Exception as exc:
+        logger.warning("Failed to create thumbnails: %s (%s)", media.file_path, exc)
+        return False
+
+    media.thumbnails_at = datetime.utcnow()
+    return True
+
+
+def create_thumbnails_for_media_id(media_id: int) -> bool:
+    """
+    Job entry point: generates thumbnails for one row.
+    Errors propagate so the job queue can retry.
+    """
+    session = SessionLocal()
+    try:
+        media = session.query(Media).filter(Media.id == media_id).first()
+        if not media or media.media_type not in ("image", "video") or not media.content_hash:
+            return False
+
+        _generate_for_media(media)
+        media.thumbnails_at = datetime.utcnow()
+        session.commit()
+        return True
+    finally:
+        session.close()
+
+
+def backfill_thumbnails(batch_size: int = 200) -> int:
+    """
+    Creates thumbnails and video previews for existing media, hashing
+    legacy files on the way.
+    Walks the table in id order one batch at a time.
+    """
+    from services.storage_service import hash_file
+
+    created = 0
+    last_id = 0
+    session = SessionLocal()
+    try:
+        while True:
+            batch = (
+                session.query(Media)
+                .filter(Media.id > last_id)
+                .filter(Media.media_type.in_(("image", "video")))
+                .filter(Media.thumbnails_at.is_(None))
+                .order_by(Media.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                break
+
+            for media in batch:
+                if not media.content_hash and Path(media.file_path).exists():
+                    media.content_hash, media.file_size = hash_file(media.file_path)
+                if create_thumbnails_for_media(media):
+                    created += 1
+
+            last_id = batch[-1].id
+            session.commit()
+    finally:
+        session.close()
+
+    return created
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create thumbnails for existing media.")
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    count = backfill_thumbnails(batch_size=args.batch_size)
+    print(f"Created thumbnails for {count} media items")
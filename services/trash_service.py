@@ -0,0 +1,191 @@
+import argparse
+from datetime import datetime, timedelta
+import logging
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+import config
+from models.database import SessionLocal
+from models.media_entity import Media
+from models.model_entity import Model
+from models.soft_delete import INCLUDE_DELETED
+from services import bulk_delete_service, job_service, model_service, storage_service
+from services.model_registry import model_registry
+from services.model_search import model_search_index
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------
+# Soft delete and restore
+# -------------------------
+# Deleting only stamps deleted_at, which hides the rows from every ORM
+# query (see models/soft_delete.py). A "purge" job removes rows and files
+# once DELETE_GRACE_SECONDS have passed; until then a restore undoes it.
+
+def purge_due_at(deleted_at: datetime) -> datetime:
+    return deleted_at + timedelta(seconds=config.DELETE_GRACE_SECONDS)
+
+
+def _schedule_purge(db: Session, deleted_at: datetime) -> None:
+    """
+    Queues the purge after the delete has committed. Deletes in the same
+    minute share one job; enqueue settles a race for it on its own. A
+    failure only delays the purge, because every purge removes all
+    tombstones that are due.
+    """
+    run_after = purge_due_at(deleted_at).replace(second=0, microsecond=0) + timedelta(minutes=1)
+    try:
+        job_service.enqueue(
+            db,
+            "purge",
+            dedupe_key=f"purge:{run_after.isoformat(timespec='minutes')}",
+            run_after=run_after,
+        )
+    except SQLAlchemyError as exc:
+        db.rollback()
+        logger.warning("Could not schedule purge for %s: %s", run_after, exc)
+
+
+def _deleted(db: Session, entity, entity_id: int):
+    return (
+        db.query(entity)
+        .execution_options(**{INCLUDE_DELETED: True})
+        .filter(entity.id == entity_id, entity.deleted_at.is_not(None))
+        .first()
+    )
+
+
+def soft_delete_model(db: Session, model_id: int) -> datetime | None:
+    """
+    Hides a model and all of its media. Returns the deletion time, or
+    None when no such live model exists.
+    """
+    model = model_service.get_model_by_id_with_session(db, model_id)
+    if not model:
+        return None
+
+    deleted_at = datetime.utcnow()
+    model.deleted_at = deleted_at
+    live_ids = (
+        db.query(Media.id)
+        .filter(Media.model_id == model_id, Media.deleted_at.is_(None))
+        .scalar_subquery()
+    )
+    db.query(Media).filter(Media.id.in_(live_ids)).update(
+        {Media.deleted_at: deleted_at}, synchronize_session=False
+    )
+    db.commit()
+    _schedule_purge(db, deleted_at)
+
+    model_registry.invalidate()
+    model_search_index.remove(model_id)
+    return deleted_at
+
+
+def restore_model(db: Session, model_id: int) -> Model | None:
+    """
+    Brings back a soft-deleted model with the media deleted along with
+    it. Media that was deleted on its own earlier stays deleted.
+    """
+    model = _deleted(db, Model, model_id)
+    if not model:
+        return None
+
+    db.query(Media).filter(
+        Media.model_id == model_id,
+        Media.deleted_at == model.deleted_at,
+    ).update({Media.deleted_at: None}, synchronize_session=False)
+    model.deleted_at = None
+    model_service.reclaim_tombstone_name(db, model)
+    db.commit()
+
+    model_registry.invalidate()
+    db.refresh(model)
+    model_search_index.add(model.id, model.name, model.slug)
+    return model
+
+
+def soft_delete_media(db: Session, media_id: int) -> datetime | None:
+    media = model_service.get_media_by_id_with_session(db, media_id)
+    if not media:
+        return None
+
+    deleted_at = media.deleted_at = datetime.utcnow()
+    db.commit()
+    _schedule_purge(db, deleted_at)
+    return deleted_at
+
+
+def restore_media(db: Session, media_id: int) -> Media | None:
+    """
+    Brings back one soft-deleted media item. Fails (returns None) while
+    its model is itself deleted; restore the model instead.
+    """
+    media = _deleted(db, Media, media_id)
+    if not media or not model_service.get_model_by_id_with_session(db, media.model_id):
+        return None
+
+    media.deleted_at = None
+    db.commit()
+    db.refresh(media)
+    return media
+
+
+# -------------------------
+# Purge
+# -------------------------
+
+def due_media_criteria(cutoff: datetime) -> tuple:
+    """Media tombstones whose grace period ended at `cutoff`."""
+    return (Media.deleted_at.is_not(None), Media.deleted_at <= cutoff)
+
+
+def purge_expired(now: datetime | None = None) -> dict:
+    """
+    Hard-deletes models and media whose grace period has ended, with
+    their files. Rows restored in the meantime are no longer marked and
+    are left alone.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=config.DELETE_GRACE_SECONDS)
+    stats = {"models": 0, "media": 0}
+
+    session = SessionLocal()
+    try:
+        models = (
+            session.query(Model.id, Model.name)
+            .execution_options(**{INCLUDE_DELETED: True})
+            .filter(Model.deleted_at.is_not(None), Model.deleted_at <= cutoff)
+            .all()
+        )
+        for model_id, name in models:
+            # Restored meanwhile: the model row stays
+            result = model_service.delete_model_by_id(session, model_id, Model.deleted_at.is_not(None))
+            stats["models"] += result["models"]
+            stats["media"] += result["media"]
+            # Legacy per-model folder, unless a live model has the name again
+            original_name = name.removesuffix(f" (deleted {model_id})")
+            if original_name == name:
+                storage_service.delete_model_directory(name)
+
+        result = bulk_delete_service.delete_media_where(session, *due_media_criteria(cutoff))
+        stats["media"] += result["deleted"]
+    finally:
+        session.close()
+
+    if stats["models"] or stats["media"]:
+        logger.info("Purged deleted models and media: %s", stats)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Permanently remove soft-deleted models and media.")
+    parser.add_argument("--now", action="store_true", help="ignore the grace period and purge every tombstone")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.now:
+        config.DELETE_GRACE_SECONDS = 0
+    result = purge_expired()
+    print(f"Purged {result['models']} models and {result['media']} media")
@@ -0,0 +1,177 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Optional
+import asyncio
+import logging
+import os
+import tempfile
+import uuid
+
+import aiofiles
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import config
+from models.upload_session_entity import UploadSession
+from services import model_service, storage_service
+
+logger = logging.getLogger(__name__)
+
+# Session ids with a chunk write in progress in this process
+_active_writes: set[str] = set()
+
+
+class OffsetMismatchError(Exception):
+    """
+    Raised when a chunk does not start at the session's current offset.
+    """
+
+    def __init__(self, expected: int):
+        super().__init__(f"Expected offset {expected}.")
+        self.expected = expected
+
+
+class SessionBusyError(Exception):
+    """
+    Raised when another chunk for the same session is still being written.
+    """
+
+
+def create_session(
+    db: Session,
+    model_id: int,
+    filename: str,
+    media_type: str,
+    total_size: int,
+) -> UploadSession:
+    if total_size <= 0:
+        raise ValueError("Upload size must be greater than zero.")
+    if total_size > config.UPLOAD_SESSION_MAX_BYTES:
+        raise ValueError(f"Upload exceeds the {config.UPLOAD_SESSION_MAX_BYTES} byte limit.")
+
+    purge_expired_sessions(db)
+
+    # Stage inside the store so finalizing is a same-filesystem rename
+    target_dir = Path(config.MEDIA_STORE_ROOT)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(prefix=".session-", suffix=".part", dir=target_dir)
+    os.close(fd)
+
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        model_id=model_id,
+        filename=Path(filename).name,
+        media_type=media_type,
+        temp_path=temp_name,
+        total_size=total_size,
+        received=0,
+    )
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return session
+
+
+def get_session(db: Session, session_id: str) -> Optional[UploadSession]:
+    return db.query(UploadSession).filter(UploadSession.id == session_id).first()
+
+
+async def get_session_async(db: AsyncSession, session_id: str) -> Optional[UploadSession]:
+    return await db.scalar(select(UploadSession).where(UploadSession.id == session_id))
+
+
+async def append_chunk(
+    db: AsyncSession,
+    session: UploadSession,
+    offset: int,
+    chunks: AsyncIterator[bytes],
+) -> UploadSession:
+    """
+    Appends a request body to the staging file starting at `offset`.
+    Whatever arrived before a dropped connection is kept and recorded,
+    so the client can resume from the returned offset.
+    """
+    if session.id in _active_writes:
+        raise SessionBusyError("A chunk for this upload is already in progress.")
+    if offset != session.received:
+        raise OffsetMismatchError(session.received)
+
+    _active_writes.add(session.id)
+    received = session.received
+    try:
+        # Drop bytes written after the last recorded offset (e.g. a crash mid-chunk)
+        await asyncio.to_thread(os.truncate, session.temp_path, received)
+        async with aiofiles.open(session.temp_path, "ab") as out_file:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if received + len(chunk) > session.total_size:
+                    raise ValueError("Chunk extends past the declared upload size.")
+                await out_file.write(chunk)
+                received += len(chunk)
+    finally:
+        _active_writes.discard(session.id)
+        session.received = received
+        session.updated_at = datetime.utcnow()
+        await db.commit()
+
+    return session
+
+
+async def stage_session(db: AsyncSession, session: UploadSession) -> dict:
+    """
+    Turns a fully received session into the staged dict used by the
+    storage service, in the same shape as stage_uploaded_media.
+    """
+    if session.received != session.total_size:
+        raise OffsetMismatchError(session.received)
+
+    model = await model_service.get_model_by_id_async(db, session.model_id)
+    if not model:
+        raise ValueError(f"Model with ID {session.model_id} not found.")
+
+    content_hash, size = await asyncio.to_thread(storage_service.hash_file, session.temp_path)
+    async with aiofiles.open(session.temp_path, "rb") as in_file:
+        head = await in_file.read(storage_service.SNIFF_BYTES)
+
+    staged = {
+        "temp_path": session.temp_path,
+        "sha256": content_hash,
+        "size": size,
+        "sniffed_type": storage_service.sniff_media_type(head),
+        "model_id": session.model_id,
+        "filename": session.filename,
+        "media_type": session.media_type,
+        "final_path": str(storage_service.store_path_for(content_hash, Path(session.filename).suffix)),
+    }
+    if staged["sniffed_type"] != session.media_type:
+        raise ValueError(f"File contents do not match a supported {session.media_type} format: {session.filename}")
+
+    return staged
+
+
+def delete_session(db: Session, session: UploadSession) -> None:
+    Path(session.temp_path).unlink(missing_ok=True)
+    db.delete(session)
+    db.commit()
+
+
+async def delete_session_async(db: AsyncSession, session: UploadSession) -> None:
+    await asyncio.to_thread(Path(session.temp_path).unlink, missing_ok=True)
+    await db.delete(session)
+    await db.commit()
+
+
+def purge_expired_sessions(db: Session) -> int:
+    cutoff = datetime.utcnow() - timedelta(hours=config.UPLOAD_SESSION_TTL_HOURS)
+    expired = db.query(UploadSession).filter(UploadSession.updated_at < cutoff).all()
+    for session in expired:
+        if session.id in _active_writes:
+            continue
+        Path(session.temp_path).unlink(missing_ok=True)
+        db.delete(session)
+    if expired:
+        db.commit()
+        logger.info("Purged %s expired upload sessions", len(expired))
+    return len(expired)
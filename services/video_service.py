@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+import subprocess
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Caps concurrent ffprobe processes so a bulk upload cannot saturate the CPU
+_probe_slots = asyncio.Semaphore(max(1, config.FFPROBE_MAX_CONCURRENCY))
+
+
+def _parse_float(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_int(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_probe_output(raw: str) -> dict:
+    """
+    Converts ffprobe JSON output into duration, codec, width, height and bitrate.
+    Raises ValueError when the output has no usable video stream or duration.
+    """
+    try:
+        data = json.loads(raw or "{}")
+    except json.JSONDecodeError as exc:
+        raise ValueError("Invalid video metadata.") from exc
+
+    streams = data.get("streams") or []
+    stream = streams[0] if streams else {}
+    fmt = data.get("format") or {}
+
+    duration = _parse_float(fmt.get("duration"))
+    if duration is None:
+        duration = _parse_float(stream.get("duration"))
+    if duration is None or not stream:
+        raise ValueError("Invalid video metadata.")
+
+    return {
+        "duration": duration,
+        "codec": stream.get("codec_name"),
+        "width": _parse_int(stream.get("width")),
+        "height": _parse_int(stream.get("height")),
+        "bitrate": _parse_int(fmt.get("bit_rate")) or _parse_int(stream.get("bit_rate")),
+    }
+
+
+def _probe_args(file_path: str) -> list[str]:
+    return [
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "format=duration,bit_rate:stream=codec_name,width,height,duration,bit_rate",
+        "-of",
+        "json",
+        file_path,
+    ]
+
+
+async def probe_video(file_path: str) -> dict:
+    """
+    Runs ffprobe as an asyncio subprocess against a file already on disk.
+    Raises RuntimeError if ffprobe is unavailable and ValueError if the file
+    cannot be read as a video.
+    """
+    async with _probe_slots:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "ffprobe",
+                *_probe_args(file_path),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except FileNotFoundError as exc:
+            raise RuntimeError("ffprobe not installed") from exc
+
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate(),
+                timeout=config.FFPROBE_TIMEOUT_SECONDS,
+            )
+        except asyncio.TimeoutError as exc:
+            process.kill()
+            await process.wait()
+            raise ValueError("Timed out reading video metadata.") from exc
+
+    if process.returncode != 0:
+        logger.warning(
+            "ffprobe failed for %s: %s",
+            file_path,
+            stderr.decode("utf-8", "replace").strip(),
+        )
+        raise ValueError("Could not read video metadata.")
+
+    return parse_probe_output(stdout.decode("utf-8", "replace"))
+
+
+def probe_video_file(file_path: str) -> dict:
+    """
+    Blocking variant of probe_video for background jobs and CLI tools.
+    """
+    try:
+        result = subprocess.run(
+            ["ffprobe", *_probe_args(file_path)],
+            capture_output=True,
+            timeout=config.FFPROBE_TIMEOUT_SECONDS,
+        )
+    except FileNotFoundError as exc:
+        raise RuntimeError("ffprobe not installed") from exc
+    except subprocess.TimeoutExpired as exc:
+        raise ValueError("Timed out reading video metadata.") from exc
+
+    if result.returncode != 0:
+        logger.warning(
+            "ffprobe failed for %s: %s",
+            file_path,
+            result.stderr.decode("utf-8", "replace").strip(),
+        )
+        raise ValueError("Could not read video metadata.")
+
+    return parse_probe_output(result.stdout.decode("utf-8", "replace"))
+
+
+def _extract_png(file_path: str, input_args: list[str], output_args: list[str]) -> bytes:
+    """
+    Runs ffmpeg and returns the first output frame as PNG bytes from stdout.
+    """
+    try:
+        result = subprocess.run(
+            [
+                "ffmpeg",
+                "-v",
+                "error",
+                *input_args,
+                "-i",
+                file_path,
+                "-an",
+                "-sn",
+                *output_args,
+                "-frames:v",
+                "1",
+                "-f",
+                "image2pipe",
+                "-vcodec",
+                "png",
+                "-",
+            ],
+            capture_output=True,
+            timeout=config.FFMPEG_TIMEOUT_SECONDS,
+        )
+    except FileNotFoundError as exc:
+        raise RuntimeError("ffmpeg not installed") from exc
+    except subprocess.TimeoutExpired as exc:
+        raise ValueError("Timed out extracting video frames.") from exc
+
+    if result.returncode != 0 or not result.stdout:
+        logger.warning(
+            "ffmpeg failed for %s: %s",
+            file_path,
+            result.stderr.decode("utf-8", "replace").strip(),
+        )
+        raise ValueError("Could not extract video frames.")
+
+    return result.stdout
+
+
+def extract_poster_frame(file_path: str, at_seconds: float, max_width: int) -> bytes:
+    """
+    Returns one frame at `at_seconds` as PNG, no wider than `max_width`.
+    Seeking before -i keeps this to a keyframe seek plus a short decode.
+    """
+    return _extract_png(
+        file_path,
+        ["-ss", f"{max(0.0, at_seconds):.3f}"],
+        ["-vf", f"scale='min({max_width},iw)':-2"],
+    )
+
+
+def extract_sprite_sheet(file_path: str, duration: float, frames: int, frame_width: int) -> bytes:
+    """
+    Returns `frames` evenly spaced frames tiled left to right as one PNG.
+    """
+    rate = frames / max(duration, 0.1)
+    return _extract_png(
+        file_path,
+        [],
+        ["-vf", f"fps={rate:.6f},scale={frame_width}:-2,tile={frames}x1"],
+    )
@@ -1,5 +1,5 @@
-from typing import Generator
-from models.database import SessionLocal
+from typing import AsyncGenerator, Generator
+from models.database import AsyncSessionLocal, ReadSessionLocal, SessionLocal
 
 
 def get_db() -> Generator:
@@ -8,3 +8,24 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+
+def get_read_db() -> Generator:
+    """
+    Session on the read-only pool, for GET routes. Never waits on writers.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db() -> AsyncGenerator:
+    """
+    AsyncSession for async def routes; queries are awaited instead of
+    blocking the event loop.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
@@ -1,29 +1,52 @@
+import asyncio
+from contextlib import asynccontextmanager
 import os
 from pathlib import Path
 
 from fastapi import Depends, FastAPI, HTTPException, Request, status
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from sqlalchemy import desc, func
 
+import config
 from models.database import (
-    ensure_media_rating_columns,
-    ensure_model_card_columns,
-    ensure_model_normalized_columns,
+    async_engine,
+    check_database_backend,
+    check_database_location,
     init_db,
+    ReadSessionLocal,
     SessionLocal,
 )
+from models.migrations import run_migrations
 from models.media_entity import Media
+from models.write_queue import write_queue
 from models.model_entity import Model
-from services import model_service, storage_service
+from models.model_stats_entity import ModelStats
+from services import backup_service, job_service, model_service, model_stats_service, pagination_service, storage_service, trash_service
 from services.card_service import clamp_card_value, compute_power_score, compute_star_rating
-from services.rating_service import backfill_missing_ratings
-from services.score_service import update_model_scores_from_source
+from services.model_registry import model_registry
+from services.storage_service import media_path_to_url
+from services.thumbnail_service import VIDEO_SPRITE_FRAMES, thumbnail_urls
 from web.auth import is_admin_request, require_admin_token
-from web.routes import auth, dashboard, insights, media, models
-from web.routes.media import media_path_to_url
+from web.routes import admin, auth, dashboard, files, insights, jobs, media, models, search
 
-app = FastAPI(title="VaultGalleryBot API")
+job_runner = job_service.JobRunner()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await job_runner.start()
+    await asyncio.to_thread(backup_service.ensure_backup_scheduled)
+    await asyncio.to_thread(job_service.ensure_prune_scheduled)
+    try:
+        yield
+    finally:
+        await job_runner.stop()
+        # Flush writes the workers queued while stopping
+        await asyncio.to_thread(write_queue.stop, config.JOB_SHUTDOWN_TIMEOUT_SECONDS)
+        await async_engine.dispose()
+
+
+app = FastAPI(title="VaultGalleryBot API", lifespan=lifespan)
 
 def _env_flag(name: str) -> str:
     return "set" if os.getenv(name) else "missing"
@@ -44,19 +67,19 @@ if _missing_env:
         "Missing required environment variables: " + ", ".join(_missing_env)
     )
 
+check_database_backend()
+check_database_location()
 init_db()
-ensure_media_rating_columns()
-ensure_model_normalized_columns()
-ensure_model_card_columns()
-backfill_missing_ratings()
-if os.getenv("SCORE_ON_START", "true").lower() in {"1", "true", "yes"}:
-    session = SessionLocal()
-    try:
-        update_model_scores_from_source(session)
-    except Exception as exc:
-        print(f"Score refresh failed: {exc}")
-    finally:
-        session.close()
+run_migrations()
+
+# Startup maintenance runs in the background job queue
+session = SessionLocal()
+try:
+    job_service.enqueue(session, "rating_backfill", dedupe_key="rating_backfill")
+    if os.getenv("SCORE_ON_START", "true").lower() in {"1", "true", "yes"}:
+        job_service.enqueue(session, "model_scores", dedupe_key="model_scores", max_attempts=1)
+finally:
+    session.close()
 
 # -------------------------
 # Resolve project root
@@ -67,6 +90,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Templates (kept for potential internal use or future web UI)
 # -------------------------
 templates = Jinja2Templates(directory=BASE_DIR / "web" / "templates")
+templates.env.globals["video_sprite_frames"] = VIDEO_SPRITE_FRAMES
 
 # -------------------------
 # Static files (CSS / JS)
@@ -77,17 +101,6 @@ app.mount(
     name="static",
 )
 
-# -------------------------
-# Static files for media (kept for mobile app to directly access media URLs)
-# -------------------------
-MEDIA_DIR = BASE_DIR / "media"
-
-app.mount(
-    "/media",
-    StaticFiles(directory=MEDIA_DIR),
-    name="media",
-)
-
 # -------------------------
 # UI Routes
 # -------------------------
@@ -100,35 +113,19 @@ app.include_router(insights.router)
 # -------------------------
 app.include_router(models.router)
 app.include_router(media.router)
+app.include_router(search.router)
+app.include_router(jobs.router)
+app.include_router(admin.router)
 
-
-def _slugify_model_name(name: str) -> str:
-    return storage_service.normalize_model_name(name)
-
-
-def _extract_slug_and_filename(file_path: str | None) -> tuple[str, str]:
-    if not file_path:
-        return "", ""
-
-    path = file_path.replace("\\", "/")
-    marker = "/media/models/"
-    if marker not in path:
-        return "", Path(path).name
-
-    tail = path.split(marker, 1)[1]
-    parts = [p for p in tail.split("/") if p]
-    if len(parts) < 2:
-        return "", Path(path).name
-
-    return parts[0], parts[-1]
+# -------------------------
+# Media files (kept public for the mobile app to directly access media URLs)
+# -------------------------
+app.include_router(files.router)
 
 
 def _get_model_by_slug(session, slug: str) -> Model | None:
-    models_list = session.query(Model).order_by(Model.name).all()
-    for model in models_list:
-        if _slugify_model_name(model.name) == slug:
-            return model
-    return None
+    ref = model_registry.get_by_slug(slug)
+    return session.get(Model, ref.id) if ref else None
 
 @app.get("/upload", dependencies=[Depends(require_admin_token)])
 async def upload_page(request: Request):
@@ -143,76 +140,43 @@ def models_page(request: Request):
             detail="Unauthorized",
         )
 
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
         models_list = session.query(Model).order_by(Model.name).all()
 
-        count_rows = (
-            session.query(Media.model_id, Media.media_type, func.count(Media.id))
-            .group_by(Media.model_id, Media.media_type)
-            .all()
-        )
-        image_counts: dict[int, int] = {}
-        video_counts: dict[int, int] = {}
-        for model_id, media_type, count in count_rows:
-            if media_type == "image":
-                image_counts[model_id] = int(count)
-            elif media_type == "video":
-                video_counts[model_id] = int(count)
-
-        last_upload_rows = (
-            session.query(Media.model_id, func.max(Media.created_at))
-            .group_by(Media.model_id)
-            .all()
-        )
-        last_upload_by_model: dict[int, object] = {
-            model_id: last_upload for model_id, last_upload in last_upload_rows
-        }
+        stats_by_model = model_stats_service.get_stats_by_model(session)
 
-        latest_subquery = (
-            session.query(
-                Media.model_id.label("model_id"),
-                func.max(Media.created_at).label("max_created_at"),
-            )
-            .group_by(Media.model_id)
-            .subquery()
-        )
-        latest_rows = (
-            session.query(Media)
-            .join(
-                latest_subquery,
-                (Media.model_id == latest_subquery.c.model_id)
-                & (Media.created_at == latest_subquery.c.max_created_at),
-            )
-            .order_by(desc(Media.created_at))
-            .all()
-        )
+        latest_rows = model_service.latest_media_per_model_query(session).all()
         preview_by_model: dict[int, Media] = {}
         for media_row in latest_rows:
             preview_by_model.setdefault(media_row.model_id, media_row)
 
         models_view = []
         for model in models_list:
-            slug = _slugify_model_name(model.name)
-            preview_file = None
+            stats = stats_by_model.get(model.id) or ModelStats.empty(model.id)
+            preview_url = None
             preview_type = None
             preview_media = preview_by_model.get(model.id)
             if preview_media:
-                slug_from_path, filename = _extract_slug_and_filename(preview_media.file_path)
-                if slug_from_path:
-                    slug = slug_from_path
-                preview_file = filename or None
-                preview_type = preview_media.media_type
+                previews = thumbnail_urls(preview_media)
+                preview_url = (
+                    previews.get("card")
+                    or previews.get("poster")
+                    or media_path_to_url(preview_media.file_path)
+                    or None
+                )
+                # A video with a poster frame is shown as a still image
+                preview_type = "image" if previews else preview_media.media_type
 
             models_view.append(
                 {
                     "name": model.name,
-                    "slug": slug,
-                    "image_count": image_counts.get(model.id, 0),
-                    "video_count": video_counts.get(model.id, 0),
-                    "preview_file": preview_file,
+                    "slug": model.slug,
+                    "image_count": stats.image_count,
+                    "video_count": stats.video_count,
+                    "preview_url": preview_url,
                     "preview_type": preview_type,
-                    "last_upload": last_upload_by_model.get(model.id),
+                    "last_upload": stats.last_upload_at,
                 }
             )
     finally:
@@ -227,7 +191,7 @@ def models_page(request: Request):
     )
 
 @app.get("/models/{slug}", dependencies=[Depends(require_admin_token)])
-def model_gallery_page(request: Request, slug: str, page: int = 1):
+def model_gallery_page(request: Request, slug: str, cursor: str | None = None):
     if not is_admin_request(request):
         raise HTTPException(
             status_code=status.HTTP_303_SEE_OTHER,
@@ -235,27 +199,24 @@ def model_gallery_page(request: Request, slug: str, page: int = 1):
             detail="Unauthorized",
         )
 
-    session = SessionLocal()
-    per_page = 48
-    page = max(1, page)
+    session = ReadSessionLocal()
 
     try:
         model = _get_model_by_slug(session, slug)
         if not model:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Model not found")
 
-        base_query = session.query(Media).filter(Media.model_id == model.id)
-        total = base_query.count()
-        rows = (
-            base_query
-            .order_by(desc(Media.created_at))
-            .offset((page - 1) * per_page)
-            .limit(per_page)
-            .all()
+        page = pagination_service.paginate(
+            model_service.model_gallery_query(session, model.id),
+            model_service.GALLERY_PAGE_COLUMNS,
+            key=lambda row: (row.created_at, row.id),
+            cursor=cursor,
         )
+        stats = model_stats_service.get_stats_for_model(session, model.id)
+        total = stats.total_count if stats else 0
 
         media_items = []
-        for media_row in rows:
+        for media_row in page["items"]:
             url = media_path_to_url(media_row.file_path)
             if not url:
                 continue
@@ -263,6 +224,7 @@ def model_gallery_page(request: Request, slug: str, page: int = 1):
                 {
                     "id": media_row.id,
                     "url": url,
+                    "thumbnails": thumbnail_urls(media_row),
                     "model_name": model.name,
                     "rating": media_row.rating,
                     "rating_caption": media_row.rating_caption,
@@ -295,9 +257,6 @@ def model_gallery_page(request: Request, slug: str, page: int = 1):
     finally:
         session.close()
 
-    has_prev = page > 1
-    has_next = page * per_page < total
-
     return templates.TemplateResponse(
         "gallery.html",
         {
@@ -305,9 +264,8 @@ def model_gallery_page(request: Request, slug: str, page: int = 1):
             "model_name": model.name,
             "media": media_items,
             "card": card,
-            "page": page,
-            "has_prev": has_prev,
-            "has_next": has_next,
+            "total": total,
+            **pagination_service.page_links(page),
         },
     )
 
@@ -327,15 +285,8 @@ def delete_model_by_slug(request: Request, slug: str):
         if not model:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Model not found")
 
-        deleted, media_records = model_service.delete_model_by_id(session, model.id)
-        if not deleted:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to delete model",
-            )
-
-        storage_service.delete_media_files(media_records)
-        storage_service.delete_model_directory(model.name)
+        # Rows and files are purged in the background after the grace period
+        trash_service.soft_delete_model(session, model.id)
     finally:
         session.close()
 
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from models.database import lock_metrics, sqlite_db_path
+from models.write_queue import write_queue
+from services import backup_service, job_service
+from web.auth import require_api_key
+from web.dependencies import get_db
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_api_key)])
+
+
+@router.get("/db-metrics")
+def get_db_metrics():
+    """
+    Write-lock waits on the SQLite engine and writer queue throughput.
+    """
+    return {
+        "locks": lock_metrics(),
+        "write_queue": write_queue.metrics(),
+    }
+
+
+@router.get("/backups")
+def get_backups():
+    """
+    Database snapshots in BACKUP_DIR, newest first.
+    """
+    return backup_service.list_backups()
+
+
+@router.post("/backups", status_code=status.HTTP_202_ACCEPTED)
+def start_backup(compress: bool | None = None, db: Session = Depends(get_db)):
+    """
+    Takes a snapshot in the job queue; poll /api/jobs/{job_id} for the result.
+    Retention (BACKUP_KEEP) is applied afterwards.
+    """
+    if sqlite_db_path() is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Backups are only supported for SQLite.")
+    job = job_service.enqueue(db, "backup", {"compress": compress}, dedupe_key="backup:manual", max_attempts=1)
+    job_service.notify_workers()
+    return {"job_id": job.id, "status": job.status}
@@ -1,73 +1,18 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
-import random
 
-from models.database import SessionLocal
+from models.database import ReadSessionLocal
 from models.model_entity import Model
-from models.media_entity import Media
+from services import model_stats_service, playlist_service
 from web.auth import is_admin_request
 
 router = APIRouter()
 templates = Jinja2Templates(directory="web/templates")
 
 
-def media_path_to_url(file_path: str) -> str:
-    if not file_path:
-        return ""
-
-    path = file_path.replace("\\", "/")
-
-    if "/media/" in path:
-        return path[path.index("/media/") :]
-
-    if path.startswith("media/"):
-        return "/" + path
-
-    return ""
-
-
-def _collect_slideshow_media(session, media_types: list[str]) -> list[dict]:
-    rows = (
-        session.query(Media, Model)
-        .join(Model, Media.model_id == Model.id)
-        .filter(Media.media_type.in_(media_types))
-        .all()
-    )
-
-    by_model: dict[str, list[dict]] = {}
-
-    for media, model in rows:
-        if not media.file_path:
-            continue
-
-        url = media_path_to_url(media.file_path)
-        if not url:
-            continue
-
-        by_model.setdefault(model.name, []).append(
-            {
-                "id": media.id,
-                "url": url,
-                "model_name": model.name,
-                "rating": media.rating,
-                "rating_caption": media.rating_caption,
-                "media_type": media.media_type,
-            }
-        )
-
-    selection: list[dict] = []
-
-    for model_name, items in by_model.items():
-        selection.append(random.choice(items))
-
-    for items in by_model.values():
-        for item in items:
-            if item not in selection:
-                selection.append(item)
-
-    random.shuffle(selection)
-    return selection
+# Slides rendered into the dashboard carousel; /slideshow pages through the rest
+DASHBOARD_SLIDES = 60
 
 
 @router.get("/")
@@ -75,13 +20,19 @@ def dashboard(request: Request):
     if not is_admin_request(request):
         return RedirectResponse(url="/login", status_code=303)
 
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
         model_count = session.query(Model).count()
-        media_count = session.query(Media).count()
-
-        # JOIN media -> model
-        slideshow_images = _collect_slideshow_media(session, ["image"])
+        media_count = model_stats_service.get_media_totals(session)["total"]
+
+        page = playlist_service.get_playlist_page(
+            session,
+            playlist_service.new_seed(),
+            limit=DASHBOARD_SLIDES,
+            media_types=("image",),
+            cache=False,
+        )
+        slideshow_images = page["items"]
 
     finally:
         session.close()
@@ -102,10 +53,9 @@ def slideshow(request: Request):
     if not is_admin_request(request):
         return RedirectResponse(url="/login", status_code=303)
 
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
         models = [model.name for model in session.query(Model).order_by(Model.name).all()]
-        slideshow_media = _collect_slideshow_media(session, ["image", "video"])
     finally:
         session.close()
 
@@ -114,7 +64,7 @@ def slideshow(request: Request):
         {
             "request": request,
             "models": models,
-            "slideshow_media": slideshow_media,
+            "seed": playlist_service.new_seed(),
             "hide_nav": True,
         },
     )
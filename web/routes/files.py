@@ -0,0 +1,207 @@
+import mimetypes
+import os
+import re
+from pathlib import Path
+
+import aiofiles
+from fastapi import APIRouter, HTTPException, Request, status
+from starlette.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+
+import config
+
+router = APIRouter(tags=["files"])
+
+MEDIA_DIR = config.BASE_DIR / "media"
+# URL prefixes under /media that map to their own configured roots
+MEDIA_ROOTS = {
+    "models": Path(config.MEDIA_ROOT),
+    "store": Path(config.MEDIA_STORE_ROOT),
+    "thumbs": Path(config.THUMBNAIL_ROOT),
+}
+CONTENT_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Thumbnails keep their URL when regenerated (new widths or format), so
+# they are only cached for a day and then revalidated by ETag
+THUMBNAIL_CACHE_CONTROL = "public, max-age=86400"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+
+def _resolve_media_file(file_path: str) -> tuple[Path, bool]:
+    """
+    Maps a /media URL path to a file on disk.
+    Returns (path, content_addressed); raises 404 for anything outside the
+    media roots, hidden files (staging uploads) and directories.
+    """
+    parts = [part for part in file_path.split("/") if part]
+    if not parts or any(part.startswith(".") for part in parts):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+    if parts[0] in MEDIA_ROOTS:
+        root = MEDIA_ROOTS[parts[0]]
+        relative = parts[1:]
+    else:
+        root = MEDIA_DIR
+        relative = parts
+
+    if parts[0] == "store" and len(relative) == 1 and CONTENT_HASH_PATTERN.match(Path(relative[0]).stem):
+        # Flat store URLs from before the sharded layout
+        name = relative[0]
+        sharded = [name[:2], name[2:4], name]
+        if root.joinpath(*sharded).is_file():
+            relative = sharded
+
+    root = root.resolve()
+    path = root.joinpath(*relative).resolve()
+    if root not in path.parents or not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+    content_addressed = parts[0] == "store" and bool(CONTENT_HASH_PATTERN.match(path.stem))
+    return path, content_addressed
+
+
+def _etag_for(path: Path, content_addressed: bool, stat_result: os.stat_result) -> str:
+    if content_addressed:
+        return f'"{path.stem}"'
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or any(value.removeprefix("W/") == etag for value in candidates)
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parses a single "bytes=" range into inclusive (start, end).
+    Returns None for ranges this server answers with the full file
+    (malformed or multi-range); raises ValueError when unsatisfiable.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+class MediaFileResponse(Response):
+    """
+    Sends one byte range of a file in chunks. Whole files go through
+    FileResponse instead.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        offset: int,
+        count: int,
+        status_code: int,
+        headers: dict[str, str],
+        send_body: bool = True,
+    ):
+        super().__init__(status_code=status_code, headers=headers)
+        self.path = path
+        self.offset = offset
+        self.count = count
+        self.send_body = send_body
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if not self.send_body or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        remaining = self.count
+        async with aiofiles.open(self.path, "rb") as in_file:
+            await in_file.seek(self.offset)
+            while remaining > 0:
+                chunk = await in_file.read(min(config.UPLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    }
+                )
+        if remaining > 0:
+            # File shrank while sending; end the response rather than hang
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+@router.api_route("/media/{file_path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+def serve_media(file_path: str, request: Request):
+    path, content_addressed = _resolve_media_file(file_path)
+    stat_result = path.stat()
+    size = stat_result.st_size
+    etag = _etag_for(path, content_addressed, stat_result)
+
+    if content_addressed:
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    elif file_path.lstrip("/").startswith("thumbs/"):
+        cache_control = THUMBNAIL_CACHE_CONTROL
+    else:
+        cache_control = REVALIDATE_CACHE_CONTROL
+    headers = {
+        "etag": etag,
+        "cache-control": cache_control,
+        "accept-ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    send_body = request.method != "HEAD"
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            headers["content-range"] = f"bytes */{size}"
+            return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers=headers)
+
+        if byte_range is not None:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            headers["content-length"] = str(end - start + 1)
+            headers["content-type"] = media_type
+            return MediaFileResponse(
+                path,
+                start,
+                end - start + 1,
+                status.HTTP_206_PARTIAL_CONTENT,
+                headers,
+                send_body,
+            )
+
+    # Hands the path to the server when it supports the ASGI pathsend
+    # extension; otherwise (uvicorn included) the file is streamed in chunks
+    return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat_result, method=request.method)
@@ -1,30 +1,20 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy import func, desc
+from sqlalchemy import desc
 
-from models.database import SessionLocal
+from models.database import ReadSessionLocal
 from models.media_entity import Media
 from models.model_entity import Model
+from models.model_stats_entity import ModelStats
+from services import model_service, model_stats_service, pagination_service
+from services.storage_service import media_path_to_url
+from services.thumbnail_service import VIDEO_SPRITE_FRAMES, thumbnail_urls
 from web.auth import is_admin_request
 
 router = APIRouter()
 templates = Jinja2Templates(directory="web/templates")
-
-
-def media_path_to_url(file_path: str) -> str:
-    if not file_path:
-        return ""
-
-    path = file_path.replace("\\", "/")
-
-    if "/media/" in path:
-        return path[path.index("/media/") :]
-
-    if path.startswith("media/"):
-        return "/" + path
-
-    return ""
+templates.env.globals["video_sprite_frames"] = VIDEO_SPRITE_FRAMES
 
 
 def build_media_rows(rows):
@@ -39,6 +29,7 @@ def build_media_rows(rows):
             {
                 "id": media.id,
                 "url": url,
+                "thumbnails": thumbnail_urls(media),
                 "model_name": model.name,
                 "rating": media.rating,
                 "rating_caption": media.rating_caption,
@@ -58,7 +49,7 @@ def ratings_review(request: Request):
     if not is_admin_request(request):
         return RedirectResponse(url="/login", status_code=303)
 
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
         rows = (
             session.query(Media, Model)
@@ -83,85 +74,59 @@ def ratings_review(request: Request):
 
 
 @router.get("/top")
-def top_picks(request: Request, page: int = 1):
+def top_picks(request: Request, cursor: str | None = None):
     if not is_admin_request(request):
         return RedirectResponse(url="/login", status_code=303)
 
-    session = SessionLocal()
-    per_page = 48
-    page = max(1, page)
-
+    session = ReadSessionLocal()
     try:
-        base_query = (
-            session.query(Media, Model)
-            .join(Model, Media.model_id == Model.id)
-            .filter(Media.media_type == "image")
-            .filter(Media.rating.is_not(None))
+        page = pagination_service.paginate(
+            model_service.top_rated_query(session),
+            model_service.TOP_PAGE_COLUMNS,
+            key=lambda row: (row[0].rating, row[0].created_at, row[0].id),
+            cursor=cursor,
         )
-        total = base_query.count()
-        rows = (
-            base_query
-            .order_by(desc(Media.rating), desc(Media.created_at))
-            .offset((page - 1) * per_page)
-            .limit(per_page)
-            .all()
-        )
-        items = build_media_rows(rows)
+        items = build_media_rows(page["items"])
+        total = model_stats_service.get_media_totals(session)["rated_images"]
     finally:
         session.close()
 
-    has_prev = page > 1
-    has_next = page * per_page < total
-
     return templates.TemplateResponse(
         "top.html",
         {
             "request": request,
             "media": items,
-            "page": page,
-            "has_prev": has_prev,
-            "has_next": has_next,
+            "total": total,
+            **pagination_service.page_links(page),
         },
     )
 
 
 @router.get("/recent")
-def recent_media(request: Request, page: int = 1):
+def recent_media(request: Request, cursor: str | None = None):
     if not is_admin_request(request):
         return RedirectResponse(url="/login", status_code=303)
 
-    session = SessionLocal()
-    per_page = 48
-    page = max(1, page)
-
+    session = ReadSessionLocal()
     try:
-        base_query = (
-            session.query(Media, Model)
-            .join(Model, Media.model_id == Model.id)
+        page = pagination_service.paginate(
+            model_service.recent_media_query(session),
+            model_service.RECENT_PAGE_COLUMNS,
+            key=lambda row: (row[0].created_at, row[0].id),
+            cursor=cursor,
         )
-        total = base_query.count()
-        rows = (
-            base_query
-            .order_by(desc(Media.created_at))
-            .offset((page - 1) * per_page)
-            .limit(per_page)
-            .all()
-        )
-        items = build_media_rows(rows)
+        items = build_media_rows(page["items"])
+        total = model_stats_service.get_media_totals(session)["total"]
     finally:
         session.close()
 
-    has_prev = page > 1
-    has_next = page * per_page < total
-
     return templates.TemplateResponse(
         "recent.html",
         {
             "request": request,
             "media": items,
-            "page": page,
-            "has_prev": has_prev,
-            "has_next": has_next,
+            "total": total,
+            **pagination_service.page_links(page),
         },
     )
 
@@ -171,87 +136,30 @@ def model_insights(request: Request):
     if not is_admin_request(request):
         return RedirectResponse(url="/login", status_code=303)
 
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
-        models = session.query(Model).order_by(Model.name).all()
+        rows = (
+            session.query(Model, ModelStats)
+            .outerjoin(ModelStats, ModelStats.model_id == Model.id)
+            .order_by(Model.name)
+            .all()
+        )
         insights = []
-        for model in models:
-            total_media = (
-                session.query(func.count(Media.id))
-                .filter(Media.model_id == model.id)
-                .scalar()
-                or 0
-            )
-            image_count = (
-                session.query(func.count(Media.id))
-                .filter(Media.model_id == model.id)
-                .filter(Media.media_type == "image")
-                .scalar()
-                or 0
-            )
-            video_count = (
-                session.query(func.count(Media.id))
-                .filter(Media.model_id == model.id)
-                .filter(Media.media_type == "video")
-                .scalar()
-                or 0
-            )
-            rated_images = (
-                session.query(func.count(Media.id))
-                .filter(Media.model_id == model.id)
-                .filter(Media.media_type == "image")
-                .filter(Media.rating.is_not(None))
-                .scalar()
-                or 0
-            )
-            avg_rating = (
-                session.query(func.avg(Media.rating))
-                .filter(Media.model_id == model.id)
-                .filter(Media.rating.is_not(None))
-                .scalar()
-            )
-            last_upload = (
-                session.query(func.max(Media.created_at))
-                .filter(Media.model_id == model.id)
-                .scalar()
-            )
-            rating_90 = (
-                session.query(func.count(Media.id))
-                .filter(Media.model_id == model.id)
-                .filter(Media.rating >= 90)
-                .scalar()
-                or 0
-            )
-            rating_80 = (
-                session.query(func.count(Media.id))
-                .filter(Media.model_id == model.id)
-                .filter(Media.rating >= 80)
-                .filter(Media.rating < 90)
-                .scalar()
-                or 0
-            )
-            rating_low = (
-                session.query(func.count(Media.id))
-                .filter(Media.model_id == model.id)
-                .filter(Media.rating < 80)
-                .scalar()
-                or 0
-            )
-            unrated = image_count - rated_images
-
+        for model, stats in rows:
+            stats = stats or ModelStats.empty(model.id)
             insights.append(
                 {
                     "name": model.name,
-                    "total_media": total_media,
-                    "image_count": image_count,
-                    "video_count": video_count,
-                    "rated_images": rated_images,
-                    "unrated_images": max(unrated, 0),
-                    "avg_rating": avg_rating,
-                    "last_upload": last_upload,
-                    "rating_90": rating_90,
-                    "rating_80": rating_80,
-                    "rating_low": rating_low,
+                    "total_media": stats.total_count,
+                    "image_count": stats.image_count,
+                    "video_count": stats.video_count,
+                    "rated_images": stats.rated_images,
+                    "unrated_images": stats.unrated_count,
+                    "avg_rating": stats.avg_rating,
+                    "last_upload": stats.last_upload_at,
+                    "rating_90": stats.rating_90_count,
+                    "rating_80": stats.rating_80_count,
+                    "rating_low": stats.rating_low_count,
                 }
             )
     finally:
@@ -271,7 +179,7 @@ def collections(request: Request):
     if not is_admin_request(request):
         return RedirectResponse(url="/login", status_code=303)
 
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
         models = [model.name for model in session.query(Model).order_by(Model.name).all()]
     finally:
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from web.schemas import JobResponse
+from web.dependencies import get_db, get_read_db
+from services import job_service
+
+from web.auth import require_api_key
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"], dependencies=[Depends(require_api_key)])
+
+
+@router.get("/", response_model=List[JobResponse])
+def list_jobs_endpoint(
+    media_id: Optional[int] = None,
+    job_status: Optional[str] = Query(None, alias="status"),
+    ids: Optional[str] = None,
+    limit: int = 100,
+    db: Session = Depends(get_read_db),
+):
+    try:
+        job_ids = [int(value) for value in ids.split(",") if value.strip()] if ids else None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must be comma-separated integers")
+
+    return job_service.list_jobs(
+        db,
+        media_id=media_id,
+        status=job_status,
+        job_ids=job_ids,
+        limit=max(1, min(limit, 500)),
+    )
+
+@router.get("/{job_id}", response_model=JobResponse)
+def get_job_endpoint(job_id: int, db: Session = Depends(get_read_db)):
+    job = job_service.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
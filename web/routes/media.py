@@ -1,76 +1,152 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File, Form
+from starlette.requests import ClientDisconnect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional
+import asyncio
+import logging
 import os
-import subprocess
-import tempfile
 
-from web.schemas import MediaResponse, ModelCreate
-from web.dependencies import get_db
-from services import model_service, storage_service
-from models.model_entity import Model
+import config
+from web.schemas import MediaResponse, ModelCreate, NearDuplicateMatch, RotationPick, UploadSessionCreate, UploadSessionResponse
+from web.dependencies import get_async_db, get_db, get_read_db
+from services import duplicate_service, job_service, model_service, playlist_service, random_service, reconcile_service, storage_service, trash_service, upload_session_service, video_service
+from services.model_registry import model_registry
 
 from web.auth import require_api_key # Import the new API key dependency
 
 router = APIRouter(prefix="/api/media", tags=["media"], dependencies=[Depends(require_api_key)])
 MAX_VIDEO_DURATION_SECONDS = 120
+logger = logging.getLogger(__name__)
 
+async def _probe_video_metadata(file_path: str) -> dict:
+    try:
+        return await video_service.probe_video(file_path)
+    except RuntimeError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Video validation unavailable (ffprobe not installed).",
+        ) from exc
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Could not read video metadata for one of the files.",
+        ) from exc
 
-def media_path_to_url(file_path: str) -> str:
-    if not file_path:
-        return ""
+async def _check_near_duplicates(staged: dict) -> list[int]:
+    if config.NEAR_DUPLICATE_POLICY == "off":
+        # Hashing is left to the background job queue
+        return []
 
-    path = file_path.replace("\\\\", "/")
+    try:
+        value = await asyncio.to_thread(duplicate_service.compute_dhash, staged["temp_path"])
+    except Exception as exc:
+        logger.warning("Failed to hash image: %s (%s)", staged["filename"], exc)
+        return []
+    staged["perceptual_hash"] = duplicate_service.format_hash(value)
 
-    if "/media/" in path:
-        return path[path.index("/media/") :]
+    matches = await asyncio.to_thread(duplicate_service.find_similar, staged["perceptual_hash"])
+    duplicate_ids = [match["media_id"] for match in matches]
+    if duplicate_ids and config.NEAR_DUPLICATE_POLICY == "reject":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"{staged['filename']} is a near-duplicate of media {', '.join(map(str, duplicate_ids[:5]))}.",
+        )
+    return duplicate_ids
 
-    if path.startswith("media/"):
-        return "/" + path
+def _enqueue_post_upload_jobs(db: Session, media_record) -> list[int]:
+    if media_record.media_type == "video":
+        # Poster frame and scrub sprite
+        kinds = ["thumbnails"]
+    else:
+        kinds = ["thumbnails", "rating"]
+        if not media_record.perceptual_hash:
+            kinds.append("perceptual_hash")
 
-    return ""
+    job_ids = []
+    for kind in kinds:
+        job = job_service.enqueue(
+            db,
+            kind,
+            {"media_id": media_record.id},
+            dedupe_key=f"{kind}:{media_record.id}",
+            media_id=media_record.id,
+            commit=False,
+        )
+        job_ids.append(job.id)
+    return job_ids
 
-def _get_video_duration_seconds(file_bytes: bytes, suffix: str) -> float:
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=True) as temp_file:
-        temp_file.write(file_bytes)
-        temp_file.flush()
-        try:
-            result = subprocess.run(
-                [
-                    "ffprobe",
-                    "-v",
-                    "error",
-                    "-show_entries",
-                    "format=duration",
-                    "-of",
-                    "default=noprint_wrappers=1:nokey=1",
-                    temp_file.name,
-                ],
-                check=True,
-                capture_output=True,
-                text=True,
-            )
-        except FileNotFoundError as exc:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Video validation unavailable (ffprobe not installed).",
-            ) from exc
-        except subprocess.CalledProcessError as exc:
+def _media_type_for_filename(filename: str | None) -> str:
+    if not filename:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No filename provided for one of the files.")
+
+    file_extension = os.path.splitext(filename)[1].lower()
+    if file_extension in [".jpg", ".jpeg", ".png", ".gif", ".webp"]:
+        return "image"
+    if file_extension in [".mp4", ".mov", ".webm"]:
+        return "video"
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported file type: {filename}")
+
+async def _validate_staged_media(staged: dict) -> None:
+    if staged["media_type"] == "video":
+        metadata = await _probe_video_metadata(staged["temp_path"])
+        if metadata["duration"] > MAX_VIDEO_DURATION_SECONDS:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Could not read video metadata for one of the files.",
-            ) from exc
+                detail="Video exceeds 2 minute limit."
+            )
+    else:
+        staged["near_duplicate_of"] = await _check_near_duplicates(staged)
+
+def _enqueue_upload_jobs(db: Session, model_id: int, media_records: list) -> None:
+    # Thumbnails, ratings, hashing and scoring run in the background job queue
+    for media_record in media_records:
+        media_record.job_ids = _enqueue_post_upload_jobs(db, media_record)
+    if os.getenv("CARD_SCORE_SOURCE", "avn").lower() == "ml":
+        job_service.enqueue(
+            db,
+            "ml_score",
+            {"model_id": model_id},
+            dedupe_key=f"ml_score:{model_id}",
+            commit=False,
+        )
 
+async def _ingest_staged_media(
+    db: AsyncSession,
+    model_id: int,
+    staged_files: list[dict],
+) -> List[MediaResponse]:
+    """
+    Validates staged files, then moves them into the store and inserts all
+    rows and follow-up jobs in one transaction. Nothing is kept on failure.
+    """
     try:
-        return float(result.stdout.strip())
-    except ValueError as exc:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid video metadata for one of the files.",
-        ) from exc
+        for staged in staged_files:
+            await _validate_staged_media(staged)
+
+        media_records = await storage_service.finalize_staged_batch(db, staged_files)
+        await db.run_sync(_enqueue_upload_jobs, model_id, media_records)
+        for media_record, staged in zip(media_records, staged_files):
+            media_record.near_duplicate_of = staged.get("near_duplicate_of", [])
+        await storage_service.commit_staged_batch(db, staged_files)
+    except (HTTPException, asyncio.CancelledError):
+        # A cancelled request must still hand back its blob locks
+        await storage_service.abort_staged_batch(db, staged_files)
+        raise
+    except Exception as e:
+        await storage_service.abort_staged_batch(db, staged_files)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to upload media: {e}")
+
+    job_service.notify_workers()
+    for media_record in media_records:
+        if media_record.perceptual_hash:
+            duplicate_service.add_to_index(media_record.id, media_record.perceptual_hash)
+
+    return media_records
 
 async def _upload_files_for_model(
-    db: Session,
+    db: AsyncSession,
     model_id: int,
     files: List[UploadFile],
 ) -> List[MediaResponse]:
@@ -80,89 +156,263 @@ async def _upload_files_for_model(
             detail="Bulk upload supports 1 to 50 files at a time."
         )
 
-    model = model_service.get_model_by_id_with_session(db, model_id)
+    model = await model_service.get_model_by_id_async(db, model_id)
     if not model:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Model not found")
 
-    uploaded_media_records = []
-    for file in files:
-        if not file.filename:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No filename provided for one of the files.")
-
-        file_extension = os.path.splitext(file.filename)[1].lower()
-        if file_extension in [".jpg", ".jpeg", ".png", ".gif", ".webp"]:
-            media_type = "image"
-        elif file_extension in [".mp4", ".mov", ".webm"]:
-            media_type = "video"
-        else:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported file type: {file.filename}")
-        
-        file_content = await file.read()
-        if media_type == "video":
-            duration = _get_video_duration_seconds(file_content, file_extension)
-            if duration > MAX_VIDEO_DURATION_SECONDS:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Video exceeds 2 minute limit."
-                )
-        
+    media_types = [_media_type_for_filename(file.filename) for file in files]
+
+    staged_files = []
+    for file, media_type in zip(files, media_types):
         try:
-            media_record = await storage_service.save_uploaded_media(db, model_id, file_content, file.filename, media_type)
-            uploaded_media_records.append(media_record)
-        except ValueError as e:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            staged_files.append(await storage_service.stage_uploaded_media(db, model_id, file, media_type))
         except Exception as e:
+            await storage_service.abort_staged_batch(db, staged_files)
+            if isinstance(e, ValueError):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to upload media {file.filename}: {e}")
 
-    return uploaded_media_records
+    return await _ingest_staged_media(db, model_id, staged_files)
+
+def _upload_model_name(model_name: Optional[str]) -> str:
+    name = (model_name or "").strip()
+    if not name:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide a model ID or a model name."
+        )
+    return name
+
+def _resolve_upload_model_id(db: Session, model_id: Optional[int], model_name: Optional[str]) -> int:
+    if model_id is not None:
+        return model_id
+
+    name = _upload_model_name(model_name)
+    existing_model = model_service.get_model_by_name_with_session(db, name)
+    if existing_model:
+        return existing_model.id
+
+    try:
+        return model_service.create_model(db, ModelCreate(name=name)).id
+    except IntegrityError:
+        # A concurrent upload created it first
+        db.rollback()
+        existing_model = model_service.get_model_by_name_with_session(db, name)
+        if not existing_model:
+            raise
+        return existing_model.id
+
+async def _resolve_upload_model_id_async(db: AsyncSession, model_id: Optional[int], model_name: Optional[str]) -> int:
+    if model_id is not None:
+        return model_id
+
+    name = _upload_model_name(model_name)
+    existing_model = await model_service.get_model_by_name_async(db, name)
+    if existing_model:
+        return existing_model.id
+
+    try:
+        return (await model_service.create_model_async(db, ModelCreate(name=name))).id
+    except IntegrityError:
+        await db.rollback()
+        existing_model = await model_service.get_model_by_name_async(db, name)
+        if not existing_model:
+            raise
+        return existing_model.id
 
 @router.post("/upload", response_model=List[MediaResponse], status_code=status.HTTP_201_CREATED)
 async def upload_media(
     files: List[UploadFile] = File(...),
     model_id: Optional[int] = Form(None),
     model_name: Optional[str] = Form(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    resolved_model_id = model_id
-    if resolved_model_id is None:
-        name = (model_name or "").strip()
-        if not name:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Provide a model ID or a model name."
-            )
-
-        normalized_name = model_service._normalize_model_query(name)
-        existing_model = (
-            db.query(Model)
-            .filter(Model.normalized_name == normalized_name)
-            .first()
-        )
-        if existing_model:
-            resolved_model_id = existing_model.id
-        else:
-            created_model = model_service.create_model(db, ModelCreate(name=name))
-            resolved_model_id = created_model.id
-
+    resolved_model_id = await _resolve_upload_model_id_async(db, model_id, model_name)
     return await _upload_files_for_model(db, resolved_model_id, files)
 
 @router.post("/upload/{model_id}", response_model=List[MediaResponse], status_code=status.HTTP_201_CREATED)
 async def upload_media_for_model(
     model_id: int,
     files: List[UploadFile] = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     return await _upload_files_for_model(db, model_id, files)
 
+# --- Resumable uploads ---
+# POST /uploads creates a session, PUT /uploads/{id}?offset=N appends the
+# request body, GET /uploads/{id} reports the offset to resume from and
+# POST /uploads/{id}/complete runs the regular upload checks.
+
+def _session_response(session) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        id=session.id,
+        model_id=session.model_id,
+        filename=session.filename,
+        media_type=session.media_type,
+        size=session.total_size,
+        offset=session.received,
+        created_at=session.created_at,
+        updated_at=session.updated_at,
+    )
+
+def _get_upload_session_or_404(db: Session, session_id: str):
+    session = upload_session_service.get_session(db, session_id)
+    if not session:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+    return session
+
+async def _get_upload_session_or_404_async(db: AsyncSession, session_id: str):
+    session = await upload_session_service.get_session_async(db, session_id)
+    if not session:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+    return session
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+def create_upload_session(payload: UploadSessionCreate, db: Session = Depends(get_db)):
+    media_type = _media_type_for_filename(payload.filename)
+    model_id = _resolve_upload_model_id(db, payload.model_id, payload.model_name)
+    if not model_service.get_model_by_id_with_session(db, model_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Model not found")
+
+    try:
+        session = upload_session_service.create_session(db, model_id, payload.filename, media_type, payload.size)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return _session_response(session)
+
+@router.get("/uploads/{session_id}", response_model=UploadSessionResponse)
+def get_upload_session(session_id: str, db: Session = Depends(get_read_db)):
+    return _session_response(_get_upload_session_or_404(db, session_id))
+
+@router.put("/uploads/{session_id}", response_model=UploadSessionResponse)
+async def upload_session_chunk(
+    session_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    db: AsyncSession = Depends(get_async_db),
+):
+    session = await _get_upload_session_or_404_async(db, session_id)
+    try:
+        session = await upload_session_service.append_chunk(db, session, offset, request.stream())
+    except upload_session_service.OffsetMismatchError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Offset mismatch. {e}")
+    except upload_session_service.SessionBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except ClientDisconnect:
+        # Received bytes are already recorded; the client resumes from GET
+        logger.info("Client disconnected during upload %s at offset %s", session_id, session.received)
+        return Response(status_code=status.HTTP_400_BAD_REQUEST)
+    return _session_response(session)
+
+@router.post("/uploads/{session_id}/complete", response_model=List[MediaResponse], status_code=status.HTTP_201_CREATED)
+async def complete_upload_session(session_id: str, db: AsyncSession = Depends(get_async_db)):
+    session = await _get_upload_session_or_404_async(db, session_id)
+    try:
+        staged = await upload_session_service.stage_session(db, session)
+    except upload_session_service.OffsetMismatchError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload incomplete: received {session.received} of {session.total_size} bytes.",
+        )
+    except ValueError as e:
+        await upload_session_service.delete_session_async(db, session)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # The session row goes away in the same commit as the media rows
+    await db.delete(session)
+    try:
+        return await _ingest_staged_media(db, session.model_id, [staged])
+    except HTTPException:
+        # The staged file is gone; drop the session so it is not resumed
+        leftover = await upload_session_service.get_session_async(db, session_id)
+        if leftover:
+            await upload_session_service.delete_session_async(db, leftover)
+        raise
+
+@router.delete("/uploads/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+def cancel_upload_session(session_id: str, db: Session = Depends(get_db)):
+    upload_session_service.delete_session(db, _get_upload_session_or_404(db, session_id))
+
+@router.get("/reconcile")
+def get_reconcile_report():
+    state = reconcile_service.load_state()
+    if not state:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No reconciliation has run yet")
+    return state
+
+@router.post("/reconcile", status_code=status.HTTP_202_ACCEPTED)
+def start_reconcile(repair: bool = False, restart: bool = False, db: Session = Depends(get_db)):
+    """
+    Starts or resumes a disk/database reconciliation in the job queue.
+    """
+    state = reconcile_service.start_reconciliation(repair=repair, restart=restart)
+    job = job_service.enqueue(db, "reconcile", {}, dedupe_key="reconcile")
+    job_service.notify_workers()
+    return {"job_id": job.id, "status": state["status"], "repair": state["repair"], "started_at": state["started_at"]}
+
+@router.post("/draw", response_model=List[RotationPick])
+def draw_media(count: int = Query(1, ge=1, le=random_service.MAX_DRAW), model_name: Optional[str] = None):
+    """
+    Returns the next `count` picks from the fair rotation and marks them sent.
+    """
+    picks = random_service.draw_media(count, model_name)
+    return [{**pick, "url": storage_service.media_path_to_url(pick["file_path"])} for pick in picks]
+
+@router.get("/slideshow")
+def get_slideshow_page(
+    seed: Optional[int] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(48, ge=1, le=playlist_service.MAX_PAGE_SIZE),
+    media_type: Optional[Literal["image", "video"]] = None,
+    rating: Optional[Literal["rated", "unrated"]] = None,
+    model_name: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    """
+    Returns one page of a shuffled slideshow playlist. Pass back the
+    returned `seed` and `next_offset` to continue the same order.
+    """
+    if seed is None:
+        seed = playlist_service.new_seed()
+    model_id = None
+    if model_name:
+        model = model_registry.get_by_name(model_name)
+        if not model:
+            return {"seed": seed, "offset": 0, "next_offset": None, "total": 0, "items": []}
+        model_id = model.id
+
+    return playlist_service.get_playlist_page(
+        db,
+        seed,
+        offset=offset,
+        limit=limit,
+        media_types=(media_type,) if media_type else ("image", "video"),
+        model_id=model_id,
+        rated={"rated": True, "unrated": False}.get(rating),
+    )
+
+@router.get("/duplicates", response_model=List[List[int]])
+def get_duplicate_report(max_distance: Optional[int] = None):
+    return duplicate_service.duplicate_report(max_distance)
+
+@router.get("/{media_id}/duplicates", response_model=List[NearDuplicateMatch])
+def get_near_duplicates(media_id: int, max_distance: Optional[int] = None):
+    matches = duplicate_service.find_near_duplicates(media_id, max_distance)
+    if matches is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media not found")
+    return matches
+
 @router.get("/{media_id}", response_model=MediaResponse)
-def get_media_item_by_id(media_id: int, db: Session = Depends(get_db)):
+def get_media_item_by_id(media_id: int, db: Session = Depends(get_read_db)):
     media_item = model_service.get_media_by_id_with_session(db, media_id)
     if not media_item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media not found")
     return media_item
 
 @router.get("/model/{model_id}", response_model=List[MediaResponse])
-def get_all_media_for_model_endpoint(model_id: int, db: Session = Depends(get_db)):
+def get_all_media_for_model_endpoint(model_id: int, db: Session = Depends(get_read_db)):
     model = model_service.get_model_by_id_with_session(db, model_id)
     if not model:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Model not found")
@@ -172,16 +422,17 @@ def get_all_media_for_model_endpoint(model_id: int, db: Session = Depends(get_db
 
 @router.delete("/{media_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_media_item(media_id: int, db: Session = Depends(get_db)):
-    media_item = model_service.get_media_by_id_with_session(db, media_id)
-    if not media_item:
+    """
+    Hides the media right away; the purge job removes the row and file
+    after DELETE_GRACE_SECONDS unless it is restored first.
+    """
+    deleted_at = trash_service.soft_delete_media(db, media_id)
+    if not deleted_at:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media not found")
-    
-    # Delete file from storage
-    storage_service.delete_media_files([media_item]) # Pass as list as expected by function
-    
-    # Delete record from database
-    deleted = model_service.delete_media_by_id(db, media_id)
-    if not deleted:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to delete media record")
-    
-    return {"message": "Media deleted successfully"}
+
+@router.post("/{media_id}/restore", response_model=MediaResponse)
+def restore_media_item(media_id: int, db: Session = Depends(get_db)):
+    media_item = trash_service.restore_media(db, media_id)
+    if not media_item:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No deleted media with this ID, or its model is deleted")
+    return media_item
@@ -1,10 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any
 
-from web.schemas import ModelResponse, ModelCreate, ModelUpdate
-from web.dependencies import get_db
-from services import model_service, storage_service
+from web.schemas import ModelResponse, ModelCreate, ModelSearchResult, ModelUpdate
+from web.dependencies import get_db, get_read_db
+from services import model_service, trash_service
 from models.model_entity import Model # Only needed for type hints
 
 from web.auth import require_api_key # Import the new API key dependency
@@ -24,12 +24,17 @@ def create_model_endpoint(model_create: ModelCreate, db: Session = Depends(get_d
     return created_model
 
 @router.get("/", response_model=List[ModelResponse])
-def get_all_models_endpoint(db: Session = Depends(get_db)):
+def get_all_models_endpoint(db: Session = Depends(get_read_db)):
     models = model_service.get_all_models(db)
     return models
 
+# Declared before /{model_id} so "search" is not parsed as an id
+@router.get("/search", response_model=List[ModelSearchResult])
+def search_models_endpoint(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(10, ge=1, le=50)):
+    return model_service.search_models(q, limit=limit)
+
 @router.get("/{model_id}", response_model=ModelResponse)
-def get_model_endpoint(model_id: int, db: Session = Depends(get_db)):
+def get_model_endpoint(model_id: int, db: Session = Depends(get_read_db)):
     model = model_service.get_model_by_id_with_session(db, model_id)
     if not model:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Model not found")
@@ -44,18 +49,18 @@ def update_model_endpoint(model_id: int, model_update: ModelUpdate, db: Session
 
 @router.delete("/{model_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_model_endpoint(model_id: int, db: Session = Depends(get_db)):
-    model_to_delete = model_service.get_model_by_id_with_session(db, model_id)
-    if not model_to_delete:
+    """
+    Hides the model and its media right away. Files are removed by the
+    purge job once DELETE_GRACE_SECONDS have passed; until then
+    POST /{model_id}/restore brings everything back.
+    """
+    deleted_at = trash_service.soft_delete_model(db, model_id)
+    if not deleted_at:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Model not found")
-    
-    model_name = model_to_delete.name
-
-    deleted, media_records = model_service.delete_model_by_id(db, model_id)
-
-    if not deleted:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to delete model")
 
-    storage_service.delete_media_files(media_records)
-    storage_service.delete_model_directory(model_name)
-    
-    return {"message": "Model and associated media deleted successfully"}
\ No newline at end of file
+@router.post("/{model_id}/restore", response_model=ModelResponse)
+def restore_model_endpoint(model_id: int, db: Session = Depends(get_db)):
+    model = trash_service.restore_model(db, model_id)
+    if not model:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No deleted model with this ID")
+    return model
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import Literal, Optional
+
+from models.database import IS_SQLITE
+from web.schemas import SearchPage
+from services import search_service
+
+from web.auth import require_api_key
+
+router = APIRouter(prefix="/api/search", tags=["search"], dependencies=[Depends(require_api_key)])
+
+
+@router.get("", response_model=SearchPage)
+def search_endpoint(
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(24, ge=1, le=search_service.MAX_SEARCH_RESULTS),
+    media_type: Optional[Literal["image", "video"]] = None,
+):
+    """
+    Full-text search over model names, original filenames and rating
+    captions. Pass `next_cursor` back as `cursor` for the next page.
+    """
+    if not IS_SQLITE:
+        # The index is an FTS5 table built by the SQLite migrations
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Search needs the SQLite FTS5 index and is not available on this database.",
+        )
+    return search_service.search_media(q, cursor=cursor, limit=limit, media_type=media_type)
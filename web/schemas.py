@@ -33,10 +33,38 @@ class ModelUpdate(BaseModel):
 
 class ModelResponse(ModelBase):
     id: int
+    slug: Optional[str] = None
 
     class Config:
         from_attributes = True # Allow ORM models to be converted to Pydantic models
 
+class ModelSearchResult(BaseModel):
+    id: int
+    name: str
+    slug: str
+    match: str  # exact, prefix, substring or fuzzy
+    score: float
+
+
+# --- Search Schemas ---
+class SearchHit(BaseModel):
+    id: int
+    model_id: int
+    model_name: str
+    model_slug: str
+    media_type: str
+    url: Optional[str] = None
+    thumbnails: dict = {}
+    original_filename: Optional[str] = None
+    rating: Optional[int] = None
+    rating_caption: Optional[str] = None
+    snippet: str  # HTML-escaped, matches wrapped in <mark>
+    score: float
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None
+
 
 # --- Media Schemas ---
 class MediaBase(BaseModel):
@@ -48,6 +76,11 @@ class MediaBase(BaseModel):
     rating: Optional[int] = None
     rating_caption: Optional[str] = None
     rated_at: Optional[datetime] = None
+    content_hash: Optional[str] = None
+    file_size: Optional[int] = None
+    original_filename: Optional[str] = None
+    thumbnails_at: Optional[datetime] = None
+    perceptual_hash: Optional[str] = None
 
 class MediaCreate(BaseModel):
     model_name: str # Use model name for creation, service resolves to id
@@ -57,7 +90,58 @@ class MediaCreate(BaseModel):
 
 class MediaResponse(MediaBase):
     id: int
+    near_duplicate_of: List[int] = []
+    job_ids: List[int] = []
 
     class Config:
         from_attributes = True
 
+
+class NearDuplicateMatch(BaseModel):
+    media_id: int
+    distance: int
+
+
+class RotationPick(BaseModel):
+    id: int
+    model_id: int
+    media_type: str
+    url: Optional[str] = None
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int
+    model_id: Optional[int] = None
+    model_name: Optional[str] = None
+
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    model_id: int
+    filename: str
+    media_type: str
+    size: int
+    offset: int
+    created_at: datetime
+    updated_at: datetime
+
+
+# --- Job Schemas ---
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str
+    media_id: Optional[int] = None
+    attempts: int
+    max_attempts: int
+    last_error: Optional[str] = None
+    run_after: datetime
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    worker_id: Optional[str] = None
+    heartbeat_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -10,6 +10,7 @@ const typeFilters = document.querySelectorAll("[data-type-filter]");
 const sortButtons = document.querySelectorAll("[data-sort]");
 const resetFiltersButton = document.querySelector("[data-action='reset-filters']");
 const visibleCount = document.getElementById("gallery-visible-count");
+const loadedCount = document.getElementById("gallery-loaded-count");
 const galleryGrid = document.querySelector(".gallery-grid");
 const itemNodes = Array.from(document.querySelectorAll(".gallery-item"));
 const itemNodesByIndex = new Map(
@@ -60,6 +61,35 @@ function wireMediaLoadStates(container = document) {
 
 wireMediaLoadStates();
 
+// Hover scrubbing over video posters; the sprite loads on first hover
+function updateVideoScrub(event) {
+  const scrub = event.target.closest && event.target.closest(".video-scrub");
+  if (!scrub) return;
+
+  const frames = Number(scrub.dataset.frames) || 1;
+  if (!scrub.style.backgroundImage) {
+    scrub.style.backgroundImage = `url("${scrub.dataset.sprite}")`;
+    scrub.style.backgroundSize = `${frames * 100}% 100%`;
+  }
+
+  const rect = scrub.getBoundingClientRect();
+  const ratio = Math.min(Math.max((event.clientX - rect.left) / rect.width, 0), 0.999);
+  const frame = Math.floor(ratio * frames);
+  const position = frames > 1 ? (frame / (frames - 1)) * 100 : 0;
+  scrub.style.backgroundPosition = `${position}% 0`;
+  scrub.classList.add("is-active");
+}
+
+if (galleryGrid) {
+  galleryGrid.addEventListener("mousemove", updateVideoScrub);
+  galleryGrid.addEventListener("mouseout", (event) => {
+    const scrub = event.target.closest && event.target.closest(".video-scrub");
+    if (scrub && !scrub.contains(event.relatedTarget)) {
+      scrub.classList.remove("is-active");
+    }
+  });
+}
+
 function appendParam(url, key, value) {
   if (!url) return url;
   const separator = url.includes("?") ? "&" : "?";
@@ -100,6 +130,7 @@ function openLightbox() {
   if (item.media_type === "video") {
     lightboxImage.style.display = "none";
     lightboxVideo.style.display = "block";
+    lightboxVideo.poster = (item.thumbnails && item.thumbnails.poster) || "";
     lightboxVideo.src = item.url;
     lightboxVideo.currentTime = 0;
   } else {
@@ -108,7 +139,7 @@ function openLightbox() {
     lightboxVideo.load();
     lightboxVideo.style.display = "none";
     lightboxImage.style.display = "block";
-    lightboxImage.src = item.url;
+    lightboxImage.src = (item.thumbnails && item.thumbnails.lightbox) || item.url;
   }
   lightbox.classList.add("active");
 }
@@ -119,13 +150,14 @@ function closeLightbox() {
   lightbox.classList.remove("active");
 }
 
-function nextImage() {
+async function nextImage() {
   if (!visibleIndices.length) return;
   if (currentVisibleIndex === visibleIndices.length - 1) {
-    if (hasNextPage && nextPageUrl) {
-      window.location.href = appendParam(nextPageUrl, "open", 0);
-    }
-    return;
+    if (!hasNextPage || !nextPageUrl) return;
+    // Pull in the next cursor page and keep going in place
+    const loadedBefore = visibleIndices.length;
+    await loadNextPage();
+    if (visibleIndices.length <= loadedBefore) return;
   }
   currentVisibleIndex += 1;
   openLightbox();
@@ -135,8 +167,7 @@ function prevImage() {
   if (!visibleIndices.length) return;
   if (currentVisibleIndex === 0) {
     if (hasPrevPage && prevPageUrl) {
-      const lastIndex = Math.max(media.length - 1, 0);
-      window.location.href = appendParam(prevPageUrl, "open", lastIndex);
+      window.location.href = appendParam(prevPageUrl, "open", "last");
     }
     return;
   }
@@ -321,10 +352,9 @@ async function loadNextPage() {
     const nextData = JSON.parse(dataEl.textContent);
     const newMedia = nextData.media || [];
 
+    // Only the forward cursor moves; Prev still leads before the first page shown
     hasNextPage = Boolean(nextData.hasNextPage);
-    hasPrevPage = Boolean(nextData.hasPrevPage);
     nextPageUrl = nextData.nextPageUrl || "";
-    prevPageUrl = nextData.prevPageUrl || "";
 
     const newNodes = Array.from(doc.querySelectorAll(".gallery-item"));
     const baseIndex = media.length;
@@ -350,6 +380,7 @@ async function loadNextPage() {
     });
 
     media.push(...newMedia);
+    if (loadedCount) loadedCount.textContent = String(media.length);
     wireMediaLoadStates(galleryGrid);
     applyFilters();
 
@@ -391,7 +422,7 @@ applyFilters();
 setupInfiniteScroll();
 
 if (params.has("open") && media.length) {
-  const index = Number(params.get("open"));
+  const index = params.get("open") === "last" ? media.length - 1 : Number(params.get("open"));
   if (!Number.isNaN(index) && index >= 0 && index < media.length) {
     const visibleIndex = visibleIndices.indexOf(index);
     if (visibleIndex >= 0) {
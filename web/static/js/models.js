@@ -6,7 +6,7 @@ const visibleCount = document.getElementById("models-visible-count");
 let currentFilter = "all";
 
 function deleteModel(slug) {
-  if (!confirm(`Delete model "${slug}" and all its media? This cannot be undone.`)) {
+  if (!confirm(`Delete model "${slug}" and all its media? It can be restored until it is purged.`)) {
     return;
   }
 
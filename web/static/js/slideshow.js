@@ -1,6 +1,9 @@
 const slideshowDataEl = document.getElementById("slideshow-data");
 const slideshowData = slideshowDataEl ? JSON.parse(slideshowDataEl.textContent) : {};
-const mediaItems = slideshowData.media || [];
+const PAGE_SIZE = 48;
+// Fetch the next page while this many slides are still queued
+const PREFETCH_AT = 12;
+const MAX_HISTORY = 200;
 
 const slideshowEl = document.querySelector(".slideshow");
 const stageEl = document.getElementById("slideshow-stage");
@@ -28,7 +31,12 @@ const layers = [
 
 let activeLayerIndex = 0;
 let queue = [];
-let currentIndex = -1;
+let currentItem = null;
+let seed = slideshowData.seed ?? null;
+let nextOffset = 0;
+let total = 0;
+let generation = 0;
+let pendingFetch = null;
 let mode = "drift";
 let isPaused = false;
 let isMuted = true;
@@ -37,36 +45,46 @@ let idleTimerId = null;
 const history = [];
 const queryParams = new URLSearchParams(window.location.search);
 
-function normalizeText(value) {
-  return value.toLowerCase().replace(/_/g, " ").trim();
+function playlistUrl(offset) {
+  const params = new URLSearchParams({ offset: String(offset), limit: String(PAGE_SIZE) });
+  if (seed !== null) params.set("seed", String(seed));
+  if (modelFilter?.value) params.set("model_name", modelFilter.value);
+  if (typeFilter?.value) params.set("media_type", typeFilter.value);
+  if (ratingFilter?.value) params.set("rating", ratingFilter.value);
+  return `/api/media/slideshow?${params.toString()}`;
 }
 
-function shuffle(list) {
-  const copy = [...list];
-  for (let i = copy.length - 1; i > 0; i -= 1) {
-    const j = Math.floor(Math.random() * (i + 1));
-    [copy[i], copy[j]] = [copy[j], copy[i]];
-  }
-  return copy;
+function fetchPage() {
+  if (pendingFetch) return pendingFetch;
+  const requestGeneration = generation;
+  pendingFetch = fetch(playlistUrl(nextOffset), { credentials: "same-origin" })
+    .then((response) => (response.ok ? response.json() : null))
+    .then((page) => {
+      if (!page || requestGeneration !== generation) return;
+      seed = page.seed;
+      total = page.total;
+      page.items.forEach((item, index) => {
+        queue.push({ ...item, position: page.offset + index + 1 });
+      });
+      if (page.next_offset === null) {
+        // End of the playlist: start over, with a fresh order in shuffle mode
+        nextOffset = 0;
+        if (mode === "shuffle") seed = null;
+      } else {
+        nextOffset = page.next_offset;
+      }
+    })
+    .catch(() => {})
+    .finally(() => {
+      if (requestGeneration === generation) pendingFetch = null;
+    });
+  return pendingFetch;
 }
 
-function filteredMedia() {
-  const modelValue = normalizeText(modelFilter?.value || "");
-  const typeValue = (typeFilter?.value || "").toLowerCase();
-  const ratingValue = ratingFilter?.value || "";
-
-  return mediaItems.filter((item) => {
-    const matchesModel = !modelValue || normalizeText(item.model_name || "").includes(modelValue);
-    const matchesType = !typeValue || item.media_type === typeValue;
-    const isRated = item.rating !== null && item.rating !== undefined;
-    const matchesRating = (
-      ratingValue === "" ||
-      (ratingValue === "rated" && isRated) ||
-      (ratingValue === "unrated" && !isRated)
-    );
-
-    return matchesModel && matchesType && matchesRating;
-  });
+function prefetch() {
+  if (queue.length <= PREFETCH_AT) {
+    fetchPage();
+  }
 }
 
 function applyQueryDefaults() {
@@ -101,16 +119,14 @@ function applyQueryDefaults() {
   }
 }
 
-function buildQueue() {
-  const list = filteredMedia();
-  if (!list.length) {
-    queue = [];
-    setHudCounter(null);
-    return;
-  }
-
-  const indices = list.map((item) => mediaItems.indexOf(item)).filter((index) => index >= 0);
-  queue = mode === "shuffle" ? shuffle(indices) : indices;
+function resetPlaylist(newSeed) {
+  generation += 1;
+  pendingFetch = null;
+  queue = [];
+  nextOffset = 0;
+  total = 0;
+  if (newSeed) seed = null;
+  return fetchPage();
 }
 
 function setActiveButton(buttons, activeButton) {
@@ -134,15 +150,11 @@ function setHudText(item) {
 
 function setHudCounter(item) {
   if (!hudCounter) return;
-  const list = filteredMedia();
-  const total = list.length;
   if (!item || total === 0) {
     hudCounter.textContent = "0 / 0";
     return;
   }
-  const index = list.findIndex((entry) => entry.id === item.id);
-  const position = index >= 0 ? index + 1 : 0;
-  hudCounter.textContent = `${position} / ${total}`;
+  hudCounter.textContent = `${item.position} / ${total}`;
 }
 
 function setLayerContent(layer, item) {
@@ -168,7 +180,7 @@ function setLayerContent(layer, item) {
     }
   } else {
     layer.classList.remove("is-video");
-    imageEl.src = item.url;
+    imageEl.src = (item.thumbnails && item.thumbnails.lightbox) || item.url;
     videoEl.pause();
     videoEl.removeAttribute("src");
     videoEl.load();
@@ -192,29 +204,28 @@ function showSlide(item) {
   });
 }
 
-function nextSlide() {
+async function nextSlide() {
   if (!queue.length) {
-    buildQueue();
+    await fetchPage();
   }
   if (!queue.length) {
     showSlide(null);
     return;
   }
-  const nextIndex = queue.shift();
-  if (currentIndex >= 0) {
-    history.push(currentIndex);
+  if (currentItem) {
+    history.push(currentItem);
+    if (history.length > MAX_HISTORY) history.shift();
   }
-  currentIndex = nextIndex;
-  const item = mediaItems[nextIndex];
-  showSlide(item);
+  currentItem = queue.shift();
+  showSlide(currentItem);
+  prefetch();
 }
 
 function prevSlide() {
   if (!history.length) return;
-  const prevIndex = history.pop();
-  currentIndex = prevIndex;
-  const item = mediaItems[prevIndex];
-  showSlide(item);
+  if (currentItem) queue.unshift(currentItem);
+  currentItem = history.pop();
+  showSlide(currentItem);
 }
 
 function scheduleNext() {
@@ -230,9 +241,10 @@ function scheduleNext() {
 }
 
 function startSlideshow() {
-  buildQueue();
-  nextSlide();
-  scheduleNext();
+  resetPlaylist(false).then(() => {
+    nextSlide();
+    scheduleNext();
+  });
 }
 
 function handleIdle() {
@@ -252,14 +264,16 @@ modeButtons.forEach((button) => {
     mode = button.dataset.mode || "drift";
     setActiveButton(modeButtons, button);
     if (stageEl) stageEl.dataset.mode = mode;
-    buildQueue();
+    if (mode === "shuffle") {
+      resetPlaylist(true);
+    }
   });
 });
 
 [modelFilter, typeFilter, ratingFilter].forEach((control) => {
   if (!control) return;
   control.addEventListener("change", () => {
-    buildQueue();
+    resetPlaylist(mode === "shuffle");
   });
 });
 
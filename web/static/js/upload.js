@@ -1,6 +1,8 @@
 document.addEventListener('DOMContentLoaded', () => {
     const uploadForm = document.getElementById('upload-form');
     const modelSelect = document.getElementById('model-select');
+    const modelSearch = document.getElementById('model-search');
+    const modelSuggestions = document.getElementById('model-suggestions');
     const modelNameInput = document.getElementById('model-name-input');
     const modelModeInputs = document.querySelectorAll('input[name="model_mode"]');
     const fileInput = document.getElementById('file-input');
@@ -15,6 +17,9 @@ document.addEventListener('DOMContentLoaded', () => {
         if (modelSelect) {
             modelSelect.disabled = !isExisting;
         }
+        if (modelSearch) {
+            modelSearch.disabled = !isExisting;
+        }
         if (modelNameInput) {
             modelNameInput.disabled = isExisting;
         }
@@ -53,6 +58,44 @@ document.addEventListener('DOMContentLoaded', () => {
 
     loadModels();
 
+    // Model picker: suggestions come from the server-side name index, and
+    // picking one selects that model in the dropdown
+    let suggestionIds = new Map();
+    let searchTimer = null;
+
+    const searchModels = async (query) => {
+        try {
+            const response = await fetch(`/api/models/search?q=${encodeURIComponent(query)}&limit=10`, {
+                credentials: "same-origin",
+            });
+            if (!response.ok) return;
+            const matches = await response.json();
+            if (modelSearch.value.trim() !== query) return; // a newer search is on its way
+            suggestionIds = new Map(matches.map((match) => [match.name, match.id]));
+            modelSuggestions.innerHTML = '';
+            matches.forEach((match) => {
+                const option = document.createElement('option');
+                option.value = match.name;
+                modelSuggestions.appendChild(option);
+            });
+        } catch (_error) {
+            // The full dropdown still works without suggestions.
+        }
+    };
+
+    if (modelSearch && modelSuggestions && modelSelect) {
+        modelSearch.addEventListener('input', () => {
+            const query = modelSearch.value.trim();
+            if (suggestionIds.has(query)) {
+                modelSelect.value = String(suggestionIds.get(query));
+                return;
+            }
+            clearTimeout(searchTimer);
+            if (!query) return;
+            searchTimer = setTimeout(() => searchModels(query), 150);
+        });
+    }
+
     uploadForm.addEventListener('submit', async (event) => {
         event.preventDefault(); // Prevent default form submission
 
@@ -123,11 +166,15 @@ document.addEventListener('DOMContentLoaded', () => {
                     response.forEach(media => {
                         uploadResults.innerHTML += `
                             <article>
-                                <header>Uploaded: ${media.file_path.split('/').pop()}</header>
+                                <header>Uploaded: ${media.original_filename || media.file_path.split('/').pop()}</header>
                                 <p>Model ID: ${media.model_id}, Media ID: ${media.id}</p>
                             </article>
                         `;
                     });
+                    const jobIds = response.flatMap((media) => media.job_ids || []);
+                    if (jobIds.length) {
+                        pollJobs(jobIds);
+                    }
                 } else {
                     const errorResponse = JSON.parse(xhr.responseText);
                     displayMessage('error', `Upload failed: ${errorResponse.detail || xhr.statusText}`);
@@ -147,6 +194,39 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    async function pollJobs(jobIds) {
+        progressBar.value = 0;
+        progressText.textContent = `Processing 0/${jobIds.length}`;
+
+        while (true) {
+            let jobs = [];
+            try {
+                const response = await fetch(`/api/jobs/?ids=${jobIds.join(',')}&limit=${jobIds.length}`, {
+                    credentials: "same-origin",
+                });
+                if (!response.ok) {
+                    return;
+                }
+                jobs = await response.json();
+            } catch (error) {
+                return;
+            }
+
+            const finished = jobs.filter((job) => job.status === 'done' || job.status === 'failed');
+            const failed = jobs.filter((job) => job.status === 'failed');
+            progressBar.value = Math.round((finished.length / jobIds.length) * 100);
+            progressText.textContent = `Processing ${finished.length}/${jobIds.length}`;
+
+            if (finished.length >= jobIds.length) {
+                progressText.textContent = failed.length
+                    ? `Processing finished with ${failed.length} failed job(s)`
+                    : 'Processing complete';
+                return;
+            }
+            await new Promise((resolve) => setTimeout(resolve, 2000));
+        }
+    }
+
     function displayMessage(type, message) {
         const p = document.createElement('p');
         p.className = `message ${type}`;